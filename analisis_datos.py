@@ -1,6 +1,6 @@
-import pandas as pd
 import geopandas as gpd
 import os
+from src.esquema import ESQUEMA_MUESTRA, ESQUEMA_SECCIONES, leer_csv, resolver
 
 # --- RUTAS DE ARCHIVOS ---
 # Ajusta el nombre exacto de tu archivo .shp aquí
@@ -18,35 +18,31 @@ print("--- INICIANDO DIAGNÓSTICO DE DATOS ---")
 print(f"📂 Leyendo Shapefile: {shp_files[0]}")
 print(f"📂 Leyendo CSV: muestra.csv")
 
-# 1. CARGA DE DATOS
+# 1. INSPECCIÓN DE COLUMNAS (solo encabezados; el esquema resuelve los alias)
+print("\n--- 1. INSPECCIÓN DE COLUMNAS ---")
+try:
+    mapa_shp, _ = resolver(PATH_SHP, ESQUEMA_SECCIONES)
+    col_seccion_shp = mapa_shp['SECCION']
+    print(f"\nℹ️ Columna detectada en Shapefile para sección: '{col_seccion_shp}'")
+except ValueError as e:
+    # Si no la encuentra por nombre, que la indique el usuario (el error lista las columnas)
+    print(f"\n⚠️ ALERTA: {e}")
+    col_seccion_shp = input("Escribe el nombre exacto de la columna de SECCIÓN en el Shapefile: ")
+
+# 2. CARGA DE DATOS (solo las columnas que se revisan)
 try:
-    gdf = gpd.read_file(PATH_SHP)
-    df = pd.read_csv(PATH_CSV)
+    # El shapefile se lee crudo a propósito: aquí se revisa su tipo original
+    gdf = gpd.read_file(PATH_SHP, columns=[col_seccion_shp])
+    df = leer_csv(PATH_CSV, ESQUEMA_MUESTRA, columnas=('seccion', 'nombre_municipio'))
     print("\n✅ Archivos cargados correctamente.")
+    print(f"Columnas del CSV reconocidas: {resolver(PATH_CSV, ESQUEMA_MUESTRA)[0]}")
 except Exception as e:
     print(f"\n❌ Error cargando archivos: {e}")
     exit()
 
-# 2. INSPECCIÓN DE COLUMNAS
-print("\n--- 1. INSPECCIÓN DE COLUMNAS ---")
-print(f"Columnas en Shapefile (Primeras 5): {list(gdf.columns[:5])} ...")
-print(f"Columnas en CSV: {list(df.columns)}")
-
-# 3. NORMALIZACIÓN Y BÚSQUEDA DE LA LLAVE 'SECCION'
-# Intentamos adivinar la columna de sección en el Shapefile
-col_seccion_shp = next((c for c in gdf.columns if 'seccion' in c.lower()), None)
-
-# Si no la encuentra por nombre, suele ser la primera o segunda, pero esperemos que tenga nombre
-if not col_seccion_shp:
-    print("\n⚠️ ALERTA: No encontré una columna que diga 'seccion' en el Shapefile.")
-    print("Por favor revisa los nombres de columnas impresos arriba.")
-    col_seccion_shp = input("Escribe el nombre exacto de la columna de SECCIÓN en el Shapefile: ")
-else:
-    print(f"\nℹ️ Columna detectada en Shapefile para sección: '{col_seccion_shp}'")
-
-col_seccion_csv = 'seccion' # Asumimos este nombre por tu descripción previa
+col_seccion_csv = 'seccion' # Nombre destino del esquema
 
-# 4. ANÁLISIS DE TIPOS DE DATOS
+# 3. ANÁLISIS DE TIPOS DE DATOS
 print("\n--- 2. VERIFICACIÓN DE TIPOS ---")
 val_shp = gdf[col_seccion_shp].iloc[0]
 val_csv = df[col_seccion_csv].iloc[0]
@@ -58,7 +54,7 @@ print(f"Ejemplo valor CSV:       '{val_csv}' (Tipo: {type(val_csv)})")
 gdf['KEY_SECCION'] = gdf[col_seccion_shp].astype(str).astype(int).astype(str) # Forzamos entero para quitar ceros izq (0052 -> 52)
 df['KEY_SECCION'] = df[col_seccion_csv].astype(str).astype(int).astype(str)
 
-# 5. PRUEBA DE CRUCE (MATCH)
+# 4. PRUEBA DE CRUCE (MATCH)
 print("\n--- 3. PRUEBA DE COBERTURA ---")
 secciones_objetivo = df['KEY_SECCION'].unique()
 secciones_encontradas = gdf[gdf['KEY_SECCION'].isin(secciones_objetivo)]
@@ -76,8 +72,8 @@ else:
     faltantes = set(secciones_objetivo) - set(secciones_encontradas['KEY_SECCION'])
     print(f"IDs de secciones faltantes (primeras 10): {list(faltantes)[:10]}")
 
-# 6. VERIFICACIÓN DE MUNICIPIOS
+# 5. VERIFICACIÓN DE MUNICIPIOS
 print("\n--- 4. MUNICIPIOS EN EL CSV ---")
-print(df['Nombre_municipio'].unique())
+print(df['nombre_municipio'].unique() if 'nombre_municipio' in df.columns else "(sin columna de municipio)")
 
 print("\n--- FIN DEL DIAGNÓSTICO ---")
\ No newline at end of file
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: asignación balanceada húngaro (N x N) vs flujo de costo mínimo (N x K),
+y el rebalanceo por carga (asignacion_ponderada) que parte de esta última.
+
+Uso:
+    python benchmarks/bench_asignacion.py
+    python benchmarks/bench_asignacion.py --puntos 1000 10000 50000 --brigadas 8
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scipy.spatial.distance import cdist
+from src.logic import (tamanos_balanceados, asignacion_hungaro, asignacion_transporte,
+                       asignacion_ponderada, _exceso_carga)
+
+# Caja aproximada del municipio en UTM 14N (metros)
+X_MIN, X_MAX = 585000, 615000
+Y_MIN, Y_MAX = 2190000, 2225000
+
+
+def puntos_sinteticos(n, semilla=42):
+    """Puntos agrupados en 'localidades' (como la traza real, no uniformes)."""
+    rng = np.random.default_rng(semilla)
+    n_focos = max(5, n // 200)
+    focos = np.column_stack((rng.uniform(X_MIN, X_MAX, n_focos), rng.uniform(Y_MIN, Y_MAX, n_focos)))
+    cual = rng.integers(0, n_focos, n)
+    return focos[cual] + rng.normal(0, 600, (n, 2))
+
+
+def medir(funcion, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    resultado = funcion(*args)
+    segundos = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de asignación balanceada")
+    parser.add_argument("--puntos", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--brigadas", type=int, default=8)
+    parser.add_argument("--limite-hungaro", type=int, default=5000,
+                        help="Arriba de este N se omite el húngaro (memoria N^2)")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Banda de carga del rebalanceo ponderado")
+    args = parser.parse_args()
+
+    print(f"{'N':>7} | {'método':<10} | {'seg':>8} | {'MB pico':>9} | {'costo total (km)':>16} | tamaños")
+    print("-" * 80)
+    for n in args.puntos:
+        coords = puntos_sinteticos(n)
+        centroids = KMeans(n_clusters=args.brigadas, n_init=1, random_state=42).fit(coords).cluster_centers_
+        tamanos = tamanos_balanceados(n, args.brigadas)
+
+        metodos = [('transporte', asignacion_transporte)]
+        if n <= args.limite_hungaro:
+            metodos.insert(0, ('hungaro', asignacion_hungaro))
+        else:
+            print(f"{n:>7} | {'hungaro':<10} | omitido: matriz N x N de {n * n * 8 / 1e9:.1f} GB")
+
+        for nombre, funcion in metodos:
+            grupos, seg, pico = medir(funcion, coords, centroids, tamanos)
+            costo = np.linalg.norm(coords - centroids[grupos], axis=1).sum() / 1000
+            conteo = np.bincount(grupos, minlength=args.brigadas)
+            ok = "OK" if np.array_equal(conteo, tamanos) else "DESBALANCE"
+            print(f"{n:>7} | {nombre:<10} | {seg:>8.2f} | {pico:>9.1f} | {costo:>16.1f} | {conteo.min()}-{conteo.max()} {ok}")
+
+        # Rebalanceo por carga (Meta y manzanas sintéticas) desde el plan por conteo
+        rng = np.random.default_rng(1)
+        pesos = np.column_stack((rng.integers(10, 60, n), rng.integers(1, 15, n))).astype(float)
+        costo_k = cdist(coords, centroids)
+        grupos, seg, pico = medir(asignacion_ponderada, costo_k, pesos, grupos, args.tolerancia)
+        costo = costo_k[np.arange(n), grupos].sum() / 1000
+        carga = np.zeros((args.brigadas, 2))
+        np.add.at(carga, grupos, pesos * args.brigadas / pesos.sum(axis=0))
+        ok = "OK" if not _exceso_carga(carga, args.tolerancia).any() else "FUERA DE BANDA"
+        print(f"{n:>7} | {'ponderada':<10} | {seg:>8.2f} | {pico:>9.1f} | {costo:>16.1f} | ±{args.tolerancia:.0%} {ok}")
+
+
+if __name__ == "__main__":
+    main()
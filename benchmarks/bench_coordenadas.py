@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: limpieza de coordenadas celda por celda (Series.apply) vs vectorizada.
+
+Uso:
+    python benchmarks/bench_coordenadas.py
+    python benchmarks/bench_coordenadas.py --filas 10000 100000 500000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.coordenadas import limpiar_y_convertir_universal, convertir_coordenadas
+
+
+def catalogo_sintetico(n, semilla=42):
+    """Mezcla de formatos como la de un catálogo leído de CSV: decimal, DMS (también compacto), con hemisferio, basura."""
+    rng = np.random.default_rng(semilla)
+    lon = -rng.uniform(96.5, 98.5, n)
+    g = np.floor(-lon).astype(int)
+    m = np.floor((-lon - g) * 60).astype(int)
+    s = np.floor(((-lon - g) * 60 - m) * 600) / 10  # décimas de segundo, nunca 60.0
+
+    formatos = rng.integers(0, 6, n)
+    valores = np.empty(n, dtype=object)
+    valores[formatos == 0] = np.char.mod('%.6f', lon[formatos == 0])
+    dms = formatos == 1
+    valores[dms] = [f"{a}°{b}'{c:.1f}\" W" for a, b, c in zip(g[dms], m[dms], s[dms])]
+    valores[formatos == 2] = [f"W {v:.5f}" for v in -lon[formatos == 2]]
+    valores[formatos == 3] = [f" {v:.4f} " for v in lon[formatos == 3]]
+    valores[formatos == 4] = rng.choice(["", "S/D", "N/A", "0"], (formatos == 4).sum())
+    compacto = formatos == 5
+    valores[compacto] = [f"{a}d{b}m{c:.1f}sW" for a, b, c in zip(g[compacto], m[compacto], s[compacto])]
+    return pd.Series(valores)
+
+
+# Casos de hemisferio con su valor esperado: la versión original falla en
+# algunos (cualquier 'S' cuenta como sur, 'O' no cuenta como oeste), así que
+# se comparan contra el valor correcto y no contra ella.
+CASOS_HEMISFERIO = {
+    "97d57m36sW": -97.96,
+    "97d57m36s W": -97.96,
+    "97D57M36SO": -97.96,
+    "97°57'36\"W": -97.96,
+    "97°57'36\"E": 97.96,
+    "97.96O": -97.96,
+    "W97.96": -97.96,
+    "O 97°57'": -97.95,
+    "SW 97.9": -97.9,
+    "97 57 36 OESTE": -97.96,
+    "19d54mS": -19.9,
+    "19d54m36s": 19.91,
+    "19d54m36sS": -19.91,
+    "19d54m36s S": -19.91,
+    "19.9S": -19.9,
+    "19°54'S": -19.9,
+    "19°54'N": 19.9,
+    "19.9 NORTE": 19.9,
+    "ESTE 97.5": 97.5,
+}
+
+
+def revisar_hemisferios():
+    """Convierte CASOS_HEMISFERIO y devuelve los que no dan el valor esperado."""
+    resultado = convertir_coordenadas(pd.Series(list(CASOS_HEMISFERIO)))
+    esperado = np.array(list(CASOS_HEMISFERIO.values()))
+    malos = ~np.isclose(resultado['valor'].to_numpy(), esperado)
+    return [(texto, v, e) for texto, v, e, m in zip(CASOS_HEMISFERIO, resultado['valor'], esperado, malos) if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de limpieza de coordenadas")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10000, 100000, 500000])
+    args = parser.parse_args()
+
+    fallidos = revisar_hemisferios()
+    print(f"Casos de hemisferio: {len(CASOS_HEMISFERIO) - len(fallidos)}/{len(CASOS_HEMISFERIO)} correctos")
+    for texto, valor, esperado in fallidos:
+        print(f"   NO {texto!r}: {valor} (esperado {esperado})")
+    print()
+
+    print(f"{'filas':>8} | {'apply (s)':>10} | {'vectorizado (s)':>15} | {'aceleración':>11} | coinciden")
+    print("-" * 70)
+    for n in args.filas:
+        serie = catalogo_sintetico(n)
+
+        t0 = time.perf_counter()
+        original = serie.apply(limpiar_y_convertir_universal)
+        t_apply = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        nuevo = convertir_coordenadas(serie)
+        t_vec = time.perf_counter() - t0
+
+        # La versión original devuelve 0 para lo inválido; la nueva NaN + motivo
+        validos = nuevo['motivo'].eq('ok')
+        coinciden = np.allclose(original[validos], nuevo.loc[validos, 'valor']) and (original[~validos] == 0).all()
+        print(f"{n:>8} | {t_apply:>10.2f} | {t_vec:>15.2f} | {t_apply / t_vec:>10.1f}x | {'sí' if coinciden else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
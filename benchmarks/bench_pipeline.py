@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del flujo de planeación completo con datos sintéticos escalados.
+
+Los datos se arman copiando la geometría real de Zacatlán (secciones,
+manzanas y localidades de la muestra) en una cuadrícula: escala 10 = 10
+copias del municipio. Se mide cada etapa (tiempo y memoria pico), se agrega
+el resultado a un historial JSON y se marcan regresiones contra las corridas
+previas en la misma máquina.
+
+Uso:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --escalas 10 100 1000
+    python benchmarks/bench_pipeline.py --escalas 100 --estricto   # código 1 si hay regresión
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import folium
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from src.carga import cargar_datos
+from src.indices import IndiceSeccionManzana, asignar_seccion_manzanas
+import src.logic as logic
+from src.logic import balanced_cluster_optimization, MemoriaSoluciones
+from src.pines import construir_pines, capa_pines
+from src.geometria import TablaGeometria
+from src.rutas import secuenciar_brigadas
+
+SECC_REAL = os.path.join(RAIZ, "zacatlan_secciones_opt.geojson")
+MANZ_REAL = os.path.join(RAIZ, "zacatlan_manzanas_opt.geojson")
+CSV_REAL = os.path.join(RAIZ, "data/raw/muestra_original.csv")
+DIR_DATOS = os.path.join(RAIZ, "data/cache/bench")
+HISTORIAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historial.json")
+
+# Una regresión es más lenta (o más pesada) que la mediana previa por este
+# factor y además por un mínimo absoluto (evita ruido en etapas de milisegundos)
+UMBRAL = 0.25
+MINIMO_SEG = 0.05
+MINIMO_MB = 5.0
+CORRIDAS_BASE = 5
+# Brigadas por defecto: 6 por copia del municipio con tope (el balanceo crece
+# más que lineal con el número de grupos)
+MAX_BRIGADAS = 60
+
+
+# ==============================================================================
+# DATOS SINTÉTICOS
+# ==============================================================================
+
+def _desplazar(geoms, dx, dy):
+    return shapely.transform(np.asarray(geoms), lambda c: c + np.array([dx, dy]))
+
+
+def generar_escala(factor, dir_datos=DIR_DATOS):
+    """Escribe secciones/manzanas/muestra con 'factor' copias del municipio. Devuelve las rutas."""
+    destino = os.path.join(dir_datos, f"escala_{factor}")
+    rutas = {
+        'secc': os.path.join(destino, "secciones.geojson"),
+        'manz': os.path.join(destino, "manzanas.geojson"),
+        'csv': os.path.join(destino, "muestra.csv"),
+    }
+    if all(os.path.exists(r) for r in rutas.values()):
+        return rutas
+    os.makedirs(destino, exist_ok=True)
+
+    secc = gpd.read_file(SECC_REAL)
+    secc = gpd.GeoDataFrame({'SECCION': secc['SECCION'].astype(int)}, geometry=secc.geometry.values, crs=secc.crs)
+    manz = gpd.read_file(MANZ_REAL)
+    manz['SECCION'] = asignar_seccion_manzanas(manz, secc, col_seccion='SECCION')
+    csv = pd.read_csv(CSV_REAL)
+
+    x0, y0, x1, y1 = secc.total_bounds
+    ancho, alto = (x1 - x0) * 1.05, (y1 - y0) * 1.05
+    columnas = int(np.ceil(np.sqrt(factor)))
+    salto = 10 ** int(np.ceil(np.log10(secc['SECCION'].max() + 1)))   # ids sin choques
+
+    partes_s, partes_m, partes_c = [], [], []
+    for k in range(factor):
+        dx, dy = (k % columnas) * ancho, (k // columnas) * alto
+        s = secc.copy()
+        s['SECCION'] = s['SECCION'] + k * salto
+        s.geometry = _desplazar(s.geometry.values, dx, dy)
+        partes_s.append(s)
+        m = manz.copy()
+        m['SECCION'] = np.where(m['SECCION'] >= 0, m['SECCION'] + k * salto, -1)
+        m.geometry = _desplazar(m.geometry.values, dx, dy)
+        partes_m.append(m)
+        c = csv.copy()
+        c['seccion'] = c['seccion'] + k * salto
+        partes_c.append(c)
+
+    pd.concat(partes_s, ignore_index=True).to_file(rutas['secc'], driver="GeoJSON")
+    pd.concat(partes_m, ignore_index=True).to_file(rutas['manz'], driver="GeoJSON")
+    pd.concat(partes_c, ignore_index=True).to_csv(rutas['csv'], index=False)
+    return rutas
+
+
+# ==============================================================================
+# ETAPAS
+# ==============================================================================
+
+def medir(etapa, resultados, funcion, *args, memoria=True):
+    if memoria:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    salida = funcion(*args)
+    seg = time.perf_counter() - t0
+    mb = None
+    if memoria:
+        mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    resultados[etapa] = {'seg': round(seg, 4), 'mb': None if mb is None else round(mb, 2)}
+    return salida
+
+
+def _render(gdf_view, gdf_pines):
+    m = folium.Map([19.93, -97.96], zoom_start=12, tiles="CartoDB positron")
+    folium.GeoJson(
+        gdf_view[['seccion', 'Grupo_ID', 'Meta', 'geometry']],
+        style_function=lambda f: {'fillColor': '#3498DB', 'color': 'black', 'weight': 1, 'fillOpacity': 0.6},
+        tooltip=folium.GeoJsonTooltip(fields=['seccion', 'Grupo_ID', 'Meta'])
+    ).add_to(m)
+    if not gdf_pines.empty:
+        capa_pines(gdf_pines).add_to(m)
+    return m.get_root().render()
+
+
+def _paradas(gdf_view, gdf_pines):
+    utm = gdf_pines.geometry.to_crs("EPSG:32614")
+    df = pd.DataFrame({'seccion': gdf_pines['seccion'].to_numpy(), 'x': utm.x.to_numpy(), 'y': utm.y.to_numpy()})
+    return df.merge(gdf_view[['seccion', 'Grupo_ID']], on='seccion')
+
+
+def correr_escala(factor, brigadas, memoria=True):
+    rutas = generar_escala(factor)
+    r = {}
+    ausente = os.path.join(DIR_DATOS, "no_existe")
+    gdf_secc, gdf_m, df_pines = medir('carga', r, cargar_datos, rutas['secc'], rutas['manz'], rutas['csv'],
+                                      ausente + ".csv", memoria=memoria)
+    indice = medir('indice_manzanas', r, IndiceSeccionManzana, gdf_m['SECCION'].to_numpy(), memoria=memoria)
+    medir('filtro_manzanas', r, indice.filas_de, gdf_secc['seccion'].to_numpy()[:max(1, len(gdf_secc) // brigadas)],
+          memoria=memoria)
+    gdf_view = medir('optimizacion', r, balanced_cluster_optimization, gdf_secc, brigadas, memoria=memoria)
+    gdf_pines = medir('pines', r, lambda: construir_pines(df_pines, TablaGeometria(gdf_view).indice_centroides()), memoria=memoria)
+    medir('rutas', r, secuenciar_brigadas, _paradas(gdf_view, gdf_pines), memoria=memoria)
+    html = medir('render_mapa', r, _render, gdf_view, gdf_pines, memoria=memoria)
+    tamanos = {'secciones': len(gdf_secc), 'manzanas': len(gdf_m), 'localidades': len(df_pines),
+               'brigadas': brigadas, 'html_mb': round(len(html) / 1e6, 2)}
+    return r, tamanos
+
+
+# ==============================================================================
+# HISTORIAL Y REGRESIONES
+# ==============================================================================
+
+def leer_historial(ruta=HISTORIAL):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return []
+
+
+def regresiones(historial, maquina, escala, etapas):
+    """Etapas más lentas/pesadas que la mediana de las últimas corridas comparables."""
+    previas = [h for h in historial if h['maquina'] == maquina and str(escala) in h['escalas']][-CORRIDAS_BASE:]
+    alertas = []
+    for etapa, medida in etapas.items():
+        for campo, minimo in (('seg', MINIMO_SEG), ('mb', MINIMO_MB)):
+            valores = [h['escalas'][str(escala)]['etapas'].get(etapa, {}).get(campo) for h in previas]
+            valores = [v for v in valores if v is not None]
+            actual = medida.get(campo)
+            if not valores or actual is None:
+                continue
+            base = float(np.median(valores))
+            if actual > base * (1 + UMBRAL) and actual - base > minimo:
+                alertas.append(f"{etapa}.{campo}: {actual:.2f} vs {base:.2f} (mediana de {len(valores)})")
+    return alertas
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del flujo de planeación")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--brigadas", type=int, default=None,
+                        help=f"Brigadas fijas (por defecto 6 por copia del municipio, máx. {MAX_BRIGADAS})")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir memoria (tracemalloc agrega costo)")
+    parser.add_argument("--sin-historial", action="store_true", help="No agregar la corrida al historial")
+    parser.add_argument("--estricto", action="store_true", help="Salir con código 1 si hay regresiones")
+    args = parser.parse_args()
+
+    # Se mide el cálculo: memoria de soluciones sin copia en disco (vacía en cada corrida)
+    logic._MEMORIA_SOLUCIONES = MemoriaSoluciones(dir_disco=None)
+    historial = leer_historial()
+    maquina = platform.node()
+    corrida = {'fecha': time.strftime("%Y-%m-%d %H:%M:%S"), 'commit': _commit(), 'maquina': maquina,
+               'python': platform.python_version(), 'escalas': {}}
+    hay_regresion = False
+
+    for factor in args.escalas:
+        brigadas = args.brigadas or min(6 * factor, MAX_BRIGADAS)
+        print(f"\n📐 Escala {factor}x ({brigadas} brigadas)")
+        etapas, tamanos = correr_escala(factor, brigadas, memoria=not args.sin_memoria)
+        print(f"   {tamanos}")
+        print(f"   {'etapa':<17} | {'seg':>8} | {'MB pico':>9}")
+        for etapa, medida in etapas.items():
+            mb = '-' if medida['mb'] is None else f"{medida['mb']:.1f}"
+            print(f"   {etapa:<17} | {medida['seg']:>8.3f} | {mb:>9}")
+        alertas = regresiones(historial, maquina, factor, etapas)
+        for a in alertas:
+            print(f"   ⚠️ REGRESIÓN {a}")
+        hay_regresion |= bool(alertas)
+        corrida['escalas'][str(factor)] = {'tamanos': tamanos, 'etapas': etapas, 'regresiones': alertas}
+
+    if not args.sin_historial:
+        historial.append(corrida)
+        with open(HISTORIAL, 'w', encoding='utf-8') as f:
+            json.dump(historial, f, ensure_ascii=False, indent=1)
+        print(f"\n💾 Historial: {HISTORIAL} ({len(historial)} corridas)")
+
+    if args.estricto and hay_regresion:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from src.teselas import generar_teselas_manzanas, DIR_TESELAS
+
+# --- RUTAS ---
+GEOJSON_MANZANAS = "zacatlan_manzanas_opt.geojson"
+GEOJSON_SECCIONES = "zacatlan_secciones_opt.geojson"
+
+print("🧩 GENERANDO TESELAS DE TRAZA URBANA...")
+
+# La app también las genera sola si faltan, pero en despliegues con varios
+# workers conviene correr esto una vez antes de arrancar.
+indice = generar_teselas_manzanas(GEOJSON_MANZANAS, GEOJSON_SECCIONES)
+
+total = sum(len(v) for v in indice['teselas'].values())
+print(f"""
+✅ LISTO: {total} teselas en {DIR_TESELAS}/manzanas (servidas en /app/static/teselas/manzanas)
+   Zooms: {indice['zooms']}
+""")
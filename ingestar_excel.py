@@ -0,0 +1,46 @@
+import time
+from src.esquema import ESQUEMA_MUESTRA, leer_csv
+from src.libros import RUTA_CATALOGO, RUTA_MUESTRA, cargar_catalogo_manzanas, cargar_muestra_libro
+
+# --- RUTAS ---
+CSV_MUESTRA = "data/raw/muestra_original.csv"
+
+print("🚀 Leyendo los libros de Excel de campo...")
+
+# 1. LECTURA (la primera vez parsea el .xlsx; después sale del caché Parquet)
+t0 = time.perf_counter()
+df_catalogo = cargar_catalogo_manzanas()
+print(f"📗 {RUTA_CATALOGO}: {len(df_catalogo)} manzanas en {df_catalogo['SECCION'].nunique()} secciones "
+      f"({time.perf_counter() - t0:.2f} s)")
+
+t0 = time.perf_counter()
+df_libro = cargar_muestra_libro()
+print(f"📘 {RUTA_MUESTRA}: {len(df_libro)} secciones seleccionadas, {int(df_libro['veces_muestra'].sum())} puntos "
+      f"({time.perf_counter() - t0:.2f} s)")
+print(f"   Columnas reconocidas: {list(df_libro.columns)}")
+
+# 2. VALIDACIÓN CONTRA LA EXPORTACIÓN CSV
+try:
+    df_csv = leer_csv(CSV_MUESTRA, ESQUEMA_MUESTRA, columnas=('seccion',))
+    secc_csv = set(df_csv['seccion'].astype(int))
+    secc_libro = set(df_libro['seccion'].astype(int))
+    if secc_csv == secc_libro:
+        print(f"✅ Las {len(secc_libro)} secciones coinciden con {CSV_MUESTRA}")
+    else:
+        print(f"⚠️ Secciones solo en el libro: {sorted(secc_libro - secc_csv)}")
+        print(f"⚠️ Secciones solo en el CSV: {sorted(secc_csv - secc_libro)}")
+except FileNotFoundError:
+    secc_libro = set(df_libro['seccion'].astype(int))
+    print(f"ℹ️ No existe {CSV_MUESTRA}; se omite la comparación")
+
+sin_catalogo = sorted(secc_libro - set(df_catalogo['SECCION'].astype(int)))
+if sin_catalogo:
+    print(f"⚠️ Secciones de la muestra sin manzanas en el catálogo: {sin_catalogo}")
+
+# 3. MANZANAS MARCADAS EN CAMPO
+if 'EN_MUESTRA' in df_catalogo.columns:
+    marcadas = df_catalogo[df_catalogo['EN_MUESTRA']].groupby('SECCION', observed=True).size()
+    print(f"\n🎲 Manzanas marcadas en muestra: {int(marcadas.sum())} en {len(marcadas)} secciones")
+    print(marcadas.rename('manzanas').to_string())
+
+print("\n✨ Listo.")
@@ -5,140 +5,259 @@ from folium.plugins import Search, Fullscreen
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-import io
-import re
-import random
-from src.logic import balanced_cluster_optimization
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from src.logic import (balanced_cluster_optimization, solucion_en_memoria, asignacion_rapida,
+                       precalentar, estadisticas_memoria)
+import src.diagnostico as diagnostico
+from src.carga import cargar_datos
+from src.contexto import cargar_contexto
+from src.indices import IndiceSeccionManzana
+from src.pines import construir_pines, capa_pines
+from src.geometria import TablaGeometria
+from src.rutas import secuenciar_brigadas, resumen_rutas
+from src.red_vial import RedVial, buscar_red_vial
+from src.exportacion import (html_mapa, huella_plan, PaquetesBrigadas, limpiar_paquetes,
+                             capas_plan, ExportacionesPlan, FORMATOS_EXPORTACION, DIR_EXPORTACIONES)
+from src.muestreo import SEMILLA_DEFAULT, seleccionar_manzanas, claves_geometria, resumen_seleccion
+from src.artefactos import huella_archivos, leer_artefactos, guardar_artefactos
+from src.piramide import cargar_nivel, simplificar_nivel
+from src.teselas import CapaTeselasGeoJSON, generar_teselas_manzanas, teselas_vigentes, cargar_indice_teselas
 
 # Configuración de página
 st.set_page_config(page_title="Logística Zacatlán", layout="wide")
 
 COLORS = ['#E74C3C', '#8E44AD', '#3498DB', '#1ABC9C', '#F1C40F', '#E67E22', '#34495E', '#95A5A6']
 
-# ==============================================================================
-# FUNCION MAESTRA: LIMPIEZA DE COORDENADAS
-# ==============================================================================
-def limpiar_y_convertir_universal(coord):
-    if pd.isna(coord): return 0
-    if isinstance(coord, (int, float)): return float(coord)
-    s = str(coord).upper().strip()
-    signo = -1 if 'W' in s or 'S' in s or s.startswith('-') else 1
-    numeros = re.findall(r"(\d+(?:\.\d+)?)", s)
-    try:
-        if len(numeros) >= 3:
-            return (float(numeros[0]) + (float(numeros[1]) / 60) + (float(numeros[2]) / 3600)) * signo
-        elif len(numeros) >= 1:
-            return float(numeros[0]) * signo
-    except: return 0
-    return 0
+# Diagnóstico por etapa (opcional): casilla al final de la barra lateral o PIE_DIAGNOSTICO=1
+DIAGNOSTICO_DEFAULT = os.environ.get("PIE_DIAGNOSTICO") == "1"
+# La memoria (tracemalloc) se cuenta por sesión: queda prendida mientras alguna la use
+sesion_diag = st.session_state.setdefault("sesion_diagnostico", diagnostico.Sesion())
+if st.session_state.get("diagnostico", DIAGNOSTICO_DEFAULT):
+    diagnostico.activar(sesion=sesion_diag)
+else:
+    diagnostico.desactivar(sesion=sesion_diag)
+
+# Subir este número cuando cambie la lógica del cargador: invalida los artefactos en disco.
+VERSION_ARTEFACTOS = 6
 
 # ==============================================================================
 # 1. CARGA DE DATOS
 # ==============================================================================
-@st.cache_data
-def cargar_datos_zacatlan():
-    secc_path = "zacatlan_secciones_opt.geojson"
-    manz_path = "zacatlan_manzanas_opt.geojson" 
-    csv_path  = "data/raw/muestra_original.csv"
-    loc_coords_path = "data/raw/catalogo_localidades.csv" 
-    shp_raw_path = "data/raw/secciones_puebla/SECCION.shp" 
-    
-    # 1. CARGA GEOGRÁFICA
-    gdf_s = gpd.read_file(secc_path)
-    col_mapa = next((c for c in gdf_s.columns if 'seccion' in c.lower()), None)
-    if not col_mapa: st.stop()
-    
-    gdf_clean = gdf_s[[col_mapa, 'geometry']].copy()
-    gdf_clean = gdf_clean.rename(columns={col_mapa: 'seccion'})
-    gdf_clean['seccion'] = gdf_clean['seccion'].astype(int)
-    gdf_clean = gdf_clean.loc[:, ~gdf_clean.columns.duplicated()]
+ENTRADAS_ZACATLAN = (
+    "zacatlan_secciones_opt.geojson",
+    "zacatlan_manzanas_opt.geojson",
+    "data/raw/muestra_original.csv",
+    "data/raw/catalogo_localidades.csv",
+)
 
-    gdf_m = gpd.read_file(manz_path)
-    gdf_m = gdf_m.loc[:, ~gdf_m.columns.duplicated()]
+@st.cache_data
+def huella_datos_zacatlan():
+    """Huella de los archivos de entrada (misma vigencia que cargar_datos_zacatlan)."""
+    return huella_archivos(list(ENTRADAS_ZACATLAN), extra=VERSION_ARTEFACTOS)
 
-    # 2. PROCESAMIENTO CSV MUESTRA
-    df_csv = pd.read_csv(csv_path)
-    df_csv.columns = [c.lower().strip() for c in df_csv.columns]
+@st.cache_resource
+def cargar_datos_zacatlan():
+    """
+    Secciones, manzanas y pines compactos: un solo objeto por proceso para
+    todas las sesiones y llamadas (cache_resource no copia). Son de solo
+    lectura: las vistas se derivan con assign/iloc/filtros, nunca in situ.
+    """
+    secc_path, manz_path, csv_path, loc_coords_path = ENTRADAS_ZACATLAN
+
+    # 0. ARTEFACTOS EN DISCO: si ninguna entrada cambió, leemos Parquet y listo
+    huella = huella_datos_zacatlan()
+    artefactos = leer_artefactos("zacatlan", huella)
+    if artefactos is not None:
+        return artefactos['secciones'], artefactos['manzanas'], artefactos['pines']
     
-    col_enc = next((c for c in df_csv.columns if 'encuestas_totales' in c), 'encuestas_totales')
-    col_mza = next((c for c in df_csv.columns if 'manzanas_meta' in c), None)
-    col_sec = next((c for c in df_csv.columns if 'seccion' in c), 'seccion')
-    col_loc = next((c for c in df_csv.columns if 'localidad' in c or 'nom_loc' in c), None)
+    gdf_final, gdf_m, df_pines = cargar_datos(secc_path, manz_path, csv_path, loc_coords_path)
+
+    guardar_artefactos("zacatlan", huella, {
+        'secciones': gdf_final, 'manzanas': gdf_m, 'pines': df_pines
+    })
+
+    return gdf_final, gdf_m, df_pines
+
+@st.cache_resource
+def contexto_en_segundo_plano():
+    """
+    Capa de contexto (decorativa) cargada en los hilos compartidos: la página
+    no la espera; se agrega al mapa en cuanto está lista.
+    """
+    gdf_s, _, _ = cargar_datos_zacatlan()
+    return ejecutor_optimizacion().submit(cargar_contexto, "data/raw/secciones_puebla/SECCION.shp", gdf_s)
+
+@st.cache_resource
+def geometria_secciones():
+    """Centroides (UTM y WGS84), bounds y áreas de las secciones, una vez por carga."""
+    gdf_s, _, _ = cargar_datos_zacatlan()
+    return TablaGeometria(gdf_s)
+
+@st.cache_resource
+def geometria_manzanas():
+    """Lo mismo para las manzanas (por posición: no tienen id único)."""
+    _, gdf_m, _ = cargar_datos_zacatlan()
+    return TablaGeometria(gdf_m, col_id=None)
+
+@st.cache_resource
+def ejecutor_optimizacion():
+    """Hilos de fondo (optimización y contexto), compartidos por todas las sesiones."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="optimizacion")
+
+@st.cache_resource(max_entries=32)
+def plan_optimo(n_rutas, ruta_red, pesos, tolerancia):
+    """
+    Optimización en segundo plano, una por combinación de parámetros. Devuelve
+    el Future de (plan, etapas medidas en el hilo) para el panel de diagnóstico.
+    """
+    gdf_s, _, _ = cargar_datos_zacatlan()
+    return ejecutor_optimizacion().submit(
+        diagnostico.en_segundo_plano(balanced_cluster_optimization), gdf_s, n_rutas,
+        costos=red_vial(ruta_red) if ruta_red else None, pesos=list(pesos) if pesos else None,
+        tolerancia=tolerancia, geometria=geometria_secciones()
+    )
+
+@st.cache_resource
+def precalentar_soluciones():
+    """Al arrancar el proceso: planes por conteo para todo el rango del slider (1-8), en segundo plano."""
+    gdf_s, _, _ = cargar_datos_zacatlan()
+    return precalentar(gdf_s, range(1, 9), geometria=geometria_secciones())
+
+@st.cache_resource
+def preparar_teselas_manzanas():
+    """Genera (una vez por cambio del GeoJSON) las teselas de la traza urbana en static/."""
+    manz_path = "zacatlan_manzanas_opt.geojson"
+    try:
+        if not teselas_vigentes("manzanas", manz_path):
+            generar_teselas_manzanas(manz_path, "zacatlan_secciones_opt.geojson")
+        return cargar_indice_teselas("manzanas")
+    except Exception as e:
+        print(f"Teselas no disponibles, se incrusta el GeoJSON: {e}")
+        return None
+
+@st.cache_resource
+def indice_manzanas():
+    """Índice sección -> manzanas (CSR), construido una vez por proceso."""
+    _, gdf_m, _ = cargar_datos_zacatlan()
+    return IndiceSeccionManzana(gdf_m['SECCION'])
 
-    if not col_mza: df_csv['manzanas_meta'] = 1; col_mza = 'manzanas_meta'
-    if not col_loc: df_csv['nom_localidad'] = "Sin Dato"; col_loc = 'nom_localidad'
+@st.cache_data
+def capas_por_zoom(zoom):
+    """
+    Geometrías de las secciones (indexadas por id) para dibujar a ese zoom.
+    Se leen de la pirámide pre-generada (procesar_zacatlan_final.py) o se
+    simplifican aquí una sola vez por nivel.
+    """
+    gdf_s, _, _ = cargar_datos_zacatlan()
+
+    nivel_s = cargar_nivel("secciones", zoom)
+    if nivel_s is None:
+        nivel_s = simplificar_nivel(gdf_s[['seccion', 'geometry']], zoom)
+    else:
+        nivel_s = nivel_s.rename(columns={'SECCION': 'seccion'})
+    return nivel_s.set_index(nivel_s['seccion'].astype(int)).geometry
 
-    df_csv[col_enc] = pd.to_numeric(df_csv[col_enc], errors='coerce').fillna(0)
-    df_csv[col_mza] = pd.to_numeric(df_csv[col_mza], errors='coerce').fillna(0)
-    df_csv[col_loc] = df_csv[col_loc].fillna("").astype(str)
+@st.cache_data
+def contexto_por_zoom(zoom):
+    """Contexto simplificado para ese zoom (pirámide o recorte; llamar cuando ya esté listo)."""
+    ctx = cargar_nivel("contexto", zoom)
+    if ctx is None:
+        gdf_ctx = contexto_en_segundo_plano().result()
+        ctx = simplificar_nivel(gdf_ctx, zoom) if not gdf_ctx.empty else None
+    return ctx if ctx is not None else gpd.GeoDataFrame()
+
+@st.cache_resource
+def red_vial(ruta):
+    """Grafo CSR de la red vial (compartido entre sesiones; su caché vive en disco)."""
+    return RedVial.desde_archivo(ruta)
 
-    # PREPARAR DATAFRAME DE PINES (DETALLE)
-    df_pines = df_csv[[col_sec, col_loc, col_enc]].copy()
-    df_pines.columns = ['seccion', 'Localidad', 'Encuestas']
-    df_pines['KEY_LOC'] = df_pines['Localidad'].astype(str).str.upper().str.strip()
+@st.cache_data
+def muestra_de_manzanas(semilla, pps):
+    """Sorteo de Manzanas_Obj manzanas por sección (mismo resultado con la misma semilla)."""
+    gdf_secc, gdf_m, _ = cargar_datos_zacatlan()
+    metas = gdf_secc.set_index('seccion')['Manzanas_Obj']
+    secc_m = gdf_m['SECCION'].to_numpy()
+    pesos = geometria_manzanas().area_m2 if pps else None
+    seleccion = seleccionar_manzanas(secc_m, metas, claves_geometria(gdf_m.geometry.values), pesos, semilla)
+    return seleccion, resumen_seleccion(seleccion, metas, secc_m)
+
+# La llave es la huella del plan (datos + asignación + sorteo): los datos por
+# brigada y las capas se serializan solo cuando el plan es nuevo, no en cada rerun.
+@st.cache_resource(max_entries=8)
+def paquetes_brigadas(huella, _gdf_asignado, _df_rutas, _df_seleccion):
+    """Arranca (una vez por plan) la generación en segundo plano de los paquetes de campo."""
+    limpiar_paquetes(huella)
+    with diagnostico.etapa("paquetes.datos"):
+        datos = datos_paquetes(_gdf_asignado, _df_rutas, manzanas_en_muestra(_df_seleccion))
+    return PaquetesBrigadas(huella, datos)
+
+@st.cache_resource(max_entries=8)
+def exportaciones_plan(huella, _gdf_asignado, _df_rutas, _df_seleccion):
+    """Arranca (una vez por plan) la escritura de GeoParquet / GeoPackage / JSON, completo y por brigada."""
+    limpiar_paquetes(huella, dir_base=DIR_EXPORTACIONES)
+    return ExportacionesPlan(huella, capas_plan(_gdf_asignado, _df_rutas, manzanas_en_muestra(_df_seleccion)))
+
+def manzanas_en_muestra(df_seleccion):
+    """Geometría y atributos de las manzanas sorteadas (None si no hay sorteo)."""
+    if df_seleccion is None or df_seleccion.empty:
+        return None
+    _, gdf_m, _ = cargar_datos_zacatlan()
+    return gdf_m.iloc[df_seleccion['posicion'].to_numpy()][['geometry']].assign(
+        seccion=df_seleccion['seccion'].to_numpy(),
+        Orden_Sorteo=df_seleccion['Orden_Sorteo'].to_numpy(),
+        Prob_Inclusion=df_seleccion['Prob_Inclusion'].to_numpy(),
+    )
+
+def datos_paquetes(gdf_asignado, df_rutas, gdf_manz_sel):
+    """Datos simples (GeoJSON/dicts) por brigada para los procesos de exportación."""
+    datos = []
+    for gid, secciones in gdf_asignado.groupby('Grupo_ID'):
+        paradas = df_rutas[df_rutas['Grupo_ID'] == gid]
+        manz = None
+        if gdf_manz_sel is not None:
+            sel = gdf_manz_sel[gdf_manz_sel['seccion'].isin(secciones['seccion'])]
+            manz = sel.to_json() if not sel.empty else None
+        datos.append({
+            'grupo': int(gid),
+            'color': COLORS[(int(gid) - 1) % len(COLORS)],
+            'secciones': secciones[['seccion', 'Meta', 'geometry']].to_json(),
+            'manzanas': manz,
+            'paradas': json.loads(paradas[['Orden', 'seccion', 'Localidad', 'Encuestas', 'lat', 'lon', 'Dist_Acum_km']].to_json(orient='records')),
+            'km': float(paradas['Dist_Tramo_km'].sum()),
+        })
+    return datos
 
-    # PROCESAMIENTO CATÁLOGO
-    try:
-        try: df_coords = pd.read_csv(loc_coords_path, encoding='utf-8')
-        except: df_coords = pd.read_csv(loc_coords_path, encoding='latin-1')
-        
-        df_coords.columns = [c.lower().strip() for c in df_coords.columns]
-        c_lat = next((c for c in df_coords.columns if 'lat' in c), None)
-        c_lon = next((c for c in df_coords.columns if 'lon' in c), None)
-        c_nom = next((c for c in df_coords.columns if 'nom' in c or 'loc' in c), None)
-        
-        if c_lat and c_lon and c_nom:
-            df_coords['CAT_LAT'] = df_coords[c_lat].apply(limpiar_y_convertir_universal)
-            df_coords['CAT_LON'] = df_coords[c_lon].apply(limpiar_y_convertir_universal)
-            df_coords['KEY_LOC'] = df_coords[c_nom].astype(str).str.upper().str.strip()
-            
-            df_coords_clean = df_coords[(df_coords['CAT_LAT'] != 0) & (df_coords['CAT_LON'] != 0)].copy()
-            df_coords_clean = df_coords_clean[['KEY_LOC', 'CAT_LAT', 'CAT_LON']].drop_duplicates(subset=['KEY_LOC'])
-            
-            df_pines = df_pines.merge(df_coords_clean, on='KEY_LOC', how='left')
-    except Exception as e: print(f"Error coords: {e}")
-
-    # AGRUPAMIENTO (PARA POLIGONOS)
-    agg_rules = {
-        col_enc: 'sum',
-        col_mza: 'sum',
-        col_loc: lambda x: ', '.join(sorted(set(x.unique())))
-    }
-    df_agrupado = df_csv.groupby(col_sec).agg(agg_rules).reset_index()
-    df_agrupado.columns = ['seccion', 'Meta', 'Manzanas_Obj', 'Localidad_Full']
-
-    gdf_final = gdf_clean.merge(df_agrupado, on='seccion', how='left')
-    gdf_final['Meta'] = gdf_final['Meta'].fillna(0).astype(int)
-    gdf_final['Manzanas_Obj'] = gdf_final['Manzanas_Obj'].fillna(0).astype(int)
-
-    # CONTEXTO
-    try:
-        gdf_raw = gpd.read_file(shp_raw_path)
-        col_mun = next((c for c in gdf_raw.columns if 'MUN' in c.upper()), None)
-        if col_mun:
-            mask = gdf_raw[col_mun].astype(str).str.upper().str.contains("ZACATLAN") | (gdf_raw[col_mun] == 208)
-            gdf_contexto = gdf_raw[mask].copy()
-        else:
-            gdf_contexto = gpd.GeoDataFrame()
-        
-        if not gdf_contexto.empty:
-            gdf_contexto = gdf_contexto.to_crs("EPSG:4326")
-            ids_muestra = gdf_final['seccion'].unique()
-            col_sec_raw = next((c for c in gdf_contexto.columns if 'SECC' in c.upper()), None)
-            if col_sec_raw:
-                gdf_contexto = gdf_contexto[~gdf_contexto[col_sec_raw].astype(int).isin(ids_muestra)]
-            gdf_contexto = gdf_contexto[[col_sec_raw, 'geometry']]
-    except:
-        gdf_contexto = gpd.GeoDataFrame()
-
-    return gdf_final, gdf_m, gdf_contexto, df_pines
+@st.cache_data
+def plan_de_visita(df_paradas):
+    """Orden de visita de cada brigada (se recalcula solo si cambia la asignación)."""
+    return secuenciar_brigadas(df_paradas)
+
+@diagnostico.medida("paradas_por_brigada")
+def paradas_por_brigada(gdf_asignado, df_pines):
+    """Localidades con su brigada y coordenadas UTM (para medir en metros) y WGS84 (para el mapa)."""
+    gdf_p = construir_pines(df_pines, geometria_secciones().indice_centroides(), columnas_extra=('Encuestas',))
+    utm = gdf_p.geometry.to_crs("EPSG:32614")
+    df = pd.DataFrame({
+        'seccion': gdf_p['seccion'].to_numpy(), 'Localidad': gdf_p['Localidad'].to_numpy(),
+        'Encuestas': gdf_p['Encuestas'].to_numpy(),
+        'x': utm.x.to_numpy(), 'y': utm.y.to_numpy(),
+        'lat': gdf_p.geometry.y.to_numpy(), 'lon': gdf_p.geometry.x.to_numpy(),
+    })
+    return df.merge(gdf_asignado[['seccion', 'Grupo_ID']], on='seccion', how='inner')
 
 try:
-    gdf_secciones, gdf_manzanas, gdf_contexto, df_pines_raw = cargar_datos_zacatlan()
+    with diagnostico.etapa("carga") as r:
+        gdf_secciones, gdf_manzanas, df_pines_raw = cargar_datos_zacatlan()
+        if r is not None:
+            r['bytes'] = sum(map(diagnostico.bytes_de, (gdf_secciones, gdf_manzanas, df_pines_raw)))
 except Exception as e:
     st.error(f"⚠️ Error cargando datos: {e}")
     st.stop()
 
+precalentar_soluciones()
+
 # ==============================================================================
 # UI
 # ==============================================================================
@@ -151,21 +270,91 @@ with st.sidebar:
     st.header("⚙️ Configuración")
     total_personal = st.number_input("Encuestadores:", min_value=1, value=30)
     n_rutas = st.slider("Brigadas/Rutas:", 1, 8, 6)
+
+    # Costo de traslado: línea recta, o tiempos por carretera si hay red vial en disco
+    ruta_red = buscar_red_vial()
+    costos = None
+    if ruta_red:
+        tipo_costo = st.radio("Costo de traslado:", ["Línea recta", "Red vial"], horizontal=True)
+        if tipo_costo == "Red vial":
+            costos = red_vial(ruta_red)
+
+    # Balanceo: mismo número de secciones, o misma carga (encuestas y manzanas)
+    modo_balance = st.radio("⚖️ Balancear por:", ["Nº de secciones", "Carga (Meta + Manzanas)"])
+    pesos, tolerancia = None, 0.10
+    if modo_balance.startswith("Carga"):
+        pesos = ['Meta', 'Manzanas_Obj']
+        tolerancia = st.slider("Tolerancia de carga (%)", 5, 30, 10, step=5) / 100
     
-    with st.spinner(f"Optimizando..."):
-        gdf_view = balanced_cluster_optimization(gdf_secciones.copy(), n_rutas)
-        gdf_view = gdf_view.loc[:, ~gdf_view.columns.duplicated()]
+    # Optimización sin bloquear: si el plan no está en memoria se calcula en
+    # segundo plano y mientras tanto se dibuja un barrido rápido (preliminar).
+    plan_pendiente = None
+    with diagnostico.etapa("optimizacion", brigadas=n_rutas) as r:
+        # El plan que esta sesión esperaba ya terminó: sus etapas (medidas en
+        # el hilo de optimización) van al diagnóstico aunque el plan se lea de la memoria
+        previo = st.session_state.get("plan_en_espera")
+        if previo is not None and previo.done():
+            del st.session_state["plan_en_espera"]
+            if previo.exception() is None:
+                diagnostico.agregar(previo.result()[1], hilo="optimizacion")
+        gdf_view = solucion_en_memoria(gdf_secciones, n_rutas, costos=costos, pesos=pesos, tolerancia=tolerancia)
+        if gdf_view is None:
+            futuro = plan_optimo(n_rutas, ruta_red if costos is not None else None,
+                                 tuple(pesos) if pesos else None, tolerancia)
+            try:
+                if futuro.done():
+                    gdf_view, etapas_fondo = futuro.result()
+                    if futuro is not previo:
+                        diagnostico.agregar(etapas_fondo, hilo="optimizacion")
+                else:
+                    plan_pendiente = st.session_state["plan_en_espera"] = futuro
+            except Exception as e:
+                plan_optimo.clear()
+                st.error(f"⚠️ Falló la optimización, se muestra el plan preliminar: {e}")
+            if gdf_view is None:
+                gdf_view = asignacion_rapida(gdf_secciones, n_rutas, pesos, geometria_secciones())
+        if r is not None:
+            r['preliminar'] = plan_pendiente is not None
+    gdf_view = gdf_view.loc[:, ~gdf_view.columns.duplicated()]
+    # Orden de visita dentro de cada brigada (todas, antes de filtrar)
+    with diagnostico.etapa("rutas"):
+        df_rutas = plan_de_visita(paradas_por_brigada(gdf_view, df_pines_raw))
+    truncadas = df_rutas.attrs.get('rutas_truncadas')
+    if truncadas:
+        st.warning(f"⚠️ La mejora del orden de visita llegó a su tope en las brigadas {', '.join(map(str, truncadas))}: "
+                   "ese recorrido puede no ser el más corto.")
     
-    st.success("✅ Rutas Listas")
+    if plan_pendiente is None:
+        st.success("✅ Rutas Listas")
+    else:
+        st.info("⏳ Plan preliminar: el óptimo aparece en cuanto termine de calcularse.")
+
+    # Carga por brigada (encuestadores repartidos en proporción a la Meta)
+    carga = gdf_view.groupby('Grupo_ID').agg(
+        Secc=('seccion', 'size'), Meta=('Meta', 'sum'), Manz=('Manzanas_Obj', 'sum')
+    )
+    carga['Pers'] = (total_personal * carga['Meta'] / carga['Meta'].sum()).round(1)
+    st.dataframe(carga, use_container_width=True)
+    if pesos:
+        # Secciones muy pesadas pueden impedir la banda: se avisa cuál brigada y cuánto
+        objetivo = carga[['Meta', 'Manz']].sum() / len(carga)
+        desvio = (carga[['Meta', 'Manz']] / objetivo - 1).abs()
+        fuera = desvio.stack()[lambda d: d > tolerancia + 1e-9]
+        if not fuera.empty:
+            gid, col = fuera.idxmax()
+            unidad = {'Meta': 'encuestas', 'Manz': 'manzanas'}[col]
+            st.warning(f"⚠️ No se alcanzó la tolerancia de ±{tolerancia:.0%}: la brigada {gid} queda con "
+                       f"{carga.loc[gid, col]} {unidad} (objetivo {objetivo[col]:.1f}).")
     st.divider()
     
+    gdf_asignado = gdf_view
     grupos_disp = sorted(gdf_view['Grupo_ID'].unique())
     filtro_grupo = st.selectbox("🔍 Filtrar:", ["Todas"] + list(grupos_disp))
     
     if filtro_grupo != "Todas":
         gdf_view = gdf_view[gdf_view['Grupo_ID'] == filtro_grupo]
-        gdf_manzanas_view = gpd.sjoin(gdf_manzanas, gdf_view[['geometry']], how='inner', predicate='intersects')
-        gdf_manzanas_view = gdf_manzanas_view.loc[:, ~gdf_manzanas_view.columns.duplicated()]
+        # Gather por índice (sin sjoin): manzanas de las secciones de la brigada
+        gdf_manzanas_view = gdf_manzanas.iloc[indice_manzanas().filas_de(gdf_view['seccion'].to_numpy())]
         
         secciones_visibles = gdf_view['seccion'].unique()
         df_pines_view = df_pines_raw[df_pines_raw['seccion'].isin(secciones_visibles)]
@@ -178,6 +367,19 @@ with st.sidebar:
         zoom_start = 12
         stroke_weight = 1
 
+    # Sorteo de manzanas en muestra
+    st.divider()
+    sortear = st.checkbox("🎲 Seleccionar manzanas en muestra")
+    if sortear:
+        semilla = st.number_input("Semilla:", min_value=0, value=SEMILLA_DEFAULT, step=1)
+        pps = st.checkbox("Probabilidad proporcional al área (PPS)")
+        with diagnostico.etapa("muestra_manzanas"):
+            df_seleccion_total, df_resumen_sel = muestra_de_manzanas(int(semilla), pps)
+        df_seleccion = df_seleccion_total[df_seleccion_total['seccion'].isin(gdf_view['seccion'])]
+        faltantes = df_resumen_sel[df_resumen_sel['Faltantes'] > 0]
+        if not faltantes.empty:
+            st.warning(f"⚠️ {len(faltantes)} secciones con menos manzanas que su meta.")
+
 k1, k2, k3, k4 = st.columns(4)
 total_meta = gdf_secciones['Meta'].sum()
 with k1: st.metric("🎯 Meta Encuestas", f"{total_meta}")
@@ -189,18 +391,20 @@ st.markdown("<br>", unsafe_allow_html=True)
 # ==============================================================================
 # MAPA VISUAL
 # ==============================================================================
-if not gdf_contexto.empty and filtro_grupo == "Todas":
-    lat = gdf_contexto.geometry.centroid.y.mean()
-    lon = gdf_contexto.geometry.centroid.x.mean()
-else:
-    lat = gdf_view.geometry.centroid.y.mean()
-    lon = gdf_view.geometry.centroid.x.mean()
+lat, lon = geometria_secciones().centro(gdf_view['seccion'].to_numpy())
 
 m = folium.Map([lat, lon], zoom_start=zoom_start, tiles="CartoDB positron")
 
-# 1. CONTEXTO
-if not gdf_contexto.empty:
-    gdf_contexto_simple = gdf_contexto.simplify(tolerance=0.0001)
+# Geometrías del nivel de la pirámide que corresponde a este zoom
+with diagnostico.etapa("mapa.geometrias_zoom", zoom=zoom_start):
+    geom_secciones_zoom = capas_por_zoom(zoom_start)
+geom_zoom = geom_secciones_zoom.reindex(gdf_view['seccion']).values
+gdf_view_mapa = gdf_view.set_geometry(np.where(pd.isna(geom_zoom), gdf_view.geometry.values, geom_zoom), crs=gdf_view.crs)
+
+# 1. CONTEXTO (solo si el hilo de fondo ya terminó; si no, entra en un rerun posterior)
+contexto_listo = contexto_en_segundo_plano().done()
+gdf_contexto_simple = contexto_por_zoom(zoom_start) if contexto_listo else gpd.GeoDataFrame()
+if not gdf_contexto_simple.empty:
     folium.GeoJson(
         gdf_contexto_simple,
         name="Contexto",
@@ -214,64 +418,71 @@ def get_style(feature):
     return {'fillColor': COLORS[(gid - 1) % len(COLORS)], 'color': 'black', 'weight': stroke_weight, 'fillOpacity': 0.6}
 
 # Guardamos el objeto geo_json para el buscador
-geo_json = folium.GeoJson(
-    gdf_view,
-    name="Secciones (Polígonos)",
-    style_function=get_style,
-    tooltip=folium.GeoJsonTooltip(fields=['seccion', 'Localidad_Full', 'Grupo_ID', 'Meta'], localize=True),
-    popup=folium.GeoJsonPopup(fields=['seccion'])
-).add_to(m)
-
-# 3. PINES MULTIPLES POR SECCION (AGRUPADOS EN CAPA)
-# --- CAMBIO IMPORTANTE: Creamos un FeatureGroup ---
-# Esto permite prender/apagar los pines desde el menú de capas del mapa
-layer_pines = folium.FeatureGroup(name="📍 Pines Localidades", show=True)
-
-for idx, row in df_pines_view.iterrows():
-    loc_name = row['Localidad']
-    sec_id = row['seccion']
-    
-    if 'CAT_LAT' in row and pd.notnull(row['CAT_LAT']) and row['CAT_LAT'] != 0:
-        c_lat = row['CAT_LAT']
-        c_lon = row['CAT_LON']
-        icon_color = 'green'
-        source = "📍 Exacta"
-        
-        folium.Marker(
-            location=[c_lat, c_lon],
-            tooltip=f"<b>{loc_name}</b><br>Sección {sec_id}<br>{source}",
-            icon=folium.Icon(color=icon_color, icon='pushpin', prefix='glyphicon')
-        ).add_to(layer_pines) # Se añade al GRUPO, no directo al mapa
-        
-    else:
-        # PINES ESTIMADOS
-        geom = gdf_view[gdf_view['seccion'] == sec_id]
-        if not geom.empty:
-            c_lat = geom.geometry.centroid.y.values[0]
-            base_lon = geom.geometry.centroid.x.values[0]
-            
-            random.seed(int(sec_id) + idx) 
-            offset_lat = random.uniform(-0.0015, 0.0015)
-            offset_lon = random.uniform(-0.0015, 0.0015)
-            
-            folium.Marker(
-                location=[c_lat + offset_lat, base_lon + offset_lon],
-                tooltip=f"<b>{loc_name}</b><br>Sección {sec_id}<br>📐 Estimada",
-                icon=folium.Icon(color='red', icon='info-sign', prefix='glyphicon')
-            ).add_to(layer_pines) # Se añade al GRUPO
-
-# Añadimos el grupo al mapa
-layer_pines.add_to(m)
+with diagnostico.etapa("mapa.secciones") as r:
+    geo_json = folium.GeoJson(
+        gdf_view_mapa,
+        name="Secciones (Polígonos)",
+        style_function=get_style,
+        tooltip=folium.GeoJsonTooltip(fields=['seccion', 'Localidad_Full', 'Grupo_ID', 'Meta'], localize=True),
+        popup=folium.GeoJsonPopup(fields=['seccion'])
+    ).add_to(m)
+    if r is not None:
+        r['bytes'] = diagnostico.bytes_de(geo_json)
+
+# 3. PINES MULTIPLES POR SECCION (UNA SOLA CAPA)
+# Centroides vía índice sección -> centroide, jitter vectorizado y una sola
+# capa GeoJSON (se puede prender/apagar desde el menú de capas del mapa)
+with diagnostico.etapa("mapa.pines") as r:
+    gdf_pines_view = construir_pines(df_pines_view, geometria_secciones().indice_centroides())
+    if not gdf_pines_view.empty:
+        capa = capa_pines(gdf_pines_view).add_to(m)
+        if r is not None:
+            r['bytes'] = diagnostico.bytes_de(capa)
+
+# 3b. RECORRIDOS (orden de visita de cada brigada)
+df_rutas_view = df_rutas[df_rutas['Grupo_ID'].isin(gdf_view['Grupo_ID'].unique())]
+capa_recorridos = folium.FeatureGroup(name="🧭 Recorridos", show=(filtro_grupo != "Todas"))
+for gid, paradas in df_rutas_view.groupby('Grupo_ID'):
+    if len(paradas) > 1:
+        folium.PolyLine(
+            paradas[['lat', 'lon']].to_numpy().round(6).tolist(),
+            color=COLORS[(gid - 1) % len(COLORS)], weight=3, opacity=0.8, dash_array='6,4',
+            tooltip=f"Brigada {gid}: {paradas['Dist_Tramo_km'].sum():.1f} km"
+        ).add_to(capa_recorridos)
+capa_recorridos.add_to(m)
 
 # 4. MANZANAS
 ver_manz = st.sidebar.checkbox("Mostrar Traza Urbana", value=(filtro_grupo != "Todas"))
-if ver_manz and not gdf_manzanas_view.empty:
+estilo_manzanas = {'fillColor':'transparent', 'color':'#444', 'weight':0.5, 'dashArray':'2,2'}
+indice_teselas = preparar_teselas_manzanas() if ver_manz else None
+capa_teselas = None
+if ver_manz and indice_teselas:
+    # El navegador descarga solo las teselas visibles (no se incrustan los polígonos).
+    # Solo sirve dentro de la app: el HTML descargado las lleva incrustadas.
+    url_teselas = "/" + "/".join(p for p in [st.get_option("server.baseUrlPath").strip("/"), "app/static/teselas/manzanas"] if p)
+    capa_teselas = CapaTeselasGeoJSON(
+        url_teselas, indice_teselas, name="Manzanas",
+        secciones=None if filtro_grupo == "Todas" else gdf_view['seccion'].tolist(),
+        estilo=estilo_manzanas, tooltip="Manzana"
+    ).add_to(m)
+elif ver_manz and not gdf_manzanas_view.empty:
     folium.GeoJson(
-        gdf_manzanas_view, name="Manzanas",
-        style_function=lambda x: {'fillColor':'transparent', 'color':'#444', 'weight':0.5, 'dashArray':'2,2'},
+        simplificar_nivel(gdf_manzanas_view, zoom_start), name="Manzanas",
+        style_function=lambda x: estilo_manzanas,
         tooltip="Manzana"
     ).add_to(m)
 
+# 5. MANZANAS EN MUESTRA (resaltadas)
+if sortear and not df_seleccion.empty:
+    gdf_seleccion = gdf_manzanas.iloc[df_seleccion['posicion'].to_numpy()][['geometry']].assign(
+        seccion=df_seleccion['seccion'].to_numpy(), Orden_Sorteo=df_seleccion['Orden_Sorteo'].to_numpy()
+    )
+    folium.GeoJson(
+        simplificar_nivel(gdf_seleccion, 16), name="🎯 Manzanas en muestra",
+        style_function=lambda x: {'fillColor': '#E74C3C', 'color': '#C0392B', 'weight': 1.5, 'fillOpacity': 0.7},
+        tooltip=folium.GeoJsonTooltip(fields=['seccion', 'Orden_Sorteo'], aliases=['Sección', 'Sorteo'])
+    ).add_to(m)
+
 # --- CONTROLES Y BUSCADOR ---
 Search(
     layer=geo_json,
@@ -286,20 +497,121 @@ Fullscreen().add_to(m)
 # LAYER CONTROL (Esto es lo que permite apagar los pines)
 folium.LayerControl().add_to(m)
 
-st_folium(m, height=600, use_container_width=True)
+with diagnostico.etapa("st_folium") as r:
+    if r is not None:
+        r['bytes'] = diagnostico.bytes_de(m)
+    st_folium(m, height=600, use_container_width=True)
+
+# Trabajo en segundo plano que el mapa aún no muestra (contexto, plan óptimo):
+# en cuanto algo termina se vuelve a ejecutar la página para incorporarlo.
+en_espera = [f for f in (None if contexto_listo else contexto_en_segundo_plano(), plan_pendiente) if f is not None]
+if en_espera:
+    @st.fragment(run_every=1)
+    def esperar_segundo_plano():
+        if any(f.done() for f in en_espera):
+            st.rerun(scope="app")
+
+    esperar_segundo_plano()
 
 # TABLA FINAL
 col1, col2 = st.columns([2, 1])
 with col1:
     st.subheader("📋 Detalle por Localidad")
-    df_detalle = df_pines_view.merge(gdf_view[['seccion', 'Grupo_ID']], on='seccion', how='left')
-    df_detalle = df_detalle[['Grupo_ID', 'seccion', 'Localidad', 'Encuestas']].sort_values(['Grupo_ID', 'seccion'])
+    df_detalle = df_rutas_view[['Grupo_ID', 'Orden', 'seccion', 'Localidad', 'Encuestas', 'Dist_Tramo_km', 'Dist_Acum_km']]
     st.dataframe(df_detalle, use_container_width=True, hide_index=True)
 
 with col2:
     st.info("📤 Exportar")
-    csv = df_detalle.to_csv(index=False).encode('utf-8')
-    st.download_button("⬇️ Descargar CSV", csv, "plan_detallado.csv", "text/csv", type="primary", use_container_width=True)
-    map_html = io.BytesIO()
-    m.save(map_html, close_file=False)
-    st.download_button("🌍 Descargar Mapa HTML", map_html.getvalue(), "mapa_zacatlan.html", "text/html", use_container_width=True)
\ No newline at end of file
+    st.caption("🧭 Km estimados en línea recta por brigada")
+    st.dataframe(resumen_rutas(df_rutas_view), use_container_width=True, hide_index=True)
+    st.download_button("⬇️ Descargar CSV", lambda: df_detalle.to_csv(index=False).encode('utf-8'), "plan_detallado.csv", "text/csv", type="primary", use_container_width=True)
+    if sortear and not df_seleccion.empty:
+        gdf_export = gdf_seleccion.copy(deep=False)
+        if 'MANZANA_ID' in gdf_manzanas.columns:
+            gdf_export['MANZANA_ID'] = gdf_manzanas['MANZANA_ID'].iloc[df_seleccion['posicion'].to_numpy()].to_numpy()
+        gdf_export['Prob_Inclusion'] = df_seleccion['Prob_Inclusion'].to_numpy()
+        punto = gdf_export.geometry.representative_point()
+        gdf_export['lat'] = punto.y.round(6)
+        gdf_export['lon'] = punto.x.round(6)
+        csv_sel = gdf_export.drop(columns='geometry').to_csv(index=False).encode('utf-8')
+        st.download_button("🎲 Manzanas en muestra (CSV)", csv_sel, "manzanas_seleccionadas.csv", "text/csv", use_container_width=True)
+        st.download_button("🎲 Manzanas en muestra (GeoJSON)", gdf_export.to_json(), "manzanas_seleccionadas.geojson", "application/geo+json", use_container_width=True)
+    # El HTML se arma solo al pulsar el botón (y queda guardado por llave);
+    # el contexto entra en la llave porque aparece en un rerun posterior
+    huella_asignacion = huella_plan(gdf_asignado[['seccion', 'Grupo_ID']].values.tolist())
+    sorteo = (int(semilla), pps) if sortear else None
+    clave_mapa = (n_rutas, filtro_grupo, ver_manz, contexto_listo, huella_asignacion, sorteo)
+    def incrustar_manzanas():
+        # Fuera de la app (file://) no hay teselas: nivel de la pirámide de este zoom
+        if capa_teselas is not None:
+            capa_teselas.incrustar(simplificar_nivel(gdf_manzanas_view[['geometry']], zoom_start))
+    st.download_button("🌍 Descargar Mapa HTML", lambda: html_mapa(clave_mapa, m, incrustar_manzanas), "mapa_zacatlan.html", "text/html", use_container_width=True)
+
+    # Paquetes de campo por brigada (HTML + PDF), generados en segundo plano
+    # (solo para el plan final, no para el preliminar)
+    paquetes = exportaciones = None
+    if plan_pendiente is None:
+        df_sel_plan = df_seleccion_total if sortear else None
+        huella = huella_plan(huella_datos_zacatlan(), huella_asignacion, sorteo)
+        paquetes = paquetes_brigadas(huella, gdf_asignado, df_rutas, df_sel_plan)
+        # El plan que esta sesión dejó de ver sale de la cola (si otra sesión lo
+        # sigue consultando, se vuelve a encolar)
+        previo = st.session_state.get("paquetes_vigentes")
+        if previo is not None and previo is not paquetes:
+            previo.cancelar()
+        st.session_state["paquetes_vigentes"] = paquetes
+        exportaciones = exportaciones_plan(huella, gdf_asignado, df_rutas, df_sel_plan)
+
+    pendientes = [t for t in (paquetes, exportaciones) if t is not None and t.avance()[0] < t.avance()[1]]
+
+    @st.fragment(run_every=2 if pendientes else None)
+    def estado_paquetes():
+        if paquetes is None:
+            st.caption("⏳ Los paquetes de campo y las exportaciones se preparan con el plan final.")
+            return
+        grupos = None if filtro_grupo == "Todas" else [int(filtro_grupo)]
+        try:
+            listos, exportado = paquetes.listo(), exportaciones.listo()
+        except RuntimeError as e:
+            st.error(f"⚠️ {e}")
+            return
+        if listos:
+            nombre = "paquetes_brigadas.zip" if grupos is None else f"paquete_brigada_{filtro_grupo}.zip"
+            st.download_button("🗂️ Paquetes de campo (HTML + PDF)", lambda: paquetes.zip_bytes(grupos), nombre, "application/zip", use_container_width=True)
+        else:
+            hechos, total = paquetes.avance()
+            st.caption(f"⏳ Preparando paquetes de campo: {hechos}/{total} brigadas")
+
+        # Plan en formatos columnares (ya escritos a disco; se lee el archivo al pulsar)
+        if not exportado:
+            hechos, total = exportaciones.avance()
+            st.caption(f"⏳ Preparando exportaciones del plan: {hechos}/{total}")
+            return
+        formato = st.selectbox("Formato del plan", list(FORMATOS_EXPORTACION), key="formato_plan")
+        grupo = None if grupos is None else grupos[0]
+        extension, mime = FORMATOS_EXPORTACION[formato]
+        nombre = f"plan_zacatlan.{extension}" if grupo is None else f"plan_brigada_{grupo}.{extension}"
+        st.download_button(f"🧩 Plan ({formato})", lambda: exportaciones.contenido(formato, grupo), nombre, mime, use_container_width=True)
+
+    estado_paquetes()
+# ==============================================================================
+# DIAGNÓSTICO (tiempos y memoria de este rerun)
+# ==============================================================================
+with st.sidebar:
+    st.divider()
+    st.checkbox("🩺 Diagnóstico de rendimiento", value=DIAGNOSTICO_DEFAULT, key="diagnostico",
+                help="Mide tiempo, memoria y tamaño de cada etapa en el siguiente rerun")
+    if diagnostico.activo():
+        df_diag = diagnostico.registros()
+        memoria = estadisticas_memoria()
+        st.caption(f"🧠 Memoria de soluciones: {memoria['aciertos']} aciertos, {memoria['aciertos_disco']} desde disco, "
+                   f"{memoria['fallos']} fallos, {memoria['en_memoria']} en memoria")
+        if not df_diag.empty:
+            total = df_diag.loc[df_diag['nivel'] == 0, 'seg'].sum()
+            st.caption(f"⏱️ {total:.2f} s en etapas medidas · la memoria es la de todo el proceso "
+                       "(vacía si otra sesión estaba midiendo)")
+            vista = df_diag.assign(etapa=["· " * n + e for n, e in zip(df_diag['nivel'], df_diag['etapa'])])
+            st.dataframe(vista.drop(columns='nivel'), use_container_width=True, hide_index=True)
+            c_json, c_csv = st.columns(2)
+            c_json.download_button("JSON", diagnostico.a_json(), "diagnostico.json", "application/json", use_container_width=True)
+            c_csv.download_button("CSV", diagnostico.a_csv(), "diagnostico.csv", "text/csv", use_container_width=True)
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from src.lote import (
+    DIR_LOTE, cronometro, leer_definiciones, normalizar_definicion,
+    leer_secciones_estatales, procesar_municipio
+)
+from src.extraccion import TAM_BLOQUE
+
+# --- RUTAS DE LOS SHAPEFILES ESTATALES ---
+SHP_SECCIONES = "data/raw/secciones_puebla/SECCION.shp"
+SHP_MANZANAS = "data/raw/MANZANAS/MANZANAS.shp"
+CSV_MUESTRA = "data/raw/muestra_original.csv"
+
+parser = argparse.ArgumentParser(description="Recorte de secciones y manzanas para varios municipios en paralelo.")
+parser.add_argument("--definiciones", help="CSV/JSON con columnas clave[,nombre][,muestra]")
+parser.add_argument("--municipios", nargs="*", type=int, default=[], help="Claves de municipio (usan --muestra)")
+parser.add_argument("--muestra", default=CSV_MUESTRA, help="CSV de muestra por defecto")
+parser.add_argument("--secciones", default=SHP_SECCIONES)
+parser.add_argument("--manzanas", default=SHP_MANZANAS)
+parser.add_argument("--salida", default=DIR_LOTE)
+parser.add_argument("--procesos", type=int, default=os.cpu_count())
+parser.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    print("🚀 INICIANDO PROCESAMIENTO POR LOTE...")
+    tiempos = {}
+
+    definiciones = leer_definiciones(args.definiciones) if args.definiciones else []
+    definiciones += [normalizar_definicion({'clave': c}, args.muestra) for c in args.municipios]
+    if not definiciones:
+        parser.error("Indica --definiciones o --municipios.")
+    print(f"🎯 {len(definiciones)} municipios: {', '.join(str(d['clave']) for d in definiciones)}")
+
+    # 1. LECTURA ÚNICA DE SECCIONES ESTATALES
+    print("📂 Leyendo secciones estatales (una sola vez)...")
+    with cronometro(tiempos, 'lectura_secciones'):
+        gdf_secciones, col_seccion, col_mun = leer_secciones_estatales(
+            args.secciones, [d['clave'] for d in definiciones]
+        )
+    print(f"ℹ️ {len(gdf_secciones)} secciones; columna '{col_seccion}', municipio '{col_mun}'.")
+
+    # 2. UN PROCESO POR MUNICIPIO (cada uno recibe solo sus secciones)
+    print(f"⚙️ Procesando con {args.procesos} procesos...")
+    resultados = []
+    with cronometro(tiempos, 'municipios'):
+        with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+            futuros = {}
+            for d in definiciones:
+                if col_mun:
+                    propias = gdf_secciones[pd.to_numeric(gdf_secciones[col_mun], errors='coerce') == d['clave']]
+                else:
+                    propias = gdf_secciones
+                futuro = pool.submit(procesar_municipio, d, propias, col_seccion, args.manzanas,
+                                     args.salida, args.tam_bloque)
+                futuros[futuro] = d
+            for futuro in as_completed(futuros):
+                d = futuros[futuro]
+                try:
+                    r = futuro.result()
+                    print(f"✅ {r['clave']:03d} {r['nombre']}: {r['secciones']} secciones, {r['manzanas']} manzanas")
+                except Exception as e:
+                    r = {'clave': d['clave'], 'nombre': d['nombre'], 'error': str(e)}
+                    print(f"❌ {d['clave']:03d} {d['nombre']}: {e}")
+                resultados.append(r)
+
+    # 3. REPORTE DE TIEMPOS
+    resultados.sort(key=lambda r: r['clave'])
+    filas = [{'clave': r['clave'], 'nombre': r['nombre'], **r.get('tiempos', {})} for r in resultados]
+    print("\n⏱️ TIEMPOS POR ETAPA (segundos)")
+    print(pd.DataFrame(filas).set_index('clave').round(2).to_string())
+    print("\nGlobal: " + ", ".join(f"{k} {v:.2f}s" for k, v in tiempos.items()))
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_resumen = os.path.join(args.salida, "resumen.json")
+    with open(ruta_resumen, "w", encoding="utf-8") as f:
+        json.dump({'fecha': time.strftime("%Y-%m-%d %H:%M:%S"), 'tiempos': tiempos,
+                   'municipios': resultados}, f, ensure_ascii=False, indent=2)
+
+    print(f"""
+🎉 LOTE COMPLETADO
+------------------
+Artefactos por municipio en {args.salida}/<clave>_<nombre>/ (secciones_opt.geojson, manzanas_opt.geojson)
+Resumen: {ruta_resumen}
+""")
@@ -1,11 +1,14 @@
-import geopandas as gpd
-import pandas as pd
-import os
+from src.piramide import construir_piramide
+from src.extraccion import extraer_manzanas_streaming, filtro_por_campo
+from src.contexto import recortar_contexto, RUTA_CONTEXTO
+from src.esquema import ESQUEMA_MUESTRA, ESQUEMA_SECCIONES, leer_csv, leer_capa
 
 # --- RUTAS DE TUS ARCHIVOS ---
 SHP_SECCIONES = "data/raw/secciones_puebla/SECCION.shp"
 SHP_MANZANAS = "data/raw/MANZANAS/MANZANAS.shp"
 CSV_MUESTRA = "data/raw/muestra_original.csv"
+CLAVE_MUNICIPIO = 208
+CAMPOS_MUNICIPIO = ("MUNICIPIO", "CVE_MUN", "MUN")
 
 # --- RUTAS DE SALIDA ---
 OUT_SECCIONES = "zacatlan_secciones_opt.geojson"
@@ -15,47 +18,19 @@ print("🚀 INICIANDO RECORTE QUIRÚRGICO DE ZACATLÁN (VERSIÓN 2)...")
 
 # 1. CARGAR MUESTRA Y SECCIONES
 print("📂 Cargando secciones y muestra...")
-df_muestra = pd.read_csv(CSV_MUESTRA)
-gdf_secciones = gpd.read_file(SHP_SECCIONES)
-
-# --- CORRECCIÓN DEL ERROR DE GEOMETRÍA ---
-# Buscamos cuál es la columna de geometría real (geometry, GEOMETRY, shape, etc.)
-try:
-    # Intentamos obtener la geometría activa. Si falla, la buscamos manualmente.
-    _ = gdf_secciones.geometry.name
-except AttributeError:
-    # Si falla, buscamos columnas tipo geometría
-    geo_cols = gdf_secciones.select_dtypes(include=['geometry']).columns
-    if len(geo_cols) > 0:
-        print(f"🔧 Geometría detectada en columna: {geo_cols[0]}. Activando...")
-        gdf_secciones = gdf_secciones.set_geometry(geo_cols[0])
-    else:
-        # Fallback: a veces se carga como objeto pero se llama GEOMETRY
-        if 'GEOMETRY' in gdf_secciones.columns:
-            gdf_secciones = gdf_secciones.set_geometry('GEOMETRY')
-        else:
-            raise ValueError("❌ No se encontró columna de geometría en el Shapefile de Secciones.")
-
-# --- BÚSQUEDA INTELIGENTE DE LA COLUMNA 'SECCION' ---
-# No forzamos mayúsculas a todo para no romper nada más.
-# Buscamos la columna que se parezca a "SECCION"
-cols_disponibles = gdf_secciones.columns
-col_seccion_shp = next((c for c in cols_disponibles if "SECCION" in c.upper()), None)
-
-if not col_seccion_shp:
-    raise ValueError(f"❌ No encontré la columna SECCION. Columnas disponibles: {cols_disponibles}")
-
-print(f"ℹ️ Usando columna de sección del mapa: '{col_seccion_shp}'")
-
-# Estandarizamos CSV a minúsculas para facilitar
-df_muestra.columns = [c.lower() for c in df_muestra.columns]
+df_muestra = leer_csv(CSV_MUESTRA, ESQUEMA_MUESTRA, columnas=('seccion',))
+# Solo las secciones del municipio (filtro de atributos en la lectura, no en
+# memoria) y solo las columnas de sección y municipio (el esquema encuentra
+# la de sección aunque cambie de nombre y la entrega como entero)
+filtro_mun_secc = filtro_por_campo(SHP_SECCIONES, CAMPOS_MUNICIPIO, CLAVE_MUNICIPIO)
+gdf_secciones = leer_capa(SHP_SECCIONES, ESQUEMA_SECCIONES, where=filtro_mun_secc)
 
 # 2. FILTRADO
 secciones_target = df_muestra['seccion'].unique()
 print(f"🎯 Objetivo: {len(secciones_target)} secciones.")
 
-# Filtrar usando la columna detectada
-gdf_secc_final = gdf_secciones[gdf_secciones[col_seccion_shp].astype(int).isin(secciones_target)].copy()
+# Filtrar por la columna de sección ya resuelta por el esquema
+gdf_secc_final = gdf_secciones[gdf_secciones['SECCION'].isin(secciones_target)]
 
 # Reproyectar a WGS84 (Lat/Lon)
 if gdf_secc_final.crs != "EPSG:4326":
@@ -64,52 +39,33 @@ if gdf_secc_final.crs != "EPSG:4326":
 
 print("✅ Mapa de Secciones listo.")
 
-# 3. MASKING DE MANZANAS
-print("🍎 Cargando Manzanas (esto puede tardar unos segundos)...")
-
-mascara = gdf_secc_final.unary_union
+# 3. EXTRACCIÓN DE MANZANAS POR BLOQUES
+# Ventana espacial (bbox de las secciones, usa el índice .qix) + filtro de
+# municipio; cada bloque se vincula a su sección y se escribe en cuanto sale.
+print("🍎 Extrayendo Manzanas por bloques...")
 
 try:
-    gdf_manz_final = gpd.read_file(SHP_MANZANAS, mask=mascara)
-    
-    # Arreglo de geometría para Manzanas (igual que arriba, por si acaso)
-    try:
-        _ = gdf_manz_final.geometry.name
-    except AttributeError:
-        geo_cols_m = gdf_manz_final.select_dtypes(include=['geometry']).columns
-        if len(geo_cols_m) > 0:
-            gdf_manz_final = gdf_manz_final.set_geometry(geo_cols_m[0])
-        elif 'GEOMETRY' in gdf_manz_final.columns:
-            gdf_manz_final = gdf_manz_final.set_geometry('GEOMETRY')
-
-    if gdf_manz_final.crs != "EPSG:4326":
-        gdf_manz_final = gdf_manz_final.to_crs("EPSG:4326")
-        
-    print(f"✅ ¡Éxito! Se cargaron {len(gdf_manz_final)} manzanas.")
-
+    filtro_mun_manz = filtro_por_campo(SHP_MANZANAS, CAMPOS_MUNICIPIO, CLAVE_MUNICIPIO)
+    total_manz = extraer_manzanas_streaming(
+        SHP_MANZANAS, gdf_secc_final, 'SECCION', OUT_MANZANAS, where=filtro_mun_manz
+    )
+    print(f"✅ ¡Éxito! Se escribieron {total_manz} manzanas.")
 except Exception as e:
-    print(f"❌ Error al cargar manzanas: {e}")
+    print(f"❌ Error al extraer manzanas: {e}")
     exit()
 
-# 4. VINCULACIÓN (SPATIAL JOIN)
-print("🔗 Vinculando Manzanas a Secciones...")
-
-# Nos aseguramos de quedarnos solo con lo necesario
-gdf_manz_con_datos = gpd.sjoin(
-    gdf_manz_final, 
-    gdf_secc_final[[col_seccion_shp, 'geometry']], 
-    how="inner", 
-    predicate="intersects"
-)
-
-# Renombrar columna de sección para que sea estándar en el output
-gdf_manz_con_datos = gdf_manz_con_datos.rename(columns={col_seccion_shp: 'SECCION'})
-gdf_secc_final = gdf_secc_final.rename(columns={col_seccion_shp: 'SECCION'})
-
-# 5. GUARDAR
-print("💾 Guardando GeoJSONs...")
+# 4. GUARDAR SECCIONES
+print("💾 Guardando GeoJSON de secciones...")
 gdf_secc_final.to_file(OUT_SECCIONES, driver="GeoJSON")
-gdf_manz_con_datos[['SECCION', 'geometry']].to_file(OUT_MANZANAS, driver="GeoJSON") # Solo guardamos lo útil
+
+# 5. PIRÁMIDE DE SIMPLIFICACIÓN (un nivel por zoom para el mapa)
+print("🔺 Construyendo pirámide de simplificación (secciones y contexto)...")
+# El recorte de contexto queda en disco: la app ya no lee el .shp estatal
+gdf_contexto = recortar_contexto(gdf_secciones, secciones_target)
+if not gdf_contexto.empty:
+    gdf_contexto.to_file(RUTA_CONTEXTO, driver="GeoJSON")
+    construir_piramide(gdf_contexto, "contexto")
+construir_piramide(gdf_secc_final[['SECCION', 'geometry']], "secciones")
 
 print(f"""
 🎉 PROCESO COMPLETADO
@@ -117,4 +73,6 @@ print(f"""
 Archivos generados:
 1. {OUT_SECCIONES}
 2. {OUT_MANZANAS}
+3. {RUTA_CONTEXTO}
+4. data/piramide/ (secciones_z*.geojson, contexto_z*.geojson)
 """)
\ No newline at end of file
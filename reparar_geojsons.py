@@ -1,5 +1,5 @@
 import geopandas as gpd
-import pandas as pd
+from src.esquema import ESQUEMA_MUESTRA, ESQUEMA_SECCIONES, ESQUEMA_MANZANAS, leer_csv, leer_capa, resolver
 
 # --- RUTAS (Ajusta si es necesario) ---
 SHP_SECCIONES = "data/raw/secciones_puebla/SECCION.shp"
@@ -13,18 +13,14 @@ print("🔧 REPARANDO DATOS ESPACIALES ZACATLÁN...")
 
 # 1. CARGAR DATOS
 print("📂 Leyendo archivos originales...")
-gdf_sec = gpd.read_file(SHP_SECCIONES)
-df_muestra = pd.read_csv(CSV_MUESTRA)
+# Solo las columnas que se usan, ya con su tipo (la sección llega como entero)
+gdf_sec = leer_capa(SHP_SECCIONES, ESQUEMA_SECCIONES, columnas=('SECCION',))
+df_muestra = leer_csv(CSV_MUESTRA, ESQUEMA_MUESTRA, columnas=('seccion', 'encuestas_totales', 'lista_nom'))
 
 # 2. LIMPIEZA DE SECCIONES
-# Detectamos columna de sección
-col_sec_mapa = next((c for c in gdf_sec.columns if "SECCION" in c.upper()), "SECCION")
-# Convertimos a int para cruzar
-gdf_sec['SECCION_INT'] = gdf_sec[col_sec_mapa].astype(int)
-
 # Filtramos solo las 19 secciones de la muestra
 secciones_target = df_muestra['seccion'].unique()
-gdf_sec_final = gdf_sec[gdf_sec['SECCION_INT'].isin(secciones_target)].copy()
+gdf_sec_final = gdf_sec[gdf_sec['SECCION'].isin(secciones_target)]
 
 # Reproyectamos
 gdf_sec_final = gdf_sec_final.to_crs("EPSG:4326")
@@ -32,31 +28,28 @@ gdf_sec_final = gdf_sec_final.to_crs("EPSG:4326")
 # 3. CRUCE SEGURO DE DATOS (Muestra -> Mapa)
 # Aquí aseguramos que 'encuestas_totales' pase al mapa
 print("📊 Cruzando datos de encuestas...")
-df_muestra['seccion'] = df_muestra['seccion'].astype(int)
-# Solo nos quedamos con columnas útiles del CSV
-cols_csv = ['seccion', 'encuestas_totales', 'lista_nom']
-# Merge
-gdf_sec_final = gdf_sec_final.merge(df_muestra[cols_csv], left_on='SECCION_INT', right_on='seccion', how='left')
+gdf_sec_final = gdf_sec_final.merge(df_muestra, left_on='SECCION', right_on='seccion', how='left')
 
 # 4. PROCESAMIENTO DE MANZANAS (Recuperando CVE_MZA)
 print("🍎 Procesando Manzanas (Masking)...")
 try:
     mascara = gdf_sec_final.unary_union
-    gdf_manz = gpd.read_file(SHP_MANZANAS, mask=mascara)
-    gdf_manz = gdf_manz.to_crs("EPSG:4326")
-    
     # IMPORTANTE: Aseguramos que CVE_MZA exista.
     # A veces se llama CVE_MZA, otras CVEGEO, otras ID.
-    cols_m = gdf_manz.columns
-    col_id_manzana = 'CVE_MZA' if 'CVE_MZA' in cols_m else cols_m[0] # Fallback al primero si no existe
-    
+    mapa_manz, _ = resolver(SHP_MANZANAS, ESQUEMA_MANZANAS)
+    if 'MANZANA_ID' in mapa_manz:
+        gdf_manz = leer_capa(SHP_MANZANAS, ESQUEMA_MANZANAS, mask=mascara)
+        col_id_manzana = mapa_manz['MANZANA_ID']
+    else:
+        # Fallback a la primera columna del archivo
+        gdf_manz = gpd.read_file(SHP_MANZANAS, mask=mascara)
+        col_id_manzana = gdf_manz.columns[0]
+        gdf_manz = gdf_manz.rename(columns={col_id_manzana: 'MANZANA_ID'})
+
     print(f"ℹ️ Usando '{col_id_manzana}' como ID de manzana.")
-    
-    # Renombramos para estandarizar
-    gdf_manz['MANZANA_ID'] = gdf_manz[col_id_manzana]
-    
+
     # Guardamos solo lo necesario
-    gdf_manz_final = gdf_manz[['MANZANA_ID', 'geometry']]
+    gdf_manz_final = gdf_manz[['MANZANA_ID', 'geometry']].to_crs("EPSG:4326")
 
 except Exception as e:
     print(f"❌ Error en manzanas: {e}")
@@ -1,6 +1,8 @@
 import geopandas as gpd
 import pandas as pd
 import matplotlib.pyplot as plt
+from src.extraccion import leer_por_bloques, crs_de
+from src.muestreo import SEMILLA_DEFAULT, seleccionar_manzanas, claves_geometria, resumen_seleccion
 
 # --- CONFIGURACIÓN ---
 # Rutas a tus archivos 
@@ -13,7 +15,6 @@ print("🚀 Iniciando Procesamiento de Planeación Zacatlán...")
 # 1. CARGAR DATOS
 print("📂 Cargando archivos...")
 gdf_secc = gpd.read_file(SHP_SECCIONES)
-gdf_manz = gpd.read_file(SHP_MANZANAS)
 df_muestra = pd.read_csv(CSV_MUESTRA)
 
 # Asegurar que las claves sean del mismo tipo (String o Int) para cruzar
@@ -29,6 +30,11 @@ print(f"🎯 Filtrando {len(secciones_objetivo)} secciones objetivo...")
 # Filtramos el mapa de secciones
 gdf_secc_target = gdf_secc[gdf_secc['SECCION'].isin(secciones_objetivo)].copy()
 
+# Manzanas: solo las que caen en la ventana (bbox) de las secciones objetivo,
+# leídas por bloques en vez de cargar el shapefile estatal completo
+bbox_objetivo = tuple(gdf_secc_target.to_crs(crs_de(SHP_MANZANAS)).total_bounds)
+gdf_manz = pd.concat(list(leer_por_bloques(SHP_MANZANAS, bbox=bbox_objetivo)), ignore_index=True)
+
 # Filtramos el mapa de manzanas (Asumiendo que tiene columna SECCION)
 # Si el SHP de manzanas no tiene 'SECCION', habría que hacer un sjoin (spatial join)
 if 'SECCION' in gdf_manz.columns:
@@ -54,4 +60,20 @@ print("💾 Guardando archivos listos para la App...")
 gdf_final.to_file("zacatlan_secciones_opt.geojson", driver="GeoJSON")
 gdf_manz_target.to_file("zacatlan_manzanas_opt.geojson", driver="GeoJSON")
 
-print("✅ ¡LISTO! Ahora tienes dos archivos .geojson ligeros para subir a tu carpeta de proyecto.")
\ No newline at end of file
+# 6. SORTEO DE MANZANAS EN MUESTRA (manzanas_meta por sección)
+print(f"🎲 Sorteando manzanas por sección (semilla {SEMILLA_DEFAULT})...")
+metas = df_muestra.groupby('seccion')['manzanas_meta'].sum()
+gdf_manz_target = gdf_manz_target.reset_index(drop=True)
+seleccion = seleccionar_manzanas(
+    gdf_manz_target['SECCION'].astype(int).to_numpy(), metas,
+    claves_geometria(gdf_manz_target.geometry.values), semilla=SEMILLA_DEFAULT
+)
+gdf_muestra_manz = gdf_manz_target.iloc[seleccion['posicion']].copy()
+gdf_muestra_manz['Orden_Sorteo'] = seleccion['Orden_Sorteo'].to_numpy()
+gdf_muestra_manz['Prob_Inclusion'] = seleccion['Prob_Inclusion'].to_numpy()
+gdf_muestra_manz.to_file("zacatlan_manzanas_muestra.geojson", driver="GeoJSON")
+resumen = resumen_seleccion(seleccion, metas, gdf_manz_target['SECCION'].astype(int).to_numpy())
+if (resumen['Faltantes'] > 0).any():
+    print(f"⚠️ Secciones con menos manzanas que su meta:\n{resumen[resumen['Faltantes'] > 0].to_string(index=False)}")
+
+print("✅ ¡LISTO! Ahora tienes tres archivos .geojson ligeros para subir a tu carpeta de proyecto.")
\ No newline at end of file
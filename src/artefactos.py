@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import hashlib
+import threading
+import pandas as pd
+import geopandas as gpd
+
+# ==============================================================================
+# ALMACÉN DE ARTEFACTOS PRECOMPUTADOS (GeoParquet en disco)
+# ==============================================================================
+# st.cache_data solo vive dentro de un proceso. Aquí guardamos en disco las
+# salidas ya procesadas del cargador, identificadas por una huella (hash) del
+# CONTENIDO de los archivos de entrada. Si ninguna entrada cambia, cualquier
+# worker de la app arranca leyendo Parquet binario en lugar de re-parsear
+# GeoJSON / Shapefiles.
+
+DIR_CACHE = "data/cache"
+ARCHIVO_HUELLAS = os.path.join(DIR_CACHE, "huellas.json")
+EXT_SHAPEFILE = ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+# Varios hilos del proceso (sesiones) pueden actualizar huellas.json a la vez:
+# la lectura + mezcla + reemplazo va bajo este candado para no perder entradas.
+_CANDADO_HUELLAS = threading.Lock()
+
+
+def _archivos_relacionados(ruta):
+    """Un .shp no viaja solo: incluimos sus archivos hermanos (.dbf, .shx, ...)."""
+    base, ext = os.path.splitext(ruta)
+    if ext.lower() != '.shp':
+        return [ruta]
+    return [base + e for e in EXT_SHAPEFILE]
+
+
+def _hash_contenido(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _leer_registro_huellas():
+    try:
+        with open(ARCHIVO_HUELLAS, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def huella_archivos(rutas, extra=""):
+    """
+    Huella (hash corto) del contenido de los archivos de entrada.
+    El hash de cada archivo se memoriza por (tamaño, mtime) para no releer
+    shapefiles estatales completos en cada arranque. Los archivos que no
+    existen también cuentan (su aparición invalida el caché).
+    """
+    registro = _leer_registro_huellas()
+    nuevos = {}
+    h = hashlib.sha256(str(extra).encode('utf-8'))
+
+    archivos = [a for r in rutas for a in _archivos_relacionados(r)]
+    for ruta in sorted(set(archivos)):
+        h.update(ruta.encode('utf-8'))
+        if not os.path.exists(ruta):
+            h.update(b'<ausente>')
+            continue
+        st_info = os.stat(ruta)
+        firma = f"{st_info.st_size}:{st_info.st_mtime_ns}"
+        previo = registro.get(ruta)
+        if previo and previo.get('firma') == firma:
+            digest = previo['sha256']
+        else:
+            digest = _hash_contenido(ruta)
+            nuevos[ruta] = {'firma': firma, 'sha256': digest}
+        h.update(digest.encode('utf-8'))
+
+    if nuevos:
+        # Se relee dentro del candado: lo que otro hilo haya escrito mientras
+        # hasheábamos se conserva y solo se agregan nuestras entradas.
+        with _CANDADO_HUELLAS:
+            try:
+                registro = _leer_registro_huellas()
+                registro.update(nuevos)
+                os.makedirs(DIR_CACHE, exist_ok=True)
+                tmp = f"{ARCHIVO_HUELLAS}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(registro, f, indent=1)
+                os.replace(tmp, ARCHIVO_HUELLAS)
+            except Exception as e:
+                print(f"Aviso huellas: {e}")
+
+    return h.hexdigest()[:16]
+
+
+def _dir_artefacto(nombre, huella):
+    return os.path.join(DIR_CACHE, f"{nombre}-{huella}")
+
+
+def leer_artefactos(nombre, huella):
+    """
+    Devuelve un dict {tabla: DataFrame/GeoDataFrame} si existe el artefacto
+    para esa huella; None si hay que reconstruir.
+    """
+    carpeta = _dir_artefacto(nombre, huella)
+    manifiesto_path = os.path.join(carpeta, "manifiesto.json")
+    if not os.path.exists(manifiesto_path):
+        return None
+    try:
+        with open(manifiesto_path, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+
+        tablas = {}
+        for tabla, tipo in manifiesto['tablas'].items():
+            ruta = os.path.join(carpeta, f"{tabla}.parquet")
+            if tipo == 'geo':
+                tablas[tabla] = gpd.read_parquet(ruta)
+            elif tipo == 'geo_vacio':
+                tablas[tabla] = gpd.GeoDataFrame()
+            else:
+                tablas[tabla] = pd.read_parquet(ruta)
+        return tablas
+    except Exception as e:
+        print(f"Artefacto ilegible ({carpeta}), se reconstruye: {e}")
+        return None
+
+
+def guardar_artefactos(nombre, huella, tablas):
+    """
+    Escribe las tablas en Parquet/GeoParquet. Se escribe en una carpeta
+    temporal y se renombra al final, para que otro worker nunca lea un
+    artefacto a medias. Las versiones con huellas viejas se borran.
+    """
+    destino = _dir_artefacto(nombre, huella)
+    tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        manifiesto = {'huella': huella, 'tablas': {}}
+        for tabla, df in tablas.items():
+            ruta = os.path.join(tmp, f"{tabla}.parquet")
+            if isinstance(df, gpd.GeoDataFrame):
+                if df.empty and 'geometry' not in df.columns:
+                    manifiesto['tablas'][tabla] = 'geo_vacio'
+                    continue
+                df.to_parquet(ruta)
+                manifiesto['tablas'][tabla] = 'geo'
+            else:
+                df.to_parquet(ruta)
+                manifiesto['tablas'][tabla] = 'tabla'
+
+        with open(os.path.join(tmp, "manifiesto.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, indent=1)
+
+        if os.path.exists(destino):
+            # Otro worker ganó la carrera: su artefacto es equivalente.
+            shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            os.replace(tmp, destino)
+
+        # Limpieza de artefactos obsoletos del mismo nombre
+        for carpeta in os.listdir(DIR_CACHE):
+            if carpeta.startswith(f"{nombre}-") and carpeta != os.path.basename(destino) and not carpeta.endswith('.tmp'):
+                shutil.rmtree(os.path.join(DIR_CACHE, carpeta), ignore_errors=True)
+    except Exception as e:
+        print(f"Aviso: no se pudo guardar el artefacto '{nombre}': {e}")
+        shutil.rmtree(tmp, ignore_errors=True)
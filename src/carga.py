@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from src.coordenadas import convertir_coordenadas
+from src.indices import asignar_seccion_manzanas, manzanas_unicas
+from src.esquema import ESQUEMA_MUESTRA, ESQUEMA_COORDENADAS, ESQUEMA_SECCIONES, leer_csv, leer_capa
+
+# ==============================================================================
+# CARGA DE DATOS DE PLANEACIÓN (sin Streamlit)
+# ==============================================================================
+# La página envuelve esta función con st.cache_resource y el almacén de
+# artefactos; aquí vive solo la lectura y el armado, para poder llamarla
+# desde scripts y benchmarks.
+
+# Modelo compacto en memoria (la página lo sirve con st.cache_resource: un
+# solo objeto por proceso, de solo lectura, sin copias por llamada): ids y
+# conteos en int32, textos repetidos como categoría (códigos + un solo
+# diccionario de valores). Las vistas de la página (filtros, asignación) se
+# arman con assign/iloc y reutilizan estas columnas y las geometrías.
+COLUMNAS_ENTERAS = ('seccion', 'SECCION', 'Meta', 'Manzanas_Obj', 'Encuestas')
+COLUMNAS_CATEGORIA = ('Localidad', 'KEY_LOC', 'Localidad_Full', 'MANZANA_ID')
+
+
+def compactar(df):
+    """Mismo DataFrame con tipos compactos (solo cambia las columnas conocidas)."""
+    cambios = {}
+    for c in df.columns:
+        v = df[c]
+        if c in COLUMNAS_ENTERAS and pd.api.types.is_numeric_dtype(v) and not v.isna().any():
+            if len(v) == 0 or ((v % 1 == 0).all() and v.abs().max() < 2 ** 31):
+                cambios[c] = v.astype(np.int32)
+        elif c in COLUMNAS_CATEGORIA and not isinstance(v.dtype, pd.CategoricalDtype):
+            cambios[c] = v.astype('category')
+    return df.assign(**cambios) if cambios else df
+
+
+def cargar_datos(secc_path, manz_path, csv_path, loc_coords_path):
+    """
+    Secciones con Meta/Manzanas_Obj, manzanas con SECCION y detalle de
+    localidades (pines). La capa de contexto va aparte (src.contexto).
+    """
+    # 1. CARGA GEOGRÁFICA
+    gdf_clean = leer_capa(secc_path, ESQUEMA_SECCIONES, columnas=('SECCION',)).rename(columns={'SECCION': 'seccion'})
+
+    gdf_m = gpd.read_file(manz_path)
+    gdf_m = gdf_m.loc[:, ~gdf_m.columns.duplicated()]
+    if 'SECCION' not in gdf_m.columns:
+        # Una sola vez por versión de los datos (queda guardado en el artefacto)
+        gdf_m['SECCION'] = asignar_seccion_manzanas(gdf_m, gdf_clean)
+    else:
+        # Extracciones viejas (cruce 'intersects'): manzanas repetidas por sección
+        gdf_m = manzanas_unicas(gdf_m, gdf_clean)
+
+    # 2. PROCESAMIENTO CSV MUESTRA (solo las columnas que se usan, ya tipadas)
+    df_csv = leer_csv(csv_path, ESQUEMA_MUESTRA, columnas=('seccion', 'nom_localidad', 'encuestas_totales', 'manzanas_meta'))
+    col_sec, col_loc, col_enc, col_mza = 'seccion', 'nom_localidad', 'encuestas_totales', 'manzanas_meta'
+
+    if col_enc not in df_csv.columns:
+        raise ValueError(f"No se encontró la columna de encuestas en {csv_path}")
+    if col_mza not in df_csv.columns: df_csv[col_mza] = np.int32(1)
+    if col_loc not in df_csv.columns: df_csv[col_loc] = "Sin Dato"
+    df_csv[col_loc] = df_csv[col_loc].fillna("")
+
+    # PREPARAR DATAFRAME DE PINES (DETALLE)
+    df_pines = df_csv[[col_sec, col_loc, col_enc]]
+    df_pines.columns = ['seccion', 'Localidad', 'Encuestas']
+    df_pines['KEY_LOC'] = df_pines['Localidad'].astype(str).str.upper().str.strip()
+
+    # PROCESAMIENTO CATÁLOGO
+    try:
+        df_coords = leer_csv(loc_coords_path, ESQUEMA_COORDENADAS)
+        lat = convertir_coordenadas(df_coords['lat'], limite=90)
+        lon = convertir_coordenadas(df_coords['lon'], limite=180)
+        df_coords['CAT_LAT'] = lat['valor']
+        df_coords['CAT_LON'] = lon['valor']
+        df_coords['KEY_LOC'] = df_coords['nombre'].astype(str).str.upper().str.strip()
+
+        descartes = (lat['motivo'].value_counts() + lon['motivo'].value_counts()).drop('ok')
+        descartes = descartes[descartes > 0]
+        if not descartes.empty: print(f"Coordenadas descartadas: {descartes.to_dict()}")
+        
+        df_coords_clean = df_coords[df_coords['CAT_LAT'].notna() & df_coords['CAT_LON'].notna()].copy()
+        df_coords_clean = df_coords_clean[['KEY_LOC', 'CAT_LAT', 'CAT_LON']].drop_duplicates(subset=['KEY_LOC'])
+        
+        df_pines = df_pines.merge(df_coords_clean, on='KEY_LOC', how='left')
+    except Exception as e: print(f"Error coords: {e}")
+
+    # AGRUPAMIENTO (PARA POLIGONOS)
+    agg_rules = {
+        col_enc: 'sum',
+        col_mza: 'sum',
+        col_loc: lambda x: ', '.join(sorted(set(x.unique())))
+    }
+    df_agrupado = df_csv.groupby(col_sec).agg(agg_rules).reset_index()
+    df_agrupado.columns = ['seccion', 'Meta', 'Manzanas_Obj', 'Localidad_Full']
+
+    gdf_final = gdf_clean.merge(df_agrupado, on='seccion', how='left')
+    gdf_final['Meta'] = gdf_final['Meta'].fillna(0).astype(int)
+    gdf_final['Manzanas_Obj'] = gdf_final['Manzanas_Obj'].fillna(0).astype(int)
+
+    return compactar(gdf_final), compactar(gdf_m), compactar(df_pines)
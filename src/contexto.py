@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import geopandas as gpd
+from shapely.geometry import box
+from src.artefactos import huella_archivos, leer_artefactos, guardar_artefactos
+from src.extraccion import filtro_por_campo, crs_de
+
+# ==============================================================================
+# CAPA DE CONTEXTO (secciones del municipio fuera de la muestra)
+# ==============================================================================
+# Es solo decorativa, pero salía de leer el SECCION.shp de todo Puebla dentro
+# del cargador principal. Ahora:
+#   1. procesar_zacatlan_final.py deja un recorte listo (RUTA_CONTEXTO)
+#   2. si no existe, se lee solo la ventana (bbox) del municipio con filtro
+#      de atributos y se guarda como artefacto (una vez por versión del .shp)
+# y la página la pide en segundo plano, después de pintar el mapa.
+
+RUTA_CONTEXTO = "data/contexto_zacatlan.geojson"
+CLAVE_MUNICIPIO = 208
+CAMPOS_MUNICIPIO = ("MUNICIPIO", "CVE_MUN", "MUN")
+# Las secciones de contexto rodean a las de la muestra: la ventana se amplía
+# esta fracción de su tamaño hacia cada lado.
+MARGEN_BBOX = 0.5
+
+
+def recortar_contexto(gdf_secciones_raw, ids_muestra):
+    """Secciones del municipio que no están en la muestra: [SECCION, geometry] en WGS84."""
+    col_mun = next((c for c in gdf_secciones_raw.columns if 'MUN' in c.upper()), None)
+    col_sec = next((c for c in gdf_secciones_raw.columns if 'SECC' in c.upper()), None)
+    if not col_mun or not col_sec:
+        return gpd.GeoDataFrame()
+    mask = gdf_secciones_raw[col_mun].astype(str).str.upper().str.contains("ZACATLAN") | \
+        (gdf_secciones_raw[col_mun].astype(str).str.lstrip('0') == str(CLAVE_MUNICIPIO))
+    gdf = gdf_secciones_raw[mask & ~gdf_secciones_raw[col_sec].astype(int).isin(ids_muestra)]
+    gdf = gdf[[col_sec, 'geometry']].rename(columns={col_sec: 'SECCION'})
+    return gdf.to_crs("EPSG:4326")
+
+
+def leer_contexto_bbox(shp_raw_path, gdf_secciones, margen=MARGEN_BBOX):
+    """Lee del shapefile estatal solo la ventana alrededor de las secciones (y del municipio)."""
+    x0, y0, x1, y1 = gdf_secciones.to_crs("EPSG:4326").total_bounds
+    dx, dy = (x1 - x0) * margen, (y1 - y0) * margen
+    ventana = gpd.GeoSeries([box(x0 - dx, y0 - dy, x1 + dx, y1 + dy)], crs="EPSG:4326")
+    bbox = tuple(ventana.to_crs(crs_de(shp_raw_path)).total_bounds)
+    where = filtro_por_campo(shp_raw_path, CAMPOS_MUNICIPIO, CLAVE_MUNICIPIO)
+    gdf_raw = gpd.read_file(shp_raw_path, bbox=bbox, where=where)
+    return recortar_contexto(gdf_raw, gdf_secciones['seccion'].unique())
+
+
+def cargar_contexto(shp_raw_path, gdf_secciones, ruta=RUTA_CONTEXTO):
+    """Recorte pre-generado, o lectura por ventana guardada como artefacto; vacío si no hay fuente."""
+    try:
+        if os.path.exists(ruta):
+            return gpd.read_file(ruta)
+        if not os.path.exists(shp_raw_path):
+            return gpd.GeoDataFrame()
+        huella = huella_archivos([shp_raw_path], extra=sorted(gdf_secciones['seccion'].unique().tolist()))
+        artefactos = leer_artefactos("contexto", huella)
+        if artefactos is not None:
+            return artefactos['contexto']
+        gdf = leer_contexto_bbox(shp_raw_path, gdf_secciones)
+        guardar_artefactos("contexto", huella, {'contexto': gdf})
+        return gdf
+    except Exception as e:
+        print(f"Contexto no disponible: {e}")
+        return gpd.GeoDataFrame()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ==============================================================================
+# LIMPIEZA DE COORDENADAS
+# ==============================================================================
+
+# Motivos por los que una coordenada queda en NaN
+MOTIVO_OK = "ok"
+MOTIVO_VACIO = "vacio"
+MOTIVO_SIN_NUMEROS = "sin_numeros"
+MOTIVO_MINUTOS = "minutos_invalidos"
+MOTIVO_RANGO = "fuera_de_rango"
+MOTIVO_CERO = "cero"
+MOTIVOS = [MOTIVO_OK, MOTIVO_VACIO, MOTIVO_SIN_NUMEROS, MOTIVO_MINUTOS, MOTIVO_RANGO, MOTIVO_CERO]
+_COD = {m: i for i, m in enumerate(MOTIVOS)}
+
+# Hasta tres números (grados, minutos, segundos) separados por lo que sea
+_PATRON_DMS = r"^\D*?(?P<g>\d+(?:\.\d+)?)(?:\D+(?P<m>\d+(?:\.\d+)?))?(?:\D+(?P<s>\d+(?:\.\d+)?))?"
+# La "s" de segundos en el formato con letras ("19d54m36s") se cambia por '"' antes
+# de buscar el hemisferio: así no se confunde con S (sur) y "36sS" / "36s S" siguen
+# siendo sur. Sin marca de minutos ("19.9S") la S pegada al número es el hemisferio.
+_PATRON_SEGUNDOS_LETRA = r"(\d\s*M\s*\d+(?:\.\d+)?)S"
+# Hemisferio sur/oeste como palabra al final o al inicio ("97.96 W", "O 97°57'", "19.9 SUR"),
+# o pegado a un número o a una marca de grados/minutos/segundos ("97d57m36sW", "19d54mS")
+_NEGATIVOS = r"(S|W|O|SUR|OESTE|SOUTH|WEST)"
+_PATRON_HEMISFERIO_NEGATIVO = (rf"(^|[^A-Z]){_NEGATIVOS}\.?\s*$|^\s*{_NEGATIVOS}([^A-Z]|$)"
+                               r"|[\d\"'°S]\s*[WO]\b|[\d\"'°M]\s*S\b")
+
+
+def limpiar_y_convertir_universal(coord):
+    """Versión original (celda por celda). Se conserva como referencia para el benchmark."""
+    if pd.isna(coord): return 0
+    if isinstance(coord, (int, float)): return float(coord)
+    s = str(coord).upper().strip()
+    signo = -1 if 'W' in s or 'S' in s or s.startswith('-') else 1
+    numeros = re.findall(r"(\d+(?:\.\d+)?)", s)
+    try:
+        if len(numeros) >= 3:
+            return (float(numeros[0]) + (float(numeros[1]) / 60) + (float(numeros[2]) / 3600)) * signo
+        elif len(numeros) >= 1:
+            return float(numeros[0]) * signo
+    except: return 0
+    return 0
+
+
+def _a_float(arr):
+    """Cadena Arrow -> float64 (las cadenas vacías o nulas quedan en NaN)."""
+    arr = pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+    return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def convertir_coordenadas(serie, limite=180):
+    """
+    Convierte una columna completa de coordenadas (decimal, DMS, con o sin
+    hemisferio) sin recorrer celda por celda: los textos se procesan con
+    expresiones regulares de Arrow (C++) y la aritmética con NumPy.
+
+    Devuelve un DataFrame con:
+      - 'valor': grados decimales (NaN si no se pudo)
+      - 'motivo': 'ok' o la razón del descarte (vacio, sin_numeros,
+        minutos_invalidos, fuera_de_rango, cero), como categoría
+    """
+    n = len(serie)
+    valor = np.full(n, np.nan)
+    motivo = np.zeros(n, dtype=np.int8)   # índice en MOTIVOS
+
+    if pd.api.types.is_numeric_dtype(serie):
+        valor = serie.to_numpy(dtype='float64', na_value=np.nan).copy()
+        motivo[np.isnan(valor)] = _COD[MOTIVO_VACIO]
+        es_texto = np.zeros(n, dtype=bool)
+        texto = None
+    else:
+        try:
+            # Columna de texto "pura" (lo normal al leer un CSV): Arrow la toma directo
+            texto = pa.array(serie, type=pa.string(), from_pandas=True)
+            es_texto = texto.is_valid().to_numpy(zero_copy_only=False)
+            texto = texto.drop_null()
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # Columna mixta (Excel): los números van directo, el texto por Arrow
+            valores = serie.to_numpy(dtype=object)
+            es_texto = np.fromiter((isinstance(v, str) for v in valores), dtype=bool, count=n)
+            valor[~es_texto] = pd.to_numeric(pd.Series(valores[~es_texto]), errors='coerce').to_numpy(dtype='float64')
+            texto = pa.array(valores[es_texto], type=pa.string())
+        motivo[~es_texto & np.isnan(valor)] = _COD[MOTIVO_VACIO]
+
+    idx = np.flatnonzero(es_texto)
+    if len(idx):
+        texto = pc.utf8_trim_whitespace(pc.utf8_upper(texto))
+
+        en_blanco = pc.equal(texto, "").to_numpy(zero_copy_only=False)
+        motivo[idx[en_blanco]] = _COD[MOTIVO_VACIO]
+
+        # Camino rápido: la mayoría ya son números decimales (punto o coma decimal)
+        decimal = pc.match_substring_regex(texto, r"^[-+]?\d+([.,]\d+)?$").to_numpy(zero_copy_only=False)
+        if decimal.any():
+            decimales = pc.replace_substring(pc.filter(texto, pa.array(decimal)), ",", ".")
+            valor[idx[decimal]] = _a_float(decimales)
+
+        resto = ~decimal & ~en_blanco
+        if resto.any():
+            texto_r = pc.filter(texto, pa.array(resto))
+            partes = pc.extract_regex(texto_r, _PATRON_DMS)
+            grados = _a_float(partes.field('g'))
+            minutos = _a_float(partes.field('m'))
+            segundos = _a_float(partes.field('s'))
+
+            sin_numeros = np.isnan(grados)
+            malos_min = (minutos >= 60) | (segundos >= 60)
+            absoluto = grados + np.nan_to_num(minutos) / 60 + np.nan_to_num(segundos) / 3600
+
+            marcado = pc.replace_substring_regex(texto_r, _PATRON_SEGUNDOS_LETRA, r'\1"')
+            negativo = (pc.match_substring_regex(marcado, _PATRON_HEMISFERIO_NEGATIVO).to_numpy(zero_copy_only=False)
+                        | pc.starts_with(texto_r, "-").to_numpy(zero_copy_only=False))
+            resultado = np.where(negativo, -absoluto, absoluto)
+            resultado[sin_numeros | malos_min] = np.nan
+
+            idx_r = idx[resto]
+            valor[idx_r] = resultado
+            motivo[idx_r[sin_numeros]] = _COD[MOTIVO_SIN_NUMEROS]
+            motivo[idx_r[malos_min & ~sin_numeros]] = _COD[MOTIVO_MINUTOS]
+
+    pendientes = motivo == _COD[MOTIVO_OK]
+    motivo[pendientes & np.isnan(valor)] = _COD[MOTIVO_SIN_NUMEROS]
+    fuera = pendientes & (np.abs(valor) > limite)
+    cero = pendientes & (valor == 0)
+    motivo[fuera] = _COD[MOTIVO_RANGO]
+    motivo[cero] = _COD[MOTIVO_CERO]
+    valor[fuera | cero] = np.nan
+
+    return pd.DataFrame({
+        'valor': valor,
+        'motivo': pd.Categorical.from_codes(motivo, categories=MOTIVOS),
+    }, index=serie.index)
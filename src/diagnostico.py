@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import io
+import sys
+import json
+import time
+import threading
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+import pandas as pd
+import shapely
+
+# ==============================================================================
+# DIAGNÓSTICO POR ETAPA (tiempo, memoria y tamaño de datos)
+# ==============================================================================
+# Opcional: apagado no cuesta nada (etapa() solo revisa una bandera). Encendido,
+# cada etapa registra tiempo de reloj, memoria neta y pico (tracemalloc) y el
+# tamaño de lo que produjo. Los registros son por hilo: en Streamlit cada
+# sesión corre su rerun en su propio hilo y no se mezclan. Lo que corre en
+# otro hilo (p. ej. un ThreadPoolExecutor) se envuelve con en_segundo_plano():
+# el Future entrega (resultado, registros) y la sesión que lo consume los
+# suma a su corrida con agregar().
+#
+# tracemalloc es del proceso: queda encendido mientras alguna sesión viva lo
+# tenga activado (se cuenta por sesión, no por hilo: los hilos de Streamlit
+# cambian entre reruns) y los picos se miden de a una corrida a la vez; si
+# otra sesión está midiendo, la etapa registra solo el tiempo. El pico
+# incluye lo que otros hilos asignen mientras tanto.
+#
+#   diagnostico.activar(sesion=s)     # al inicio del rerun (s: objeto de la sesión)
+#   with diagnostico.etapa("carga") as r:
+#       datos = ...
+#       r['bytes'] = diagnostico.bytes_de(datos)
+#   diagnostico.registros()           # DataFrame para el panel / exportar
+#
+#   futuro = ejecutor.submit(diagnostico.en_segundo_plano(funcion), ...)
+#   resultado, etapas = futuro.result()
+#   diagnostico.agregar(etapas, hilo="optimizacion")
+
+COLUMNAS = ['etapa', 'nivel', 'seg', 'mb_neto', 'mb_pico', 'bytes']
+
+_LOCAL = threading.local()
+_CANDADO = threading.Lock()
+# Sesiones con memoria activada; al desaparecer la sesión sale sola del conjunto
+_SESIONES_MEMORIA = weakref.WeakSet()
+# reset_peak() es global: una sola corrida mide picos a la vez
+_CANDADO_PICO = threading.Lock()
+
+
+class Sesion:
+    """Marca de una sesión (en Streamlit se guarda en st.session_state)."""
+
+
+def _sesion_del_hilo():
+    if not hasattr(_LOCAL, 'sesion_hilo'):
+        _LOCAL.sesion_hilo = Sesion()
+    return _LOCAL.sesion_hilo
+
+
+def _apagar_si_nadie():
+    if not _SESIONES_MEMORIA and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def activar(memoria=True, sesion=None):
+    """
+    Empieza una corrida nueva (borra los registros anteriores del hilo).
+    'sesion' identifica a quién activó la memoria; sin ella cuenta el hilo.
+    """
+    _LOCAL.activo = True
+    _LOCAL.registros = []
+    _LOCAL.pila = []
+    _LOCAL.inicio = time.time()
+    _LOCAL.memoria = memoria
+    sesion = sesion if sesion is not None else _sesion_del_hilo()
+    with _CANDADO:
+        if memoria:
+            _SESIONES_MEMORIA.add(sesion)
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        else:
+            _SESIONES_MEMORIA.discard(sesion)
+            _apagar_si_nadie()
+
+
+def desactivar(sesion=None):
+    _LOCAL.activo = False
+    with _CANDADO:
+        _SESIONES_MEMORIA.discard(sesion if sesion is not None else _sesion_del_hilo())
+        _apagar_si_nadie()
+
+
+def activo():
+    return getattr(_LOCAL, 'activo', False)
+
+
+@contextmanager
+def etapa(nombre, **info):
+    """
+    Mide el bloque. Entrega un dict donde el bloque puede anotar datos extra
+    (p. ej. 'bytes'); apagado entrega None. Las etapas anidadas quedan con
+    su 'nivel' y el pico del padre incluye el de sus hijas.
+    """
+    if not activo():
+        yield None
+        return
+    pila = _LOCAL.pila
+    # La etapa de nivel 0 toma el candado de picos (sin esperar) y sus hijas lo heredan
+    if not pila:
+        _LOCAL.mide_pico = (_LOCAL.memoria and tracemalloc.is_tracing()
+                            and _CANDADO_PICO.acquire(blocking=False))
+    medir_memoria = _LOCAL.mide_pico and tracemalloc.is_tracing()
+    registro = {'etapa': nombre, 'nivel': len(pila), **info}
+    _LOCAL.registros.append(registro)
+
+    if medir_memoria:
+        actual0, pico_previo = tracemalloc.get_traced_memory()
+        if pila:
+            pila[-1]['_pico'] = max(pila[-1].get('_pico', 0), pico_previo)
+        tracemalloc.reset_peak()
+    pila.append(registro)
+    t0 = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro['seg'] = round(time.perf_counter() - t0, 4)
+        pila.pop()
+        if medir_memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            pico = max(pico, registro.pop('_pico', 0))
+            registro['mb_neto'] = round((actual - actual0) / 1e6, 3)
+            registro['mb_pico'] = round((pico - actual0) / 1e6, 3)
+            if pila:
+                pila[-1]['_pico'] = max(pila[-1].get('_pico', 0), pico)
+        if not pila and _LOCAL.mide_pico:
+            _LOCAL.mide_pico = False
+            _CANDADO_PICO.release()
+
+
+def en_segundo_plano(funcion):
+    """
+    Envuelve una tarea que corre en otro hilo: mide sus etapas en una corrida
+    propia de ese hilo y devuelve (resultado, registros) para agregar().
+    """
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        _LOCAL.activo = True
+        _LOCAL.registros = []
+        _LOCAL.pila = []
+        _LOCAL.inicio = time.time()
+        _LOCAL.memoria = True
+        try:
+            return funcion(*args, **kwargs), _LOCAL.registros
+        finally:
+            _LOCAL.activo = False
+    return envoltura
+
+
+def agregar(registros_hilo, **info):
+    """
+    Suma a la corrida actual los registros de una tarea de otro hilo, anidados
+    bajo la etapa abierta (su tiempo no forma parte del de esa etapa).
+    """
+    if not activo() or not registros_hilo:
+        return
+    nivel = len(_LOCAL.pila)
+    _LOCAL.registros.extend({**r, **info, 'nivel': r['nivel'] + nivel} for r in registros_hilo)
+
+
+def medida(nombre=None):
+    """Decorador: la función completa como una etapa."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with etapa(nombre or funcion.__qualname__):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def bytes_de(obj):
+    """Tamaño aproximado en bytes: DataFrames, textos, arreglos o capas de folium."""
+    if isinstance(obj, pd.DataFrame):
+        datos = obj.drop(columns='geometry') if 'geometry' in obj.columns else obj
+        tamano = int(datos.memory_usage(deep=True).sum())
+        if 'geometry' in obj.columns:
+            tamano += sum(len(g) for g in shapely.to_wkb(np.asarray(obj.geometry.values)) if g is not None)
+        return tamano
+    if isinstance(obj, (bytes, str)):
+        return len(obj)
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if hasattr(obj, '_children'):
+        # Mapa o capa de folium: suma de los GeoJSON incrustados
+        propio = len(json.dumps(obj.data)) if isinstance(getattr(obj, 'data', None), dict) else 0
+        return propio + sum(bytes_de(h) for h in obj._children.values())
+    return sys.getsizeof(obj)
+
+
+def registros():
+    """Registros de la corrida actual (una fila por etapa, en orden de inicio)."""
+    filas = [{k: v for k, v in r.items() if not k.startswith('_')} for r in getattr(_LOCAL, 'registros', [])]
+    df = pd.DataFrame(filas)
+    primeras = [c for c in COLUMNAS if c in df.columns]
+    return df[primeras + [c for c in df.columns if c not in primeras]]
+
+
+def a_json():
+    df = registros()
+    return json.dumps({
+        'inicio': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(getattr(_LOCAL, 'inicio', time.time()))),
+        'etapas': json.loads(df.to_json(orient='records')),
+    }, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def a_csv():
+    buffer = io.StringIO()
+    registros().to_csv(buffer, index=False)
+    return buffer.getvalue().encode('utf-8')
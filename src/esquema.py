@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import os
+import unicodedata
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# ESQUEMAS DE COLUMNAS (alias resueltos una vez por archivo)
+# ==============================================================================
+# Cada cargador buscaba sus columnas con next(c for c in columnas if 'seccion'
+# in c.lower()), pasaba todo a minúsculas y luego forzaba tipos con
+# pd.to_numeric(errors='coerce'). Aquí eso se declara una sola vez:
+#   - un esquema es una tupla de (columna destino, fragmentos del nombre,
+#     tipo, obligatoria); se asignan en orden y cada columna del archivo se
+#     usa una sola vez (las más específicas van primero)
+#   - el mapeo se resuelve leyendo solo el encabezado y se memoriza por
+#     archivo (ruta, tamaño, mtime)
+#   - la lectura pide solo esas columnas (usecols) y con su tipo compacto
+#     desde el parser; si el archivo trae basura, se cae al camino lento
+#     (lectura libre + conversión con coerce) para esas columnas
+
+# Tipos: 'int32' y 'float*' (vacíos -> 0 / NaN), 'category', 'texto', 'bool'
+# (vacío -> False) o None (como venga del archivo).
+ESQUEMA_MUESTRA = (
+    ('seccion', ('seccion',), 'int32', True),
+    ('nom_localidad', ('localidad', 'nom_loc'), 'texto', False),
+    ('encuestas_totales', ('encuestas',), 'int32', False),
+    ('manzanas_meta', ('manzanas_meta',), 'int32', False),
+    ('lista_nom', ('lista_nom',), 'int32', False),
+    ('tipo', ('tipo',), 'category', False),
+    ('nombre_municipio', ('nombre_municipio',), 'category', False),
+)
+ESQUEMA_COORDENADAS = (
+    ('lat', ('lat',), None, True),
+    ('lon', ('lon',), None, True),
+    ('nombre', ('nom', 'loc'), 'texto', True),
+)
+ESQUEMA_SECCIONES = (
+    ('SECCION', ('seccion',), 'int32', True),
+    ('MUNICIPIO', ('municipio', 'cve_mun', 'mun'), None, False),
+)
+ESQUEMA_MANZANAS = (
+    ('MANZANA_ID', ('cve_mza', 'manzana_id'), None, False),
+)
+
+# Tipo que se le pide directamente al parser de CSV
+_DTYPE_LECTURA = {'int32': 'int32', 'float32': 'float32', 'float64': 'float64', 'category': 'category', 'texto': 'str'}
+_CODIFICACIONES = ('utf-8-sig', 'latin-1')
+
+
+def normalizar_columna(nombre):
+    """'CLAVE\\nDISTRITO' -> 'clave_distrito', 'Sección' -> 'seccion'."""
+    texto = unicodedata.normalize('NFKD', str(nombre)).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(texto.lower().split())
+
+
+def mapear_columnas(columnas, esquema):
+    """{columna destino: índice en 'columnas'}; None si falta una obligatoria."""
+    normalizadas = [normalizar_columna(c) for c in columnas]
+    usadas, mapa = set(), {}
+    for destino, fragmentos, _, _ in esquema:
+        i = next((i for i, c in enumerate(normalizadas)
+                  if i not in usadas and any(f in c for f in fragmentos)), None)
+        if i is not None:
+            mapa[destino] = i
+            usadas.add(i)
+    if any(obligatoria and destino not in mapa for destino, _, _, obligatoria in esquema):
+        return None
+    return mapa
+
+
+def tipar(serie, tipo):
+    """Convierte una columna leída sin tipo (camino lento) al tipo del esquema."""
+    if tipo is None:
+        return serie
+    if tipo in ('texto', 'category'):
+        texto = serie.where(serie.isna(), serie.astype(str).str.strip())
+        return texto.astype('category' if tipo == 'category' else 'str')
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if tipo == 'bool':
+        return numeros.fillna(0).astype(bool)
+    if tipo == 'int32':
+        return numeros.fillna(0).astype(np.int32)
+    return numeros.astype(tipo)
+
+
+def _es_csv(ruta):
+    return os.path.splitext(ruta)[1].lower() in ('.csv', '.txt')
+
+
+def _encabezado(ruta):
+    """(nombres de columna, codificación) sin leer el cuerpo del archivo."""
+    if not _es_csv(ruta):
+        import pyogrio
+        return list(pyogrio.read_info(ruta)['fields']), None
+    for codificacion in _CODIFICACIONES:
+        try:
+            return list(pd.read_csv(ruta, nrows=0, encoding=codificacion).columns), codificacion
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"No se pudo decodificar {ruta}")
+
+
+@lru_cache(maxsize=64)
+def _resolver(ruta, firma, esquema):
+    columnas, codificacion = _encabezado(ruta)
+    mapa = mapear_columnas(columnas, esquema)
+    if mapa is None:
+        faltan = [d for d, _, _, obligatoria in esquema if obligatoria]
+        raise ValueError(f"No se encontraron las columnas {faltan} en {ruta}. Columnas disponibles: {columnas}")
+    return {destino: columnas[i] for destino, i in mapa.items()}, codificacion
+
+
+def resolver(ruta, esquema):
+    """
+    ({columna destino: nombre en el archivo}, codificación) para ese archivo.
+    Memorizado por (ruta, tamaño, mtime): solo se vuelve a leer el encabezado
+    si el archivo cambia.
+    """
+    info = os.stat(ruta)
+    mapa, codificacion = _resolver(os.path.abspath(ruta), (info.st_size, info.st_mtime_ns), esquema)
+    return dict(mapa), codificacion
+
+
+def _subconjunto(mapa, columnas):
+    return mapa if columnas is None else {d: c for d, c in mapa.items() if d in columnas}
+
+
+def leer_csv(ruta, esquema, columnas=None):
+    """
+    Solo las columnas del esquema (o las indicadas en 'columnas' que existan),
+    con los nombres destino y tipos compactos. Las opcionales que no están en
+    el archivo no aparecen en el resultado.
+    """
+    mapa, codificacion = resolver(ruta, esquema)
+    mapa = _subconjunto(mapa, columnas)
+    tipos = {destino: tipo for destino, _, tipo, _ in esquema}
+    dtype = {c: _DTYPE_LECTURA[tipos[d]] for d, c in mapa.items() if tipos[d] in _DTYPE_LECTURA}
+    try:
+        df = pd.read_csv(ruta, usecols=list(mapa.values()), dtype=dtype, encoding=codificacion)
+    except (ValueError, TypeError):
+        # Vacíos en columnas enteras o textos en columnas numéricas
+        df = pd.read_csv(ruta, usecols=list(mapa.values()), encoding=codificacion)
+        df = df.assign(**{c: tipar(df[c], tipos[d]) for d, c in mapa.items()})
+    else:
+        df = df.assign(**{c: tipar(df[c], 'bool') for d, c in mapa.items() if tipos[d] == 'bool'})
+    return df.rename(columns={c: d for d, c in mapa.items()})[list(mapa)]
+
+
+def leer_capa(ruta, esquema, columnas=None, **kwargs):
+    """Como leer_csv, para capas vectoriales (los kwargs van a geopandas.read_file: where, bbox, mask...)."""
+    import geopandas as gpd
+    mapa, _ = resolver(ruta, esquema)
+    mapa = _subconjunto(mapa, columnas)
+    tipos = {destino: tipo for destino, _, tipo, _ in esquema}
+    gdf = gpd.read_file(ruta, columns=list(mapa.values()), **kwargs)
+    gdf = gdf.rename(columns={c: d for d, c in mapa.items()})
+    gdf = gdf.assign(**{d: tipar(gdf[d], tipos[d]) for d in mapa if tipos[d] is not None})
+    return gdf[list(mapa) + [gdf.geometry.name]]
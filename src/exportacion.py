@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+import os
+import io
+import json
+import shutil
+import zipfile
+import hashlib
+import sys
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+# ==============================================================================
+# EXPORTACIÓN DE MAPAS (fuera del ciclo normal de la página)
+# ==============================================================================
+# Serializar el mapa de folium cuesta; antes se hacía en CADA rerun aunque
+# nadie descargara nada. Ahora:
+#   - el HTML del mapa se genera solo al pulsar el botón y se guarda por llave
+#   - los paquetes de campo (HTML + PDF por brigada) se generan en segundo
+#     plano, en procesos aparte, apenas cambia el plan; los procesos salen
+#     de una sola cola con tope (MAX_PROCESOS_PAQUETES) para todas las sesiones
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_PAQUETES = "data/paquetes"
+_MEMORIA_HTML = OrderedDict()
+_MAX_HTML = 16
+# Procesos de paquetes corriendo a la vez (en todo el servidor)
+MAX_PROCESOS_PAQUETES = max(1, min(4, (os.cpu_count() or 2) // 2))
+_EJECUTOR_PAQUETES = None
+# Carpetas con trabajo sin terminar (limpiar_paquetes no las toca)
+_EN_CURSO = {}
+_CANDADO = threading.Lock()
+
+
+def html_mapa(clave, mapa, preparar=None):
+    """
+    HTML del mapa (bytes), generado una sola vez por llave. 'preparar' se
+    llama solo cuando hay que generarlo (p. ej. incrustar lo que en la app
+    llega por teselas). La memoria la comparten todas las sesiones: se toca
+    bajo el candado; el render va fuera para no frenar a las demás.
+    """
+    with _CANDADO:
+        if clave in _MEMORIA_HTML:
+            _MEMORIA_HTML.move_to_end(clave)
+            return _MEMORIA_HTML[clave]
+    if preparar is not None:
+        preparar()
+    html = mapa.get_root().render().encode('utf-8')
+    with _CANDADO:
+        _MEMORIA_HTML[clave] = html
+        _MEMORIA_HTML.move_to_end(clave)
+        while len(_MEMORIA_HTML) > _MAX_HTML:
+            _MEMORIA_HTML.popitem(last=False)
+    return html
+
+
+def huella_plan(*partes):
+    """Hash corto de lo que define un plan (asignación, paradas, sorteo...)."""
+    h = hashlib.sha1()
+    for p in partes:
+        h.update(json.dumps(p, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+# ------------------------------------------------------------------------------
+# PAQUETES POR BRIGADA (corren en procesos aparte: solo datos simples)
+# ------------------------------------------------------------------------------
+
+def _tabla_html(paradas):
+    filas = "".join(
+        f"<tr><td>{p['Orden']}</td><td>{p['seccion']}</td><td>{p['Localidad']}</td>"
+        f"<td>{p['Encuestas']}</td><td>{p['Dist_Acum_km']}</td></tr>"
+        for p in paradas
+    )
+    return (
+        "<table style='border-collapse:collapse;font-family:sans-serif;font-size:13px' border='1' cellpadding='4'>"
+        "<tr><th>Orden</th><th>Sección</th><th>Localidad</th><th>Encuestas</th><th>Km acum.</th></tr>"
+        f"{filas}</table>"
+    )
+
+
+def _paquete_html(datos, ruta):
+    import folium
+    m = folium.Map(tiles="CartoDB positron")
+    capa = folium.GeoJson(
+        json.loads(datos['secciones']), name="Secciones",
+        style_function=lambda x, c=datos['color']: {'fillColor': c, 'color': 'black', 'weight': 2, 'fillOpacity': 0.4},
+        tooltip=folium.GeoJsonTooltip(fields=['seccion', 'Meta'])
+    ).add_to(m)
+    if datos.get('manzanas'):
+        folium.GeoJson(
+            json.loads(datos['manzanas']), name="Manzanas en muestra",
+            style_function=lambda x: {'fillColor': '#E74C3C', 'color': '#C0392B', 'weight': 1, 'fillOpacity': 0.7}
+        ).add_to(m)
+    puntos = [[p['lat'], p['lon']] for p in datos['paradas']]
+    if len(puntos) > 1:
+        folium.PolyLine(puntos, color=datos['color'], weight=3, dash_array='6,4').add_to(m)
+    for p in datos['paradas']:
+        folium.Marker(
+            [p['lat'], p['lon']], tooltip=f"{p['Orden']}. {p['Localidad']} ({p['seccion']})",
+            icon=folium.DivIcon(html=f"<div style='background:white;border:2px solid {datos['color']};"
+                                     f"border-radius:50%;width:22px;text-align:center;font-weight:bold'>{p['Orden']}</div>")
+        ).add_to(m)
+    m.fit_bounds(capa.get_bounds())
+    folium.LayerControl().add_to(m)
+
+    titulo = f"<h2 style='font-family:sans-serif'>Brigada {datos['grupo']} · {datos['km']:.1f} km estimados</h2>"
+    m.get_root().html.add_child(folium.Element(
+        f"<div style='position:absolute;z-index:1000;top:10px;left:60px;max-height:45%;overflow:auto;"
+        f"background:white;padding:6px;opacity:0.92'>{titulo}{_tabla_html(datos['paradas'])}</div>"
+    ))
+    m.save(ruta)
+
+
+def _paquete_pdf(datos, ruta):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    import geopandas as gpd
+
+    secciones = gpd.GeoDataFrame.from_features(json.loads(datos['secciones'])['features'])
+    with PdfPages(ruta) as pdf:
+        fig, ax = plt.subplots(figsize=(8.5, 11))
+        secciones.plot(ax=ax, color=datos['color'], alpha=0.35, edgecolor='black')
+        for _, s in secciones.iterrows():
+            c = s.geometry.representative_point()
+            ax.annotate(str(s['seccion']), (c.x, c.y), ha='center', fontsize=9, weight='bold')
+        if datos.get('manzanas'):
+            manz = gpd.GeoDataFrame.from_features(json.loads(datos['manzanas'])['features'])
+            if not manz.empty:
+                manz.plot(ax=ax, color='#E74C3C', edgecolor='#C0392B', linewidth=0.5)
+        lon = [p['lon'] for p in datos['paradas']]
+        lat = [p['lat'] for p in datos['paradas']]
+        ax.plot(lon, lat, '--', color='black', linewidth=1)
+        for p in datos['paradas']:
+            ax.annotate(str(p['Orden']), (p['lon'], p['lat']), fontsize=8,
+                        bbox=dict(boxstyle='circle', fc='white', ec=datos['color']))
+        ax.set_title(f"Brigada {datos['grupo']} · {datos['km']:.1f} km estimados")
+        ax.set_axis_off()
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        # Tabla de visita (hasta 40 renglones por hoja)
+        columnas = ['Orden', 'seccion', 'Localidad', 'Encuestas', 'Dist_Acum_km']
+        for inicio in range(0, len(datos['paradas']), 40):
+            bloque = datos['paradas'][inicio:inicio + 40]
+            fig, ax = plt.subplots(figsize=(8.5, 11))
+            ax.set_axis_off()
+            tabla = ax.table(cellText=[[str(p[c]) for c in columnas] for p in bloque],
+                             colLabels=['Orden', 'Sección', 'Localidad', 'Encuestas', 'Km acum.'], loc='upper center')
+            tabla.auto_set_font_size(False)
+            tabla.set_fontsize(8)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def generar_paquete(datos, dir_salida):
+    """HTML + PDF de una brigada. Devuelve las rutas generadas."""
+    base = os.path.join(dir_salida, f"brigada_{datos['grupo']}")
+    _paquete_html(datos, base + ".html")
+    _paquete_pdf(datos, base + ".pdf")
+    return [base + ".html", base + ".pdf"]
+
+
+def _ejecutor_paquetes():
+    global _EJECUTOR_PAQUETES
+    with _CANDADO:
+        if _EJECUTOR_PAQUETES is None:
+            _EJECUTOR_PAQUETES = ThreadPoolExecutor(max_workers=MAX_PROCESOS_PAQUETES, thread_name_prefix="paquete")
+        return _EJECUTOR_PAQUETES
+
+
+def _marcar_en_curso(carpeta, delta):
+    """Cuenta trabajos vivos por carpeta (+1 al encolar, -1 al terminar o cancelar)."""
+    carpeta = os.path.abspath(carpeta)
+    with _CANDADO:
+        n = _EN_CURSO.get(carpeta, 0) + delta
+        if n > 0:
+            _EN_CURSO[carpeta] = n
+        else:
+            _EN_CURSO.pop(carpeta, None)
+
+
+def _proceso_paquete(ruta_datos, dir_salida, ruta_log):
+    """Corre en un hilo del ejecutor: un proceso aparte por brigada. Devuelve el código de salida."""
+    with open(ruta_log, 'wb') as log:
+        return subprocess.run(
+            [sys.executable, "-m", "src.exportacion", os.path.abspath(ruta_datos), os.path.abspath(dir_salida)],
+            cwd=RAIZ_REPO, stdout=subprocess.DEVNULL, stderr=log
+        ).returncode
+
+
+class PaquetesBrigadas:
+    """
+    Trabajo en segundo plano: un proceso por brigada. Se crea una vez por
+    plan (ver huella_plan) y la página solo consulta su avance.
+
+    Son procesos independientes (python -m src.exportacion) y no un pool de
+    multiprocessing: dentro de Streamlit el __main__ es la página, y un
+    proceso 'spawn' intentaría volver a ejecutarla. Se lanzan desde una cola
+    compartida con tope; cancelar() saca de la cola lo que aún no arranca
+    (plan que ya no se está viendo) y consultar el avance lo vuelve a encolar.
+    """
+
+    def __init__(self, huella, datos_por_brigada, dir_base=DIR_PAQUETES):
+        self.huella = huella
+        self.dir_salida = os.path.join(dir_base, huella)
+        self.grupos = [d['grupo'] for d in datos_por_brigada]
+        self._tareas = {}
+        self._candado = threading.Lock()
+        if os.path.exists(os.path.join(self.dir_salida, "listo")):
+            return
+        os.makedirs(self.dir_salida, exist_ok=True)
+        for d in datos_por_brigada:
+            with open(self._ruta_datos(d['grupo']), 'w', encoding='utf-8') as f:
+                json.dump(d, f)
+        with self._candado:
+            for g in self.grupos:
+                self._encolar(g)
+
+    def _ruta_datos(self, grupo):
+        return os.path.join(self.dir_salida, f"brigada_{grupo}.json")
+
+    def _ruta_log(self, grupo):
+        return os.path.join(self.dir_salida, f"brigada_{grupo}.log")
+
+    def _encolar(self, grupo):
+        _marcar_en_curso(self.dir_salida, +1)
+        tarea = _ejecutor_paquetes().submit(_proceso_paquete, self._ruta_datos(grupo), self.dir_salida, self._ruta_log(grupo))
+        tarea.add_done_callback(lambda _: _marcar_en_curso(self.dir_salida, -1))
+        self._tareas[grupo] = tarea
+
+    def cancelar(self):
+        """Saca de la cola las brigadas que aún no arrancan (las que ya corren terminan)."""
+        with self._candado:
+            for tarea in self._tareas.values():
+                tarea.cancel()
+
+    def _reanudar(self):
+        with self._candado:
+            for g, tarea in list(self._tareas.items()):
+                if tarea.cancelled():
+                    self._encolar(g)
+
+    def avance(self):
+        """(brigadas listas, total)."""
+        if not self._tareas:
+            return len(self.grupos), len(self.grupos)
+        self._reanudar()
+        return sum(t.done() for t in self._tareas.values()), len(self._tareas)
+
+    def listo(self):
+        hechos, total = self.avance()
+        if hechos < total:
+            return False
+        for g, tarea in self._tareas.items():
+            try:
+                codigo = tarea.result()
+            except CancelledError:
+                return False
+            if codigo:
+                with open(self._ruta_log(g), encoding='utf-8', errors='ignore') as f:
+                    detalle = f.read()[-500:]
+                raise RuntimeError(f"Falló el paquete de la brigada {g}: {detalle}")
+        marca = os.path.join(self.dir_salida, "listo")
+        if not os.path.exists(marca):
+            open(marca, 'w').close()
+        return True
+
+    def zip_bytes(self, grupos=None):
+        """ZIP con los paquetes (todas las brigadas o las indicadas)."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+            for g in grupos or self.grupos:
+                for ext in ('html', 'pdf'):
+                    ruta = os.path.join(self.dir_salida, f"brigada_{g}.{ext}")
+                    if os.path.exists(ruta):
+                        z.write(ruta, os.path.basename(ruta))
+        return buffer.getvalue()
+
+
+# ------------------------------------------------------------------------------
+# EXPORTACIONES COLUMNARES (GeoParquet / GeoPackage / JSON compacto)
+# ------------------------------------------------------------------------------
+# Para apps de campo y tableros: el plan con geometrías, brigada, metas y
+# manzanas en muestra. Se escriben a disco en un hilo (lee los DataFrames de
+# la sesión sin copiarlos), por bloques, completo y por brigada; el botón de
+# descarga entrega el archivo ya hecho.
+
+DIR_EXPORTACIONES = "data/exportaciones"
+FORMATOS_EXPORTACION = {
+    'GeoParquet': ('zip', 'application/zip'),
+    'GeoPackage': ('gpkg', 'application/geopackage+sqlite3'),
+    'JSON compacto': ('json', 'application/json'),
+}
+TAM_BLOQUE_EXPORTACION = 5000
+DECIMALES_JSON = 6
+
+
+def capas_plan(gdf_asignado, df_rutas, gdf_manz_sel=None):
+    """Capas del plan (secciones, paradas y manzanas en muestra) como GeoDataFrames en WGS84."""
+    import geopandas as gpd
+    columnas = [c for c in ('seccion', 'Grupo_ID', 'Meta', 'Manzanas_Obj', 'Localidad_Full') if c in gdf_asignado.columns]
+    capas = {'secciones': gdf_asignado[columnas + ['geometry']]}
+    paradas = df_rutas[[c for c in df_rutas.columns if c not in ('x', 'y', 'lat', 'lon')]]
+    capas['paradas'] = gpd.GeoDataFrame(
+        paradas, geometry=gpd.points_from_xy(df_rutas['lon'], df_rutas['lat']), crs="EPSG:4326"
+    )
+    if gdf_manz_sel is not None and not gdf_manz_sel.empty:
+        grupo = gdf_asignado.set_index('seccion')['Grupo_ID']
+        capas['manzanas_muestra'] = gdf_manz_sel.assign(
+            Grupo_ID=grupo.reindex(gdf_manz_sel['seccion'].to_numpy()).to_numpy()
+        )
+    return capas
+
+
+def _bloques(gdf, tam=TAM_BLOQUE_EXPORTACION):
+    for inicio in range(0, len(gdf), tam):
+        yield gdf.iloc[inicio:inicio + tam]
+
+
+def _escribir_geoparquet(capas, ruta):
+    """ZIP con un .parquet (GeoParquet) por capa; los grupos de filas van por bloques."""
+    tmp_dir = f"{ruta}.partes"
+    os.makedirs(tmp_dir, exist_ok=True)
+    with zipfile.ZipFile(ruta, 'w', zipfile.ZIP_STORED) as z:   # Parquet ya va comprimido
+        for nombre, gdf in capas.items():
+            parte = os.path.join(tmp_dir, f"{nombre}.parquet")
+            gdf.to_parquet(parte, index=False, row_group_size=TAM_BLOQUE_EXPORTACION)
+            z.write(parte, f"{nombre}.parquet")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _escribir_geopackage(capas, ruta):
+    """Un GeoPackage con una capa por tabla, escrita bloque por bloque (append)."""
+    import pyogrio
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    for nombre, gdf in capas.items():
+        for k, bloque in enumerate(_bloques(gdf)):
+            pyogrio.write_dataframe(bloque, ruta, layer=nombre, driver="GPKG", append=k > 0)
+
+
+def _escribir_json(capas, ruta):
+    """
+    JSON por columnas: {capa: {"columnas": [...], "filas": [[...], ...]}} con
+    la geometría como GeoJSON en la última columna (coordenadas a 6 decimales).
+    Se escribe fila por fila, sin armar el documento completo en memoria.
+    """
+    import numpy as np
+    import shapely
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for i, (nombre, gdf) in enumerate(capas.items()):
+            atributos = [c for c in gdf.columns if c != gdf.geometry.name]
+            f.write(f'{"," if i else ""}{json.dumps(nombre)}:{{"columnas":{json.dumps(atributos + ["geometria"])},"filas":[')
+            primera = True
+            for bloque in _bloques(gdf):
+                geoms = shapely.set_precision(np.asarray(bloque.geometry.values), 10 ** -DECIMALES_JSON)
+                geojson = shapely.to_geojson(geoms)
+                valores = json.loads(bloque[atributos].to_json(orient='values'))
+                for fila, g in zip(valores, geojson):
+                    cuerpo = json.dumps(fila, ensure_ascii=False, separators=(',', ':'))[1:-1]
+                    f.write(f'{"" if primera else ","}[{cuerpo}{"," if cuerpo else ""}{g or "null"}]')
+                    primera = False
+            f.write(']}')
+        f.write('}')
+
+
+_ESCRITORES = {'zip': _escribir_geoparquet, 'gpkg': _escribir_geopackage, 'json': _escribir_json}
+
+
+class ExportacionesPlan:
+    """
+    Archivos de exportación de un plan (todas las brigadas y cada una), escritos
+    en un hilo de fondo. Igual que PaquetesBrigadas: uno por huella de plan.
+    """
+
+    def __init__(self, huella, capas, dir_base=DIR_EXPORTACIONES):
+        self.huella = huella
+        self.dir_salida = os.path.join(dir_base, huella)
+        self.grupos = sorted(int(g) for g in capas['secciones']['Grupo_ID'].unique())
+        self._error = None
+        self._hechos = 0
+        if os.path.exists(os.path.join(self.dir_salida, "listo")):
+            self._hilo = None
+            return
+        _marcar_en_curso(self.dir_salida, +1)
+        self._hilo = threading.Thread(target=self._escribir, args=(capas,), name=f"exportar-{huella}", daemon=True)
+        self._hilo.start()
+
+    def ruta(self, formato, grupo=None):
+        extension = FORMATOS_EXPORTACION[formato][0]
+        nombre = "plan" if grupo is None else f"brigada_{grupo}"
+        return os.path.join(self.dir_salida, f"{nombre}.{extension}")
+
+    def _escribir(self, capas):
+        try:
+            os.makedirs(self.dir_salida, exist_ok=True)
+            por_brigada = [(None, capas)] + [
+                (g, {n: c[c['Grupo_ID'] == g] for n, c in capas.items()}) for g in self.grupos
+            ]
+            for grupo, subcapas in por_brigada:
+                for formato, (extension, _) in FORMATOS_EXPORTACION.items():
+                    destino = self.ruta(formato, grupo)
+                    tmp = f"{destino}.tmp.{extension}"
+                    _ESCRITORES[extension](subcapas, tmp)
+                    os.replace(tmp, destino)
+                self._hechos += 1
+            open(os.path.join(self.dir_salida, "listo"), 'w').close()
+        except Exception as e:
+            self._error = e
+        finally:
+            _marcar_en_curso(self.dir_salida, -1)
+
+    def avance(self):
+        """(conjuntos listos, total): el plan completo y uno por brigada."""
+        total = len(self.grupos) + 1
+        return (total if self._hilo is None else self._hechos), total
+
+    def listo(self):
+        if self._error is not None:
+            raise RuntimeError(f"Falló la exportación del plan: {self._error}")
+        return self._hilo is None or not self._hilo.is_alive()
+
+    def contenido(self, formato, grupo=None):
+        """Bytes del archivo ya escrito (se leen solo al pulsar el botón de descarga)."""
+        with open(self.ruta(formato, grupo), 'rb') as f:
+            return f.read()
+
+
+def limpiar_paquetes(conservar, dir_base=DIR_PAQUETES, maximo=8):
+    """Borra los paquetes más viejos (deja 'maximo', nunca el vigente ni uno que se está generando)."""
+    if not os.path.isdir(dir_base):
+        return
+    carpetas = sorted((os.path.join(dir_base, d) for d in os.listdir(dir_base)), key=os.path.getmtime, reverse=True)
+    with _CANDADO:
+        en_curso = set(_EN_CURSO)
+    for ruta in carpetas[maximo:]:
+        if os.path.basename(ruta) != conservar and os.path.abspath(ruta) not in en_curso:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # python -m src.exportacion <datos_brigada.json> <dir_salida>
+    with open(sys.argv[1], encoding='utf-8') as f:
+        generar_paquete(json.load(f), sys.argv[2])
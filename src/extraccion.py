@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import pyogrio
+import geopandas as gpd
+from src.indices import asignar_seccion_manzanas
+
+# ==============================================================================
+# EXTRACCIÓN POR BLOQUES (memoria acotada)
+# ==============================================================================
+# Los shapefiles estatales (SECCION, MANZANAS) no se cargan completos: se leen
+# en bloques de Arrow con filtro de atributos (WHERE) y ventana espacial (bbox,
+# que aprovecha el índice .qix), y la salida se escribe incrementalmente.
+
+TAM_BLOQUE = 20000
+
+
+def leer_por_bloques(ruta, where=None, bbox=None, columnas=None, tam_bloque=TAM_BLOQUE):
+    """Generador de GeoDataFrames de hasta 'tam_bloque' features."""
+    with pyogrio.open_arrow(ruta, where=where, bbox=bbox, columns=columnas,
+                            batch_size=tam_bloque, use_pyarrow=True) as (meta, lector):
+        col_geom = meta['geometry_name'] or 'wkb_geometry'
+        for lote in lector:
+            geom = gpd.GeoSeries.from_wkb(lote.column(col_geom).to_numpy(zero_copy_only=False), crs=meta['crs'])
+            datos = lote.drop_columns([col_geom]).to_pandas()
+            yield gpd.GeoDataFrame(datos, geometry=geom.values, crs=meta['crs'])
+
+
+def buscar_campo(ruta, candidatos):
+    """(campo, es_texto) del primer campo del archivo que esté en 'candidatos', o (None, False)."""
+    info = pyogrio.read_info(ruta)
+    for campo, dtype in zip(info['fields'], info['dtypes']):
+        if campo.upper() in candidatos:
+            return campo, dtype == 'object'
+    return None, False
+
+
+def filtro_por_campo(ruta, candidatos, valor):
+    """
+    Cláusula WHERE sobre el primer campo del archivo que esté en 'candidatos'
+    (p. ej. MUNICIPIO o CVE_MUN), respetando si el campo es texto ('208') o
+    número (208). Con una lista de valores arma un IN. None si ninguno existe.
+    """
+    campo, es_texto = buscar_campo(ruta, candidatos)
+    if campo is None:
+        return None
+    valores = list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
+    literales = [f"'{int(v):03d}'" if es_texto else str(int(v)) for v in valores]
+    if len(literales) == 1:
+        return f"{campo} = {literales[0]}"
+    return f"{campo} IN ({', '.join(literales)})"
+
+
+def crs_de(ruta):
+    return pyogrio.read_info(ruta)['crs']
+
+
+def extraer_manzanas_streaming(ruta_manzanas, gdf_secciones, col_seccion, salida,
+                               where=None, tam_bloque=TAM_BLOQUE, crs_salida="EPSG:4326"):
+    """
+    Manzanas de las secciones dadas, leídas por bloques dentro del bbox de
+    esas secciones y escritas a 'salida' (GeoJSON) bloque por bloque. Cada
+    manzana sale una sola vez, con la SECCION de su punto interior (con
+    'intersects' la que toca dos secciones salía repetida); las que no caen
+    en ninguna se descartan. Devuelve el total escrito.
+    """
+    secciones = gdf_secciones[[col_seccion, 'geometry']].to_crs(crs_de(ruta_manzanas))
+    bbox = tuple(secciones.total_bounds)
+
+    if os.path.exists(salida):
+        os.remove(salida)
+
+    total = 0
+    for bloque in leer_por_bloques(ruta_manzanas, where=where, bbox=bbox, tam_bloque=tam_bloque):
+        seccion = asignar_seccion_manzanas(bloque, secciones, col_seccion)
+        dentro = seccion != -1
+        if not dentro.any():
+            continue
+        cruce = gpd.GeoDataFrame({'SECCION': seccion[dentro]}, geometry=bloque.geometry.values[dentro],
+                                 crs=bloque.crs).to_crs(crs_salida)
+        pyogrio.write_dataframe(cruce, salida, driver="GeoJSON", append=total > 0)
+        total += len(cruce)
+    return total
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import shapely
+
+# ==============================================================================
+# TABLA DE ATRIBUTOS GEOMÉTRICOS (una vez por carga de datos)
+# ==============================================================================
+# Centroides, proyección a UTM, bounds y áreas se pedían en cada rerun y en
+# cada llamada al optimizador. Aquí se calculan una sola vez por capa y se
+# guardan como arreglos NumPy (de solo lectura: se comparten entre sesiones);
+# los consumidores buscan por id de sección (o por posición si la capa no
+# tiene id).
+
+CRS_UTM = "EPSG:32614"
+CRS_WGS84 = "EPSG:4326"
+
+
+def _solo_lectura(*arreglos):
+    for a in arreglos:
+        a.setflags(write=False)
+
+
+class TablaGeometria:
+    """
+    ids[i]               -> id de la fila i (sección) o su posición
+    xy_utm[i]            -> centroide en metros (EPSG:32614)
+    latlon[i]            -> el mismo centroide en WGS84 (lat, lon)
+    bounds_wgs84[i]      -> (minx, miny, maxx, maxy) en grados
+    bounds_utm[i]        -> (minx, miny, maxx, maxy) en metros
+    area_m2[i]           -> área en metros cuadrados
+    """
+
+    def __init__(self, gdf, col_id='seccion'):
+        geoms_utm = gdf.geometry.to_crs(CRS_UTM)
+        centroides = geoms_utm.centroid
+        self.ids = (gdf[col_id].to_numpy(dtype=np.int64) if col_id else np.arange(len(gdf), dtype=np.int64))
+        self.xy_utm = shapely.get_coordinates(centroides.values)
+        centroides_wgs = centroides.to_crs(CRS_WGS84)
+        self.latlon = np.column_stack([centroides_wgs.y.to_numpy(), centroides_wgs.x.to_numpy()])
+        self.bounds_utm = shapely.bounds(np.asarray(geoms_utm.values))
+        self.bounds_wgs84 = shapely.bounds(np.asarray(gdf.geometry.to_crs(CRS_WGS84).values))
+        self.area_m2 = shapely.area(np.asarray(geoms_utm.values))
+        _solo_lectura(self.ids, self.xy_utm, self.latlon, self.bounds_utm, self.bounds_wgs84, self.area_m2)
+        self._indice = pd.Index(self.ids)
+        self._centroides = pd.DataFrame({'lat': self.latlon[:, 0], 'lon': self.latlon[:, 1]}, index=self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def posiciones(self, ids):
+        """Posición de cada id en la tabla (-1 si no está)."""
+        return self._indice.get_indexer(np.asarray(ids, dtype=np.int64))
+
+    def centroides_utm(self, ids):
+        """Centroides en metros para esos ids; None si falta alguno."""
+        pos = self.posiciones(ids)
+        return None if (pos < 0).any() else self.xy_utm[pos]
+
+    def centro(self, ids=None):
+        """(lat, lon) promedio de los centroides (todas las filas o esos ids)."""
+        if ids is None:
+            latlon = self.latlon
+        else:
+            pos = self.posiciones(ids)
+            latlon = self.latlon[pos[pos >= 0]]
+        return tuple(latlon.mean(axis=0)) if len(latlon) else (np.nan, np.nan)
+
+    def indice_centroides(self):
+        """DataFrame id -> (lat, lon) de los centroides, para construir_pines (compartido: no modificar)."""
+        return self._centroides
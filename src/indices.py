@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import shapely
+import geopandas as gpd
+
+# ==============================================================================
+# ÍNDICE SECCIÓN -> MANZANAS (estilo CSR)
+# ==============================================================================
+# Filtrar la traza urbana por brigada era un sjoin (R-tree) en cada rerun.
+# Como cada manzana pertenece a una sola sección, basta con ordenar las filas
+# por sección una vez y guardar dónde empieza cada una (offsets).
+
+
+def asignar_seccion_manzanas(gdf_manzanas, gdf_secciones, col_seccion='seccion'):
+    """
+    Sección de cada manzana por su punto interior (una sola sección por
+    manzana, a diferencia de 'intersects'). -1 si no cae en ninguna.
+    """
+    puntos = gpd.GeoDataFrame(geometry=gdf_manzanas.representative_point(), crs=gdf_manzanas.crs)
+    secciones = gdf_secciones[[col_seccion, 'geometry']].to_crs(gdf_manzanas.crs)
+    cruce = gpd.sjoin(puntos, secciones, how='left', predicate='within')
+    cruce = cruce[~cruce.index.duplicated()]
+    return cruce[col_seccion].reindex(gdf_manzanas.index).fillna(-1).astype(int).to_numpy()
+
+
+def manzanas_unicas(gdf_manzanas, gdf_secciones, col_seccion='seccion'):
+    """
+    Una fila por manzana. Los GeoJSON escritos con un cruce 'intersects' traen
+    repetida (una vez por sección) la manzana que toca dos secciones, y el
+    índice la contaría en ambas: se deja una sola, con la sección de su punto
+    interior. Si no hay repetidas se devuelve el mismo GeoDataFrame.
+    """
+    repetida = pd.Series(shapely.to_wkb(gdf_manzanas.geometry.values)).duplicated().to_numpy()
+    if not repetida.any():
+        return gdf_manzanas
+    unicas = gdf_manzanas[~repetida].reset_index(drop=True)
+    return unicas.assign(SECCION=asignar_seccion_manzanas(unicas, gdf_secciones, col_seccion))
+
+
+class IndiceSeccionManzana:
+    """
+    claves[i]   -> id de sección
+    filas[offsets[i]:offsets[i+1]] -> posiciones (iloc) de sus manzanas
+    """
+
+    def __init__(self, secciones_por_manzana):
+        secc = np.asarray(secciones_por_manzana, dtype=np.int64)
+        self.filas = np.argsort(secc, kind='stable').astype(np.int32)
+        self.claves, conteos = np.unique(secc[self.filas], return_counts=True)
+        self.offsets = np.zeros(len(self.claves) + 1, dtype=np.int64)
+        np.cumsum(conteos, out=self.offsets[1:])
+
+    def filas_de(self, secciones):
+        """Posiciones de las manzanas de esas secciones (gather sin ciclos)."""
+        secciones = np.asarray(secciones, dtype=np.int64)
+        pos = np.searchsorted(self.claves, secciones)
+        pos = pos[(pos < len(self.claves)) & (self.claves[np.minimum(pos, len(self.claves) - 1)] == secciones)]
+        inicios = self.offsets[pos]
+        largos = self.offsets[pos + 1] - inicios
+        if largos.sum() == 0:
+            return np.empty(0, dtype=np.int32)
+        # Para cada tramo [inicio, inicio+largo): inicio repetido + contador local
+        desplaz = np.repeat(inicios - np.concatenate(([0], np.cumsum(largos)[:-1])), largos)
+        return self.filas[desplaz + np.arange(largos.sum())]
+
+    def __len__(self):
+        return len(self.filas)
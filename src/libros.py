@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+from src.artefactos import huella_archivos, leer_artefactos, guardar_artefactos
+from src.esquema import mapear_columnas, tipar
+
+# ==============================================================================
+# LECTURA DE LOS LIBROS DE EXCEL DE CAMPO (catálogo de manzanas y muestra)
+# ==============================================================================
+# La oficina de campo edita los .xlsx, no los CSV de data/raw. Aquí se leen
+# directo:
+#   - openpyxl en modo solo lectura (filas en flujo, sin cargar el libro
+#     completo) y con los valores ya calculados de las fórmulas
+#   - la hoja y la fila de encabezado se encuentran solas; las columnas se
+#     reconocen con los esquemas de src.esquema (mismo formato y reglas)
+#   - el resultado tipado se guarda como artefacto Parquet y se reutiliza
+#     mientras el libro no cambie (huella por tamaño/mtime y contenido)
+#
+# Los libros traen tablas auxiliares a la derecha (conteos, fórmulas): solo se
+# leen las columnas hasta el primer encabezado vacío.
+
+RUTA_CATALOGO = "data/Catalogo de Manzanas.xlsx"
+RUTA_MUESTRA = "data/Muestra.xlsx"
+# Subir cuando cambien los esquemas o la normalización (invalida el caché)
+VERSION_LIBROS = 1
+FILAS_ENCABEZADO = 10
+
+# Mismo formato que src.esquema: 'manzana en muestra' va antes que 'manzana'.
+ESQUEMA_CATALOGO = (
+    ('EN_MUESTRA', ('muestra',), 'bool', False),
+    ('SECCION', ('seccion',), 'int32', True),
+    ('LOCALIDAD', ('localidad',), 'int32', False),
+    ('MANZANA', ('manzana',), 'int32', True),
+    ('STATUS', ('status', 'estatus'), 'category', False),
+)
+ESQUEMA_LIBRO_MUESTRA = (
+    ('seccion', ('seccion',), 'int32', True),
+    ('veces_muestra', ('veces',), 'int32', True),
+    ('tipo', ('tipo',), 'category', False),
+    ('lista_nom', ('lista_nom',), 'int32', False),
+    ('prob_efectiva', ('probabilidad', 'prob'), 'float64', False),
+    ('peso', ('peso',), 'float64', False),
+    ('nom_localidad', ('localidad', 'nom_loc'), 'category', False),
+    ('encuestas_totales', ('encuestas',), 'int32', False),
+    ('manzanas_meta', ('manzanas_meta',), 'int32', False),
+)
+
+
+def _encabezado(filas):
+    """Nombres de la tabla principal: hasta el primer encabezado vacío."""
+    nombres = []
+    for valor in filas:
+        if valor is None or str(valor).strip() == "":
+            break
+        nombres.append(valor)
+    return nombres
+
+
+def leer_libro(ruta, esquema, hoja=None):
+    """
+    Tabla del libro con las columnas del esquema ya tipadas. Usa la primera
+    hoja (o la indicada) cuyo encabezado, dentro de las primeras filas, tenga
+    todas las columnas obligatorias. Las filas sin la primera columna
+    obligatoria (p. ej. sección vacía) se descartan.
+    """
+    import openpyxl
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hojas = [libro[hoja]] if hoja else libro.worksheets
+        for ws in hojas:
+            for n, fila in enumerate(ws.iter_rows(max_row=FILAS_ENCABEZADO, values_only=True), start=1):
+                nombres = _encabezado(fila)
+                mapa = mapear_columnas(nombres, esquema) if nombres else None
+                if mapa is not None:
+                    break
+            else:
+                continue
+
+            clave = mapa[next(d for d, _, _, obligatoria in esquema if obligatoria)]
+            columnas = {destino: [] for destino in mapa}
+            for fila in ws.iter_rows(min_row=n + 1, max_col=len(nombres), values_only=True):
+                if fila[clave] is None:
+                    continue
+                for destino, i in mapa.items():
+                    columnas[destino].append(fila[i])
+            tipos = {destino: tipo for destino, _, tipo, _ in esquema}
+            return pd.DataFrame({d: tipar(pd.Series(v, dtype=object), tipos[d]) for d, v in columnas.items()})
+    finally:
+        libro.close()
+    raise ValueError(f"Ninguna hoja de {ruta} tiene las columnas {[d for d, _, _, o in esquema if o]}")
+
+
+def _cargar(nombre, ruta, esquema, hoja=None):
+    huella = huella_archivos([ruta], extra=f"{VERSION_LIBROS}:{hoja}")
+    artefactos = leer_artefactos(nombre, huella)
+    if artefactos is not None:
+        return artefactos[nombre]
+    df = leer_libro(ruta, esquema, hoja)
+    guardar_artefactos(nombre, huella, {nombre: df})
+    return df
+
+
+def cargar_catalogo_manzanas(ruta=RUTA_CATALOGO, hoja=None):
+    """Catálogo de manzanas: SECCION, LOCALIDAD, MANZANA, STATUS y EN_MUESTRA (marcadas por campo)."""
+    return _cargar("libro_catalogo", ruta, ESQUEMA_CATALOGO, hoja)
+
+
+def cargar_muestra_libro(ruta=RUTA_MUESTRA, hoja=None):
+    """Secciones seleccionadas (veces en muestra, lista nominal, probabilidad y peso)."""
+    return _cargar("libro_muestra", ruta, ESQUEMA_LIBRO_MUESTRA, hoja)
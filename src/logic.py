@@ -1,77 +1,686 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
-import geopandas as gpd
+import os
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
+import shapely
 from sklearn.cluster import KMeans
 from scipy.spatial.distance import cdist
 from scipy.optimize import linear_sum_assignment
+from src.diagnostico import etapa
+from src.artefactos import DIR_CACHE
 
-def balanced_cluster_optimization(gdf, n_clusters):
+# ==============================================================================
+# MEMORIA DE SOLUCIONES (compartida por todas las sesiones del proceso)
+# ==============================================================================
+# Streamlit re-ejecuta todo el script con cualquier widget (filtro de grupo,
+# checkbox de traza urbana...) y cada supervisor abre su propia sesión.
+# Guardamos las asignaciones ya calculadas por (secciones, huella de
+# geometría, n_clusters, parámetros) en un LRU del proceso, con copia en disco
+# para que un reinicio o un segundo worker no vuelvan a optimizar.
+DIR_SOLUCIONES = os.path.join(DIR_CACHE, "soluciones")
+# Subir si cambia el algoritmo: invalida las soluciones guardadas en disco.
+_VERSION_SOLUCIONES = 2
+
+
+class MemoriaSoluciones:
+    """LRU en memoria + copia en disco (.npy por llave) con contadores de aciertos/fallos."""
+
+    def __init__(self, maximo=64, dir_disco=DIR_SOLUCIONES, maximo_disco=512):
+        self.maximo = maximo
+        self.dir_disco = dir_disco
+        self.maximo_disco = maximo_disco
+        self._datos = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+    def _ruta(self, clave):
+        llave = hashlib.sha1(repr((_VERSION_SOLUCIONES, clave)).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.dir_disco, f"{llave}.npy")
+
+    def obtener(self, clave, contar_acierto=True, contar_fallo=True):
+        """Grupos guardados para la llave, o None (cuenta acierto o fallo)."""
+        with self._candado:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += contar_acierto
+                return self._datos[clave]
+        if self.dir_disco:
+            ruta = self._ruta(clave)
+            try:
+                grupos = np.load(ruta)
+                os.utime(ruta)
+            except (OSError, ValueError):
+                grupos = None
+            if grupos is not None:
+                with self._candado:
+                    self.aciertos_disco += contar_acierto
+                self._en_memoria(clave, grupos)
+                return grupos
+        with self._candado:
+            self.fallos += contar_fallo
+        return None
+
+    def _en_memoria(self, clave, grupos):
+        with self._candado:
+            self._datos[clave] = grupos
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def guardar(self, clave, grupos):
+        """Guarda en memoria y en disco (solo resultados reproducibles)."""
+        self._en_memoria(clave, grupos)
+        if not self.dir_disco:
+            return
+        try:
+            os.makedirs(self.dir_disco, exist_ok=True)
+            ruta = self._ruta(clave)
+            tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(tmp, grupos)
+            os.replace(tmp, ruta)
+            archivos = [os.path.join(self.dir_disco, f) for f in os.listdir(self.dir_disco) if f.endswith('.npy')]
+            if len(archivos) > self.maximo_disco:
+                for viejo in sorted(archivos, key=os.path.getmtime)[:len(archivos) - self.maximo_disco]:
+                    os.remove(viejo)
+        except OSError as e:
+            print(f"Aviso memoria de soluciones: {e}")
+
+    def __contains__(self, clave):
+        with self._candado:
+            return clave in self._datos
+
+    def __len__(self):
+        with self._candado:
+            return len(self._datos)
+
+    def estadisticas(self):
+        with self._candado:
+            return {'aciertos': self.aciertos, 'aciertos_disco': self.aciertos_disco,
+                    'fallos': self.fallos, 'en_memoria': len(self._datos)}
+
+
+_MEMORIA_SOLUCIONES = MemoriaSoluciones()
+# Un candado por llave: si diez sesiones piden el mismo plan, una lo calcula y
+# las demás lo encuentran en la memoria al tomar el candado; planes distintos
+# (p. ej. el precalentado y el de una sesión) se calculan en paralelo.
+_CANDADOS_CLAVE = {}
+_CANDADO_CLAVES = threading.Lock()
+
+# Última solución calculada: punto de partida (warm-start) cuando solo cambia
+# n_clusters o unas pocas secciones. Depende de lo que el proceso resolvió
+# antes, así que los planes que salen de ella no entran a la memoria compartida.
+_ULTIMA_SOLUCION = {}
+_CANDADO_ULTIMA = threading.Lock()
+_SIMILITUD_MIN_WARM = 0.5
+
+# Arriba de este número de puntos el húngaro (matriz N x N, O(N^3)) deja de ser
+# viable y 'auto' cambia al modelo de transporte (matriz N x K).
+_LIMITE_HUNGARO = 1500
+METODOS_ASIGNACION = ('auto', 'hungaro', 'transporte')
+
+
+def huella_geometria(gdf):
+    """Hash de las geometrías (WKB) en el orden del GeoDataFrame."""
+    h = hashlib.sha1()
+    for wkb in shapely.to_wkb(np.asarray(gdf.geometry.values)):
+        h.update(wkb)
+    return h.hexdigest()
+
+
+def _centroides_iniciales(coords, n_clusters, previa):
+    """
+    Adapta los centroides de la solución previa al nuevo número de brigadas.
+    El orden se conserva, así que las brigadas existentes mantienen su ID.
+    """
+    centroides = previa['centroides']
+    k_prev = len(centroides)
+
+    if k_prev == n_clusters:
+        return centroides
+
+    if k_prev > n_clusters:
+        # Menos brigadas: fusionamos los centros previos ponderando por tamaño
+        km = KMeans(n_clusters=n_clusters, n_init=1, random_state=42)
+        km.fit(centroides, sample_weight=previa['tamanos'])
+        return km.cluster_centers_
+
+    # Más brigadas: agregamos centros en las secciones más alejadas
+    nuevos = list(centroides)
+    dist_min = cdist(coords, centroides).min(axis=1)
+    while len(nuevos) < n_clusters:
+        i = int(np.argmax(dist_min))
+        nuevos.append(coords[i])
+        dist_min = np.minimum(dist_min, np.linalg.norm(coords - coords[i], axis=1))
+    return np.array(nuevos)
+
+
+def tamanos_balanceados(n_points, n_clusters):
+    """Capacidad de cada brigada: todas iguales (+/- 1)."""
+    base_size = n_points // n_clusters
+    remainder = n_points % n_clusters
+    return np.array([base_size + (1 if i < remainder else 0) for i in range(n_clusters)])
+
+
+def asignacion_hungaro(coords, centroids, tamanos, costo=None):
+    """
+    Asignación exacta con el algoritmo húngaro sobre "huecos" (slots):
+    cada brigada se replica tantas veces como secciones le tocan.
+    Memoria O(N^2), tiempo O(N^3): solo para N chico.
+    'costo' (N x K) reemplaza a la distancia en línea recta si se da.
+    """
+    # Crear los "huecos" (slots) disponibles.
+    # Ej: Brigada 1, Brigada 1, Brigada 2, Brigada 2...
+    cluster_slots = np.repeat(np.arange(len(tamanos)), tamanos)
+
+    # Calculamos la distancia de TODAS las secciones a TODOS los centroides
+    if costo is None:
+        costo = cdist(coords, centroids)
+    cost_matrix = costo[:, cluster_slots]
+    
+    # El algoritmo húngaro asigna cada sección al mejor hueco disponible
+    # minimizando la distancia total recorrida.
+    row_ind, col_ind = linear_sum_assignment(cost_matrix)
+
+    # Recuperamos el ID de la brigada original
+    grupos = np.empty(len(coords), dtype=int)
+    grupos[row_ind] = cluster_slots[col_ind]
+    return grupos
+
+
+def asignacion_transporte(coords, centroids, tamanos, costo=None):
+    """
+    Mismo óptimo que el húngaro, formulado como flujo de costo mínimo con
+    capacidades (problema de transporte N puntos -> K brigadas).
+
+    Se parte de la asignación al centroide más cercano (óptima sin cupos) y se
+    corrigen los excedentes por caminos más cortos sucesivos en el grafo
+    residual de K nodos: la arista a->b cuesta lo mínimo que cuesta pasar un
+    punto de la brigada a a la b. Cada arista guarda un heap con sus puntos
+    candidatos, así que solo se usa la matriz N x K (memoria lineal en N).
+    """
+    n, k = len(coords), len(centroids)
+    if costo is None:
+        costo = cdist(coords, centroids)
+    grupos = costo.argmin(axis=1)
+    conteo = np.bincount(grupos, minlength=k)
+    exceso = conteo - np.asarray(tamanos)
+    if not exceso.any():
+        return grupos
+
+    # heaps[a][b]: (costo de mover i de a -> b, i, versión de i)
+    version = np.zeros(n, dtype=np.int64)
+    heaps = [[None] * k for _ in range(k)]
+    for a in range(k):
+        miembros = np.where(grupos == a)[0]
+        for b in range(k):
+            if a == b:
+                continue
+            delta = costo[miembros, b] - costo[miembros, a]
+            heap = list(zip(delta.tolist(), miembros.tolist(), [0] * len(miembros)))
+            heapq.heapify(heap)
+            heaps[a][b] = heap
+
+    def tope(a, b):
+        heap = heaps[a][b]
+        while heap:
+            delta, i, ver = heap[0]
+            if grupos[i] == a and version[i] == ver:
+                return delta, i
+            heapq.heappop(heap)
+        return None
+
+    while (exceso > 0).any():
+        # Aristas del grafo residual entre brigadas
+        aristas = []
+        for a in range(k):
+            for b in range(k):
+                if a != b:
+                    t = tope(a, b)
+                    if t is not None:
+                        aristas.append((a, b, t[0]))
+
+        # Bellman-Ford desde todas las brigadas con exceso (K nodos: trivial)
+        dist = np.where(exceso > 0, 0.0, np.inf)
+        previo = np.full(k, -1)
+        for _ in range(k - 1):
+            cambio = False
+            for a, b, w in aristas:
+                if dist[a] + w < dist[b] - 1e-12:
+                    dist[b] = dist[a] + w
+                    previo[b] = a
+                    cambio = True
+            if not cambio:
+                break
+
+        faltantes = np.where(exceso < 0)[0]
+        destino = faltantes[np.argmin(dist[faltantes])]
+
+        # Reconstruimos el camino y movemos un punto por cada arista. Los
+        # puntos se eligen antes de mover ninguno (uno por brigada del camino).
+        camino = [destino]
+        while previo[camino[-1]] != -1:
+            camino.append(previo[camino[-1]])
+        movimientos = [(tope(a, b)[1], b) for b, a in zip(camino[:-1], camino[1:])]
+        for i, b in movimientos:
+            grupos[i] = b
+            version[i] += 1
+            for x in range(k):
+                if x != b:
+                    heapq.heappush(heaps[b][x], (costo[i, x] - costo[i, b], i, version[i]))
+        exceso[destino] += 1
+        exceso[camino[-1]] -= 1
+
+    return grupos
+
+
+def _exceso_carga(carga, tolerancia):
+    """Cuánto se sale cada brigada de la banda [1 - tol, 1 + tol] (sumado por dimensión)."""
+    return np.maximum(np.abs(carga - 1.0) - tolerancia, 0.0).sum(axis=-1)
+
+
+def _candidatos_frontera(costo, grupos, k, cupo):
+    """
+    Secciones de frontera: las 'cupo' de cada brigada a las que menos les
+    cuesta irse a otra (diferencia entre su segunda opción y la actual).
+    """
+    n = len(grupos)
+    actual = costo[np.arange(n), grupos]
+    otra = np.where(np.arange(k)[None, :] == grupos[:, None], np.inf, costo).min(axis=1)
+    orden = np.lexsort((otra - actual, grupos))
+    inicio = np.searchsorted(grupos[orden], np.arange(k))
+    rango = np.arange(n) - np.repeat(inicio, np.diff(np.append(inicio, n)))
+    return np.sort(orden[rango < cupo])
+
+
+def asignacion_ponderada(costo, pesos, grupos, tolerancia=0.10, max_iter=None, candidatos=256):
+    """
+    Rebalanceo por CARGA (p. ej. Meta y Manzanas_Obj) en vez de por número de
+    secciones, partiendo de una asignación previa (0..K-1).
+
+    Cada columna de 'pesos' se normaliza para que la meta de cada brigada sea
+    1; el objetivo es que todas queden dentro de 1 ± tolerancia en todas las
+    dimensiones. Búsqueda local con movimientos (un punto a otra brigada) e
+    intercambios (dos puntos entre brigadas), evaluados todos a la vez con
+    NumPy:
+      1) mientras haya exceso: el cambio que más lo reduce (desempate por costo)
+      2) ya dentro de la banda: cambios que bajan el costo sin romperla
+    Los movimientos se evalúan para todas las secciones (N x K); los
+    intercambios solo entre las secciones de frontera de cada brigada
+    (~'candidatos' en total), que es donde un intercambio puede convenir:
+    así cada paso cuesta O(N·K + C²) y no O(N²).
+
+    Si la banda no se alcanza (secciones muy pesadas) devuelve lo más cerca
+    que llegó; quien llama puede medirlo con _exceso_carga.
+    """
+    n, k = costo.shape
+    pesos = np.asarray(pesos, dtype='float64').reshape(n, -1)
+    totales = pesos.sum(axis=0)
+    w = np.divide(pesos * k, totales, out=np.zeros_like(pesos), where=totales > 0)
+    grupos = np.asarray(grupos).copy()
+    filas = np.arange(n)
+    escala = float(np.median(costo)) or 1.0
+    max_iter = max_iter or 20 * n
+    cupo = max(4, candidatos // k)
+
+    carga = np.zeros((k, w.shape[1]))
+    np.add.at(carga, grupos, w)
+    conteo = np.bincount(grupos, minlength=k)
+
+    def mejor_cambio(fase):
+        exc = _exceso_carga(carga, tolerancia)
+        a = grupos
+        costo_actual = costo[filas, a]
+
+        # MOVIMIENTOS i: a -> b
+        d_viol = (_exceso_carga(carga[a] - w, tolerancia)[:, None]
+                  + _exceso_carga(carga[None, :, :] + w[:, None, :], tolerancia)
+                  - exc[a][:, None] - exc[None, :])
+        d_costo = (costo - costo_actual[:, None]) / escala
+        invalido = (a[:, None] == np.arange(k)[None, :]) | (conteo[a] <= 1)[:, None]
+        if fase == 1:
+            puntaje = np.where(invalido | (d_viol >= -1e-9), np.inf, d_viol + 1e-3 * d_costo)
+        else:
+            puntaje = np.where(invalido | (d_viol > 1e-9) | (d_costo >= -1e-9), np.inf, d_costo)
+        i, b = np.unravel_index(np.argmin(puntaje), puntaje.shape)
+        if np.isfinite(puntaje[i, b]):
+            return ('mover', i, b)
+
+        # INTERCAMBIOS i <-> j (brigadas distintas), entre secciones de frontera
+        c = _candidatos_frontera(costo, grupos, k, cupo)
+        a, wc, actual_c = grupos[c], w[c], costo_actual[c]
+        dif = wc[None, :, :] - wc[:, None, :]               # w_j - w_i
+        d_viol = (_exceso_carga(carga[a][:, None, :] + dif, tolerancia)
+                  + _exceso_carga(carga[a][None, :, :] - dif, tolerancia)
+                  - exc[a][:, None] - exc[a][None, :])
+        d_costo = (costo[c[:, None], a[None, :]] + costo[c[None, :], a[:, None]]
+                   - actual_c[:, None] - actual_c[None, :]) / escala
+        invalido = a[:, None] == a[None, :]
+        if fase == 1:
+            puntaje = np.where(invalido | (d_viol >= -1e-9), np.inf, d_viol + 1e-3 * d_costo)
+        else:
+            puntaje = np.where(invalido | (d_viol > 1e-9) | (d_costo >= -1e-9), np.inf, d_costo)
+        i, j = np.unravel_index(np.argmin(puntaje), puntaje.shape)
+        if np.isfinite(puntaje[i, j]):
+            return ('cambiar', c[i], c[j])
+        return None
+
+    def aplicar(cambio):
+        tipo, i, x = cambio
+        if tipo == 'mover':
+            a = grupos[i]
+            carga[a] -= w[i]; carga[x] += w[i]
+            conteo[a] -= 1; conteo[x] += 1
+            grupos[i] = x
+        else:
+            a, b = grupos[i], grupos[x]
+            carga[a] += w[x] - w[i]; carga[b] += w[i] - w[x]
+            grupos[i], grupos[x] = b, a
+
+    for fase in (1, 2):
+        for _ in range(max_iter):
+            if fase == 1 and not _exceso_carga(carga, tolerancia).any():
+                break
+            cambio = mejor_cambio(fase)
+            if cambio is None:
+                break
+            aplicar(cambio)
+    return grupos
+
+
+def _medoides_iniciales(coords, centroids):
+    """Sección más cercana a cada centro de KMeans, sin repetir secciones."""
+    distancias = cdist(centroids, coords)
+    medoides = []
+    for fila in distancias:
+        fila[medoides] = np.inf
+        medoides.append(int(np.argmin(fila)))
+    return np.array(medoides)
+
+
+def _asignacion_por_matriz(matriz, coords, centroids, tamanos, asignar, max_iter=20):
+    """
+    Balanceo con una matriz de costos entre secciones (p. ej. tiempos por red
+    vial): los "centros" pasan a ser secciones (medoides). Se alterna la
+    asignación balanceada con mover cada medoide a la sección de su grupo con
+    menor costo total, hasta que ya no cambian.
+    """
+    medoides = _medoides_iniciales(coords, centroids)
+    for _ in range(max_iter):
+        grupos = asignar(coords, coords[medoides], tamanos, costo=matriz[:, medoides])
+        nuevos = medoides.copy()
+        for g in range(len(medoides)):
+            miembros = np.flatnonzero(grupos == g)
+            if len(miembros):
+                nuevos[g] = miembros[np.argmin(matriz[np.ix_(miembros, miembros)].sum(axis=0))]
+        if np.array_equal(nuevos, medoides):
+            break
+        medoides = nuevos
+    return grupos, coords[medoides], matriz[:, medoides]
+
+
+def _plan_desde_centroides(coords, centroids, tamanos, metodo, matriz, pesos, tolerancia):
+    """Asignación balanceada (y rebalanceo por carga) a partir de unos centros. Grupos 0..K-1."""
+    n_clusters = len(tamanos)
+    asignar = asignacion_transporte if metodo == 'transporte' else asignacion_hungaro
+    with etapa("logic.asignacion", metodo=metodo):
+        if matriz is None:
+            grupos = asignar(coords, centroids, tamanos)
+            costo = cdist(coords, centroids) if pesos is not None else None
+        else:
+            grupos, centroids, costo = _asignacion_por_matriz(matriz, coords, centroids, tamanos, asignar)
+
+    # Rebalanceo por carga (encuestas, manzanas) partiendo del balanceo por conteo
+    if pesos is not None:
+        with etapa("logic.ponderada"):
+            grupos = asignacion_ponderada(costo, pesos, grupos, tolerancia)
+            # Al moverse las secciones, los centros también: un par de vueltas
+            # recalculando centroides afinan el costo sin salir de la banda.
+            if matriz is None:
+                for _ in range(3):
+                    centroids = np.array([coords[grupos == g].mean(axis=0) for g in range(n_clusters)])
+                    previos = grupos
+                    grupos = asignacion_ponderada(cdist(coords, centroids), pesos, grupos, tolerancia)
+                    if np.array_equal(previos, grupos):
+                        break
+    return grupos, centroids
+
+
+def _resolver_asignacion(coords, n_clusters, ids, metodo='auto', matriz=None, pesos=None, tolerancia=0.10,
+                         warm_start=False):
+    """
+    KMeans + asignación balanceada. Devuelve (Grupo_ID 1..K, determinista).
+    Con 'matriz' (N x N) el costo sale de ella y no de la línea recta.
+    Con 'pesos' (N x D) se rebalancea por carga dentro de la tolerancia.
+
+    Por defecto el KMeans es el reproducible (n_init=20, random_state=42).
+    Con 'warm_start', si la solución previa comparte la mayoría de las
+    secciones, un solo KMeans desde sus centroides reemplaza al de 20 inicios;
+    el plan depende entonces de lo que se calculó antes y 'determinista' es False.
+    """
+    n_points = len(coords)
+    if metodo == 'auto':
+        metodo = 'hungaro' if n_points <= _LIMITE_HUNGARO else 'transporte'
+
+    # 3. Definir cuántas secciones le tocan a cada brigada
+    tamanos = tamanos_balanceados(n_points, n_clusters)
+
+    # 4. K-MEANS para encontrar los Centros Ideales: desde la solución previa
+    # si se pidió y se parece lo suficiente; si no, el reproducible
+    ids_set = set(ids)
+    init = None
+    if warm_start:
+        with _CANDADO_ULTIMA:
+            previa = dict(_ULTIMA_SOLUCION)
+        if previa:
+            union = len(ids_set | previa['ids'])
+            if union and len(ids_set & previa['ids']) / union >= _SIMILITUD_MIN_WARM:
+                init = _centroides_iniciales(coords, n_clusters, previa)
+    determinista = init is None
+    if determinista:
+        kmeans = KMeans(n_clusters=n_clusters, n_init=20, random_state=42)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=1)
+    with etapa("logic.kmeans", warm_start=not determinista):
+        kmeans.fit(coords)
+
+    # 5. ASIGNACIÓN BALANCEADA (La Magia de Balanceo)
+    grupos, centroids = _plan_desde_centroides(coords, kmeans.cluster_centers_, tamanos, metodo, matriz, pesos, tolerancia)
+    grupos = grupos + 1
+
+    with _CANDADO_ULTIMA:
+        _ULTIMA_SOLUCION.clear()
+        _ULTIMA_SOLUCION.update({
+            'ids': ids_set,
+            'centroides': centroids,
+            'tamanos': np.bincount(grupos - 1, minlength=n_clusters),
+        })
+    return grupos, determinista
+
+
+def balanced_cluster_optimization(gdf, n_clusters, metodo='auto', costos=None, pesos=None, tolerancia=0.10,
+                                  geometria=None, warm_start=False):
     """
     Algoritmo Híbrido Avanzado (Adaptado para Zacatlán):
     Divide las secciones en 'n_clusters' (brigadas) asegurando que todas
     tengan la misma cantidad de secciones (+/- 1).
+    Las soluciones se memorizan por (secciones, geometría, n_clusters).
+
+    metodo: 'hungaro' (exacto, N chico), 'transporte' (exacto, memoria
+    lineal, para miles de secciones/manzanas) o 'auto'.
+
+    costos: backend opcional con .matriz(coords_utm) -> N x N y .huella
+    (p. ej. src.red_vial.RedVial). Sin él se usa la distancia en línea recta.
+
+    pesos: columnas de carga (p. ej. ['Meta', 'Manzanas_Obj']). Con ellas las
+    brigadas se balancean por carga total (± tolerancia) y no por número de
+    secciones.
+
+    geometria: src.geometria.TablaGeometria ya calculada para estas secciones;
+    con ella no se reproyecta ni se recalculan centroides.
+
+    warm_start: en un fallo de la memoria, parte de los centroides de la
+    última solución del proceso (un KMeans en vez de 20) si comparte la
+    mayoría de las secciones. Es más rápido pero NO determinista: el plan
+    depende de lo que se resolvió antes, así que se devuelve sin guardarse
+    en la memoria compartida (ni en disco). Sin él, el mismo llamado da
+    siempre el mismo plan.
     """
     
     # Validación básica
+    if metodo not in METODOS_ASIGNACION:
+        raise ValueError(f"Método de asignación desconocido: {metodo}. Opciones: {METODOS_ASIGNACION}")
     if n_clusters < 1: n_clusters = 1
+    # Salidas con assign (sin .copy()): con copy-on-write el resultado comparte
+    # columnas y geometrías con la entrada; solo Grupo_ID es nuevo.
     if len(gdf) <= n_clusters:
-        gdf = gdf.copy()
-        gdf['Grupo_ID'] = range(1, len(gdf) + 1)
-        return gdf
+        return gdf.assign(Grupo_ID=np.arange(1, len(gdf) + 1, dtype=np.int32))
 
     # --- MODO EJECUCIÓN (ASIGNACIÓN FIJA) ---
     # Si ya tienes una columna 'Grupo_Fijo' en tu CSV, la respeta.
     if 'Grupo_Fijo' in gdf.columns:
         try:
-            gdf = gdf.copy()
-            gdf['Grupo_ID'] = gdf['Grupo_Fijo'].fillna(0).astype(int)
-            return gdf
+            return gdf.assign(Grupo_ID=gdf['Grupo_Fijo'].fillna(0).astype(np.int32))
         except:
             pass # Si falla, calculamos
 
     # --- MODO PLANEACIÓN (CÁLCULO MATEMÁTICO) ---
     
-    # 1. Proyección temporal a UTM Zona 14N (Metros) para calcular distancias reales
-    # Zacatlán está en la zona 14N, igual que Guerrero, así que EPSG:32614 funciona perfecto.
-    gdf_utm = gdf.to_crs("EPSG:32614")
-    
-    # 2. Obtenemos coordenadas X, Y
-    coords = np.column_stack((gdf_utm.geometry.centroid.x, gdf_utm.geometry.centroid.y))
-    n_points = len(coords)
+    # 0. ¿Ya lo calculamos antes? (mismas secciones, misma geometría, mismas brigadas)
+    ids, clave = _clave_solucion(gdf, n_clusters, metodo, costos, pesos, tolerancia)
+    pesos = tuple(pesos) if pesos else None
+    grupos = _MEMORIA_SOLUCIONES.obtener(clave)
+    if grupos is not None:
+        return gdf.assign(Grupo_ID=grupos)
+    with _calculo_de(clave):
+        grupos = _MEMORIA_SOLUCIONES.obtener(clave, contar_acierto=False, contar_fallo=False)
+        if grupos is None:
+            grupos, determinista = _optimizar(gdf, n_clusters, ids, metodo, costos, pesos, tolerancia, geometria,
+                                              warm_start)
+            if determinista:
+                _MEMORIA_SOLUCIONES.guardar(clave, grupos)
+    return gdf.assign(Grupo_ID=grupos)
 
-    # 3. Definir cuántas secciones le tocan a cada brigada
-    base_size = n_points // n_clusters
-    remainder = n_points % n_clusters
-    
-    # Crear los "huecos" (slots) disponibles.
-    # Ej: Brigada 1, Brigada 1, Brigada 2, Brigada 2...
-    cluster_slots = []
-    for i in range(n_clusters):
-        size = base_size + (1 if i < remainder else 0)
-        cluster_slots.extend([i] * size)
-    
-    # 4. K-MEANS para encontrar los Centros Ideales
-    # Primero buscamos dónde están los centros de gravedad geográficos
-    kmeans = KMeans(n_clusters=n_clusters, n_init=20, random_state=42)
-    kmeans.fit(coords)
-    centroids = kmeans.cluster_centers_
 
-    # 5. ASIGNACIÓN LINEAL (La Magia de Balanceo)
-    # Calculamos la distancia de TODAS las secciones a TODOS los centroides
-    target_coords = centroids[cluster_slots]
-    cost_matrix = cdist(coords, target_coords)
-    
-    # El algoritmo húngaro asigna cada sección al mejor hueco disponible
-    # minimizando la distancia total recorrida.
-    row_ind, col_ind = linear_sum_assignment(cost_matrix)
+@contextmanager
+def _calculo_de(clave):
+    """Candado de una llave (se crea al pedirlo y se borra cuando nadie lo usa)."""
+    with _CANDADO_CLAVES:
+        entrada = _CANDADOS_CLAVE.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            yield
+    finally:
+        with _CANDADO_CLAVES:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del _CANDADOS_CLAVE[clave]
 
-    # Recuperamos el ID de la brigada original
-    assigned_supervisors = [cluster_slots[c] + 1 for c in col_ind]
-    final_assignment = pd.Series(data=assigned_supervisors, index=row_ind).sort_index()
-    
-    # 6. Guardamos el resultado
-    gdf_out = gdf.copy()
-    gdf_out['Grupo_ID'] = final_assignment.values
-    
-    return gdf_out
\ No newline at end of file
+
+def _clave_solucion(gdf, n_clusters, metodo, costos, pesos, tolerancia):
+    """(ids, llave de la memoria de soluciones)."""
+    ids = tuple(gdf['seccion'].tolist()) if 'seccion' in gdf.columns else tuple(gdf.index.tolist())
+    pesos = tuple(pesos) if pesos else None
+    clave = (ids, huella_geometria(gdf), n_clusters, metodo, getattr(costos, 'huella', None),
+             pesos, tolerancia if pesos else None)
+    return ids, clave
+
+
+def _coords_utm(gdf, ids, geometria=None):
+    """
+    Centroides en UTM Zona 14N (metros): de la tabla de geometría si la hay;
+    si no, proyección temporal. Zacatlán está en la zona 14N, igual que
+    Guerrero, así que EPSG:32614 funciona perfecto.
+    """
+    coords = geometria.centroides_utm(ids) if geometria is not None else None
+    if coords is None:
+        with etapa("logic.proyeccion"):
+            centroides = gdf.geometry.to_crs("EPSG:32614").centroid
+            coords = np.column_stack((centroides.x, centroides.y))
+    return coords
+
+
+def _optimizar(gdf, n_clusters, ids, metodo, costos, pesos, tolerancia, geometria=None, warm_start=False):
+    """Cálculo completo (sin memoria): (Grupo_ID por sección, determinista)."""
+    # 1-2. Coordenadas en metros
+    coords = _coords_utm(gdf, ids, geometria)
+
+    # 3-5. Balanceo (KMeans + asignación lineal), en metros o en tiempos de red
+    matriz = None
+    if costos is not None:
+        with etapa("logic.matriz_red"):
+            matriz = costos.matriz(coords)
+    matriz_pesos = gdf[list(pesos)].to_numpy(dtype='float64', na_value=0.0) if pesos else None
+    # 6. Grupo_ID (1..K) por sección
+    grupos, determinista = _resolver_asignacion(coords, n_clusters, ids, metodo, matriz, matriz_pesos, tolerancia,
+                                                warm_start)
+    return grupos.astype(np.int32), determinista
+
+
+def solucion_en_memoria(gdf, n_clusters, metodo='auto', costos=None, pesos=None, tolerancia=0.10):
+    """
+    La asignación si ya está calculada (memoria o disco), sin optimizar; None
+    si habría que calcularla. Los casos triviales (pocas secciones, Grupo_Fijo)
+    se resuelven al momento.
+    """
+    if len(gdf) <= max(n_clusters, 1) or 'Grupo_Fijo' in gdf.columns:
+        return balanced_cluster_optimization(gdf, n_clusters, metodo, costos, pesos, tolerancia)
+    _, clave = _clave_solucion(gdf, n_clusters, metodo, costos, pesos, tolerancia)
+    grupos = _MEMORIA_SOLUCIONES.obtener(clave, contar_fallo=False)
+    return None if grupos is None else gdf.assign(Grupo_ID=grupos)
+
+
+def asignacion_rapida(gdf, n_clusters, pesos=None, geometria=None):
+    """
+    Plan preliminar en O(N log N) mientras llega el óptimo: barrido angular
+    alrededor del centro de las secciones, cortado en tramos contiguos del
+    mismo tamaño (o de la misma carga si hay 'pesos').
+    """
+    n_clusters = max(1, min(n_clusters, len(gdf)))
+    ids = tuple(gdf['seccion'].tolist()) if 'seccion' in gdf.columns else tuple(gdf.index.tolist())
+    coords = _coords_utm(gdf, ids, geometria)
+    rel = coords - coords.mean(axis=0)
+    orden = np.argsort(np.arctan2(rel[:, 1], rel[:, 0]), kind='stable')
+
+    if pesos:
+        carga = gdf[list(pesos)].to_numpy(dtype='float64', na_value=0.0)
+        totales = carga.sum(axis=0)
+        carga = (carga / np.where(totales > 0, totales, 1)).sum(axis=1)[orden]
+        acumulada = np.cumsum(carga) - carga / 2
+        tramo = np.minimum((acumulada / max(acumulada[-1] + carga[-1] / 2, 1e-12) * n_clusters).astype(int),
+                           n_clusters - 1)
+    else:
+        tramo = np.repeat(np.arange(n_clusters), tamanos_balanceados(len(gdf), n_clusters))
+
+    grupos = np.empty(len(gdf), dtype=np.int32)
+    grupos[orden] = tramo + 1
+    return gdf.assign(Grupo_ID=grupos)
+
+
+def estadisticas_memoria():
+    """Aciertos (memoria / disco), fallos y tamaño de la memoria de soluciones."""
+    return _MEMORIA_SOLUCIONES.estadisticas()
+
+
+def precalentar(gdf, valores, **parametros):
+    """
+    Calcula en un hilo de fondo las soluciones para cada n_clusters de
+    'valores' (p. ej. todo el rango del slider); las sesiones las encuentran
+    ya hechas en la memoria compartida. Devuelve el hilo.
+    """
+    def _tarea():
+        for n in valores:
+            try:
+                balanced_cluster_optimization(gdf, n, **parametros)
+            except Exception as e:
+                print(f"Precalentado n={n} falló: {e}")
+
+    hilo = threading.Thread(target=_tarea, name="precalentar-soluciones", daemon=True)
+    hilo.start()
+    return hilo
\ No newline at end of file
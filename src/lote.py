@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import unicodedata
+from contextlib import contextmanager
+import pandas as pd
+import geopandas as gpd
+from src.extraccion import extraer_manzanas_streaming, filtro_por_campo, buscar_campo, TAM_BLOQUE
+from src.esquema import ESQUEMA_MUESTRA, leer_csv
+
+# ==============================================================================
+# PROCESAMIENTO POR LOTE (varios municipios por ola de levantamiento)
+# ==============================================================================
+# El proceso principal lee las secciones estatales UNA vez (filtradas a los
+# municipios pedidos) y reparte el trabajo por municipio a un pool de
+# procesos. Las manzanas no se cargan completas: cada proceso lee su ventana
+# del shapefile estatal apoyado en su índice espacial (.qix).
+
+DIR_LOTE = "data/lote"
+CAMPOS_MUNICIPIO = ("MUNICIPIO", "CVE_MUN", "MUN")
+COLUMNAS_MUESTRA = ('seccion', 'encuestas_totales', 'lista_nom')
+# La muestra de una ola puede traer varios municipios (columna clave_mun)
+ESQUEMA_MUESTRA_LOTE = ESQUEMA_MUESTRA + (('clave_mun', ('clave_mun',), 'int32', False),)
+
+
+@contextmanager
+def cronometro(tiempos, etapa):
+    """Acumula en tiempos[etapa] los segundos del bloque."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[etapa] = tiempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+def _slug(texto):
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+
+def leer_definiciones(ruta):
+    """
+    Municipios a procesar desde un CSV o JSON con 'clave' y, opcionalmente,
+    'nombre' y 'muestra' (CSV de la muestra de ese municipio).
+    """
+    if ruta.lower().endswith('.json'):
+        with open(ruta, encoding='utf-8') as f:
+            registros = json.load(f)
+    else:
+        registros = pd.read_csv(ruta, dtype=str).to_dict('records')
+    return [normalizar_definicion(r) for r in registros]
+
+
+def normalizar_definicion(d, muestra_default=None):
+    clave = int(d['clave'])
+    nombre = d.get('nombre') or f"MUN_{clave:03d}"
+    muestra = d.get('muestra') or muestra_default
+    if not muestra:
+        raise ValueError(f"❌ El municipio {clave} no tiene CSV de muestra.")
+    return {'clave': clave, 'nombre': str(nombre), 'muestra': muestra}
+
+
+def dir_municipio(definicion, dir_lote=DIR_LOTE):
+    return os.path.join(dir_lote, f"{definicion['clave']:03d}_{_slug(definicion['nombre'])}")
+
+
+def leer_muestra(ruta, clave):
+    """
+    Columnas COLUMNAS_MUESTRA de la muestra (nombres y tipos de src.esquema);
+    si el CSV trae varios municipios, solo las filas de 'clave'.
+    """
+    df = leer_csv(ruta, ESQUEMA_MUESTRA_LOTE, columnas=COLUMNAS_MUESTRA + ('clave_mun',))
+    if 'clave_mun' in df.columns:
+        df = df[df['clave_mun'] == clave].drop(columns='clave_mun')
+    return df
+
+
+def leer_secciones_estatales(ruta_secciones, claves):
+    """
+    Lectura única de las secciones estatales: filtra por municipio en GDAL si
+    el shapefile trae el campo. Devuelve (gdf, col_seccion, col_municipio).
+    """
+    col_mun, _ = buscar_campo(ruta_secciones, CAMPOS_MUNICIPIO)
+    where = filtro_por_campo(ruta_secciones, CAMPOS_MUNICIPIO, list(claves))
+
+    gdf = gpd.read_file(ruta_secciones, where=where)
+    col_seccion = next((c for c in gdf.columns if c.upper() == "SECCION"), None) \
+        or next((c for c in gdf.columns if "SECCION" in c.upper()), None)
+    if not col_seccion:
+        raise ValueError(f"❌ No encontré la columna SECCION. Columnas disponibles: {list(gdf.columns)}")
+    gdf[col_seccion] = gdf[col_seccion].astype(int)
+    return gdf, col_seccion, col_mun
+
+
+def procesar_municipio(definicion, gdf_secciones, col_seccion, ruta_manzanas,
+                       dir_lote=DIR_LOTE, tam_bloque=TAM_BLOQUE):
+    """
+    Filtro de secciones, masking de manzanas y sjoin de UN municipio.
+    Pensada para correr en un proceso del pool: recibe sus secciones ya
+    recortadas y devuelve conteos y tiempos por etapa.
+    """
+    tiempos = {}
+    salida = dir_municipio(definicion, dir_lote)
+    os.makedirs(salida, exist_ok=True)
+
+    with cronometro(tiempos, 'muestra'):
+        df_muestra = leer_muestra(definicion['muestra'], definicion['clave'])
+        secciones_target = df_muestra['seccion'].unique()
+
+    with cronometro(tiempos, 'secciones'):
+        gdf_secc = gdf_secciones[gdf_secciones[col_seccion].isin(secciones_target)]
+        gdf_secc = gdf_secc.to_crs("EPSG:4326").rename(columns={col_seccion: 'SECCION'})
+        gdf_secc = gdf_secc.merge(
+            df_muestra.drop_duplicates('seccion'), left_on='SECCION', right_on='seccion', how='left'
+        )
+
+    with cronometro(tiempos, 'manzanas'):
+        if gdf_secc.empty:
+            total_manz = 0
+        else:
+            where = filtro_por_campo(ruta_manzanas, CAMPOS_MUNICIPIO, definicion['clave'])
+            total_manz = extraer_manzanas_streaming(
+                ruta_manzanas, gdf_secc, 'SECCION', os.path.join(salida, "manzanas_opt.geojson"),
+                where=where, tam_bloque=tam_bloque
+            )
+
+    with cronometro(tiempos, 'guardar'):
+        gdf_secc.to_file(os.path.join(salida, "secciones_opt.geojson"), driver="GeoJSON")
+
+    return {
+        'clave': definicion['clave'],
+        'nombre': definicion['nombre'],
+        'salida': salida,
+        'secciones_muestra': int(len(secciones_target)),
+        'secciones': int(len(gdf_secc)),
+        'manzanas': int(total_manz),
+        'tiempos': {k: round(v, 3) for k, v in tiempos.items()},
+    }
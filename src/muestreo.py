@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import shapely
+
+# ==============================================================================
+# SELECCIÓN DE MANZANAS EN MUESTRA (aleatoria estratificada por sección)
+# ==============================================================================
+# 'manzanas_meta' dice cuántas manzanas levantar por sección; aquí se eligen.
+# Todas las secciones se sortean a la vez: cada manzana recibe una llave
+# aleatoria y se quedan las k llaves más altas de cada sección (ordenando una
+# sola vez por sección + llave). Con PPS la llave es u^(1/peso)
+# (Efraimidis-Spirakis): muestreo sin reemplazo proporcional al tamaño.
+
+SEMILLA_DEFAULT = 2024
+
+
+def _uniformes(claves_manzana, semilla):
+    """
+    Uniforme (0, 1) estable por manzana: sale de un hash de su clave y la
+    semilla, no del orden de las filas. Filtrar o reordenar la capa no cambia
+    el sorteo de las manzanas que siguen ahí.
+    """
+    h = pd.util.hash_array(np.asarray(claves_manzana, dtype=object), hash_key=f"{int(semilla):016d}"[-16:])
+    return ((h >> np.uint64(11)).astype('float64') + 0.5) / 2 ** 53
+
+
+def claves_geometria(geometrias):
+    """Clave por manzana a partir de su geometría (WKB), para capas sin ID único."""
+    return shapely.to_wkb(np.asarray(geometrias))
+
+
+def seleccionar_manzanas(secciones_por_manzana, metas, claves_manzana, pesos=None, semilla=SEMILLA_DEFAULT):
+    """
+    secciones_por_manzana: sección de cada manzana (array, una por fila)
+    metas: Serie seccion -> número de manzanas a elegir
+    claves_manzana: identificador estable de cada manzana (ver claves_geometria)
+    pesos: medida de tamaño para PPS (p. ej. área); None = igual probabilidad
+
+    Devuelve un DataFrame (una fila por manzana elegida) con 'posicion' (iloc
+    en la capa), 'seccion', 'Orden_Sorteo' (1..k dentro de la sección) y
+    'Prob_Inclusion' (aproximada en PPS).
+    """
+    secc = np.asarray(secciones_por_manzana, dtype=np.int64)
+    u = _uniformes(claves_manzana, semilla)
+    k = metas.reindex(secc).fillna(0).to_numpy(dtype=np.int64)
+
+    if pesos is None:
+        llave = np.log(u)
+    else:
+        w = np.asarray(pesos, dtype='float64')
+        w = np.where(np.isfinite(w) & (w > 0), w, 0.0)
+        with np.errstate(divide='ignore'):
+            llave = np.where(w > 0, np.log(u) / w, -np.inf)
+
+    # Orden por sección y llave descendente; rango dentro de cada sección
+    orden = np.lexsort((-llave, secc))
+    secc_ord = secc[orden]
+    inicio = np.r_[True, secc_ord[1:] != secc_ord[:-1]]
+    arranque = np.maximum.accumulate(np.where(inicio, np.arange(len(orden)), 0))
+    rango = np.arange(len(orden)) - arranque
+    elegido = (rango < k[orden]) & np.isfinite(llave[orden])
+
+    posiciones = orden[elegido]
+    n_secc = pd.Series(secc).map(pd.Series(secc).value_counts()).to_numpy()
+    if pesos is None:
+        prob = np.minimum(1.0, k / n_secc)
+    else:
+        total_w = pd.Series(w).groupby(secc).transform('sum').to_numpy()
+        prob = np.minimum(1.0, np.divide(k * w, total_w, out=np.zeros_like(w), where=total_w > 0))
+
+    return pd.DataFrame({
+        'posicion': posiciones,
+        'seccion': secc[posiciones],
+        'Orden_Sorteo': rango[elegido] + 1,
+        'Prob_Inclusion': prob[posiciones].round(4),
+    })
+
+
+def resumen_seleccion(seleccion, metas, secciones_por_manzana):
+    """Por sección: meta, manzanas disponibles, elegidas y faltantes."""
+    disponibles = pd.Series(np.asarray(secciones_por_manzana)).value_counts()
+    elegidas = seleccion['seccion'].value_counts()
+    df = pd.DataFrame({'Meta_Manzanas': metas})
+    df['Disponibles'] = disponibles.reindex(df.index).fillna(0).astype(int)
+    df['Elegidas'] = elegidas.reindex(df.index).fillna(0).astype(int)
+    df['Faltantes'] = df['Meta_Manzanas'] - df['Elegidas']
+    df.index.name = 'seccion'
+    return df.reset_index()
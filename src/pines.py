@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import folium
+
+# ==============================================================================
+# PINES DE LOCALIDADES (capa única, sin ciclo por renglón)
+# ==============================================================================
+
+JITTER_GRADOS = 0.0015
+FUENTE_EXACTA = "📍 Exacta"
+FUENTE_ESTIMADA = "📐 Estimada"
+ICONOS = {
+    FUENTE_EXACTA: {'markerColor': 'green', 'icon': 'pushpin'},
+    FUENTE_ESTIMADA: {'markerColor': 'red', 'icon': 'info-sign'},
+}
+
+
+def _jitter(df, escala):
+    """
+    Desplazamiento pseudoaleatorio estable por (sección, localidad): el mismo
+    pin cae en el mismo lugar aunque se filtre por brigada.
+    """
+    h = pd.util.hash_pandas_object(df[['seccion', 'Localidad']], index=False).to_numpy()
+    u_lat = (h & 0xFFFFFFFF) / 2 ** 32
+    u_lon = (h >> 32) / 2 ** 32
+    return (u_lat * 2 - 1) * escala, (u_lon * 2 - 1) * escala
+
+
+def construir_pines(df_pines, centroides, escala=JITTER_GRADOS, columnas_extra=()):
+    """
+    GeoDataFrame de puntos: coordenada exacta del catálogo si existe; si no,
+    centroide de la sección más un jitter. Todo con operaciones de columna.
+    'columnas_extra' se copian tal cual (p. ej. Encuestas).
+    """
+    df = df_pines[['seccion', 'Localidad', *columnas_extra]].reset_index(drop=True)
+    n = len(df)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+
+    if 'CAT_LAT' in df_pines.columns:
+        cat_lat = df_pines['CAT_LAT'].to_numpy(dtype='float64', na_value=np.nan)
+        cat_lon = df_pines['CAT_LON'].to_numpy(dtype='float64', na_value=np.nan)
+        exacta = ~np.isnan(cat_lat) & (cat_lat != 0)
+        lat[exacta] = cat_lat[exacta]
+        lon[exacta] = cat_lon[exacta]
+    else:
+        exacta = np.zeros(n, dtype=bool)
+
+    # PINES ESTIMADOS: búsqueda vectorizada en el índice sección -> centroide
+    base = centroides.reindex(df['seccion'].to_numpy())
+    d_lat, d_lon = _jitter(df, escala)
+    estimada = ~exacta
+    lat[estimada] = base['lat'].to_numpy()[estimada] + d_lat[estimada]
+    lon[estimada] = base['lon'].to_numpy()[estimada] + d_lon[estimada]
+
+    df['Fuente'] = pd.Categorical.from_codes(np.where(exacta, 0, 1), categories=[FUENTE_EXACTA, FUENTE_ESTIMADA])
+    validos = ~np.isnan(lat)
+    return gpd.GeoDataFrame(
+        df[validos],
+        geometry=gpd.points_from_xy(lon[validos], lat[validos]),
+        crs="EPSG:4326"
+    )
+
+
+def _feature_collection(gdf_pines):
+    """
+    FeatureCollection armada directo desde las columnas. El __geo_interface__
+    de geopandas recorre fila por fila y folium lo invoca dos veces.
+    """
+    x = gdf_pines.geometry.x.round(6).tolist()
+    y = gdf_pines.geometry.y.round(6).tolist()
+    features = [
+        {'type': 'Feature',
+         'properties': {'Localidad': loc, 'seccion': sec, 'Fuente': fuente},
+         'geometry': {'type': 'Point', 'coordinates': [lon, lat]}}
+        for loc, sec, fuente, lon, lat in zip(
+            gdf_pines['Localidad'].astype(str).tolist(),
+            gdf_pines['seccion'].astype(int).tolist(),
+            gdf_pines['Fuente'].tolist(), x, y)
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def capa_pines(gdf_pines, name="📍 Pines Localidades", show=True):
+    """
+    Una sola capa (FeatureGroup) con todos los pines: un GeoJSON por tipo de
+    fuente con su icono fijo, así folium no evalúa estilos pin por pin.
+    """
+    capa = folium.FeatureGroup(name=name, show=show)
+    for fuente, icono in ICONOS.items():
+        subset = gdf_pines[gdf_pines['Fuente'] == fuente]
+        if subset.empty:
+            continue
+        folium.GeoJson(
+            _feature_collection(subset),
+            control=False,
+            marker=folium.Marker(icon=folium.Icon(color=icono['markerColor'], icon=icono['icon'], prefix='glyphicon')),
+            tooltip=folium.GeoJsonTooltip(fields=['Localidad', 'seccion', 'Fuente'], aliases=['', 'Sección', ''], localize=True),
+        ).add_to(capa)
+    return capa
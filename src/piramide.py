@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+import shapely
+import geopandas as gpd
+
+# ==============================================================================
+# PIRÁMIDE DE SIMPLIFICACIÓN POR ZOOM
+# ==============================================================================
+# Cada capa (secciones, contexto, manzanas) se guarda en varios niveles de
+# detalle. El nivel se elige por el zoom del mapa: a zoom 12 no tiene caso
+# mandar al navegador vértices separados por menos de medio pixel.
+
+DIR_PIRAMIDE = "data/piramide"
+
+# zoom del nivel -> decimales de coordenadas (1e-4 ~ 11 m, 1e-5 ~ 1.1 m, 1e-6 ~ 0.1 m)
+NIVELES = {10: 4, 12: 5, 14: 6}
+
+
+def tolerancia_para_zoom(z):
+    """Medio pixel (en grados) a ese zoom: simplificar más fino es invisible."""
+    return 360.0 / (256 * 2 ** z) / 2
+
+
+def nivel_para_zoom(zoom):
+    """Nivel más detallado que no excede el zoom pedido (o el más burdo)."""
+    candidatos = [z for z in NIVELES if z <= zoom]
+    return max(candidatos) if candidatos else min(NIVELES)
+
+
+def simplificar_cobertura(geoms, tolerancia):
+    """
+    Simplificación que respeta la topología entre vecinos (bordes compartidos
+    se simplifican igual, sin huecos ni traslapes). Si la capa no es una
+    cobertura válida se cae a simplificar cada polígono por separado.
+    """
+    geoms = np.asarray(geoms)
+    try:
+        if shapely.coverage_is_valid(geoms):
+            return shapely.coverage_simplify(geoms, tolerancia)
+    except Exception:
+        pass
+    return shapely.simplify(geoms, tolerancia, preserve_topology=True)
+
+
+def simplificar_nivel(gdf, zoom):
+    """Copia del GeoDataFrame con la geometría del nivel correspondiente al zoom."""
+    z = nivel_para_zoom(zoom)
+    geoms = simplificar_cobertura(gdf.geometry.values, tolerancia_para_zoom(z))
+    geoms = shapely.set_precision(geoms, 10.0 ** -NIVELES[z])
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+
+
+def ruta_nivel(capa, z, dir_piramide=DIR_PIRAMIDE):
+    return os.path.join(dir_piramide, f"{capa}_z{z}.geojson")
+
+
+def construir_piramide(gdf, capa, dir_salida=DIR_PIRAMIDE):
+    """Escribe {capa}_z{zoom}.geojson para cada nivel, con precisión reducida."""
+    os.makedirs(dir_salida, exist_ok=True)
+    gdf = gdf.to_crs("EPSG:4326")
+    rutas = []
+    for z, decimales in NIVELES.items():
+        nivel = simplificar_nivel(gdf, z)
+        ruta = ruta_nivel(capa, z, dir_salida)
+        nivel.to_file(ruta, driver="GeoJSON", layer_options={'COORDINATE_PRECISION': decimales})
+        rutas.append(ruta)
+    return rutas
+
+
+def cargar_nivel(capa, zoom, dir_piramide=DIR_PIRAMIDE):
+    """Nivel pre-generado para ese zoom, o None si la pirámide no existe."""
+    ruta = ruta_nivel(capa, nivel_para_zoom(zoom), dir_piramide)
+    if not os.path.exists(ruta):
+        return None
+    return gpd.read_file(ruta)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+import threading
+import numpy as np
+import shapely
+import pyogrio
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, connected_components
+from scipy.spatial import cKDTree
+from src.artefactos import DIR_CACHE, huella_archivos
+
+# ==============================================================================
+# COSTO POR RED VIAL (tiempo de traslado en vez de línea recta)
+# ==============================================================================
+# En la Sierra Norte la distancia en línea recta dice poco: dos secciones
+# "cercanas" pueden estar a una hora por carretera. La red (un extracto de
+# OSM, GeoPackage o Shapefile de líneas) se convierte en un grafo CSR de
+# tiempos en segundos; las matrices entre puntos salen de Dijkstra
+# multi-origen y se guardan en disco para no recalcular árboles.
+
+# Archivos de red que se buscan si no se indica uno
+RUTAS_RED_VIAL = ["data/raw/red_vial.gpkg", "data/raw/red_vial.osm.pbf", "data/raw/red_vial/red_vial.shp"]
+DIR_MATRICES = os.path.join(DIR_CACHE, "red_vial")
+
+# km/h por tipo de camino (etiqueta 'highway' de OSM); el resto usa VEL_DEFAULT
+VELOCIDADES = {
+    'motorway': 90, 'trunk': 70, 'primary': 60, 'secondary': 50, 'tertiary': 40,
+    'unclassified': 30, 'residential': 25, 'living_street': 15, 'service': 15,
+    'track': 15, 'path': 5, 'footway': 5, 'steps': 3,
+}
+VEL_DEFAULT = 30
+VEL_ACCESO = 5        # km/h del punto al nodo más cercano de la red (a pie)
+PRECISION_NODO = 1    # decimales en metros al unir vértices en un mismo nodo
+ORIGENES_POR_LOTE = 32  # árboles de Dijkstra completos en memoria a la vez
+MAX_MATRICES = 64       # matrices en disco; al pasarse se borran las menos usadas
+
+
+def buscar_red_vial(rutas=RUTAS_RED_VIAL):
+    """Primer archivo de red que exista, o None."""
+    return next((r for r in rutas if os.path.exists(r)), None)
+
+
+def _a_numero(serie):
+    """'60', '60 km/h' -> 60.0 ; lo demás -> NaN."""
+    return serie.astype(str).str.extract(r"(\d+(?:\.\d+)?)")[0].astype('float64').to_numpy()
+
+
+def _leer_lineas(ruta):
+    """Líneas de la red en EPSG:32614 y la velocidad (km/h) de cada una."""
+    es_osm = ruta.lower().endswith(('.pbf', '.osm'))
+    opciones = {'layer': 'lines', 'where': "highway IS NOT NULL"} if es_osm else {}
+    gdf = pyogrio.read_dataframe(ruta, **opciones)
+    gdf = gdf[gdf.geometry.notna()].to_crs("EPSG:32614")
+
+    col_tipo = next((c for c in gdf.columns if c.lower() in ('highway', 'tipo', 'tipo_vial', 'fclass')), None)
+    if col_tipo:
+        velocidad = gdf[col_tipo].astype(str).str.lower().map(VELOCIDADES).fillna(VEL_DEFAULT)
+    else:
+        velocidad = np.full(len(gdf), VEL_DEFAULT)
+    col_vel = next((c for c in gdf.columns if c.lower() in ('maxspeed', 'velocidad')), None)
+    if col_vel:
+        declarada = _a_numero(gdf[col_vel])
+        velocidad = np.where(np.nan_to_num(declarada) > 0, declarada, velocidad)
+    return gdf.geometry.values, np.asarray(velocidad, dtype='float64')
+
+
+def construir_grafo(lineas, velocidades):
+    """
+    Grafo no dirigido en CSR. Cada vértice de cada línea es un nodo (en OSM
+    los cruces son vértices compartidos); el peso es el tiempo en segundos.
+    Devuelve (nodos_xy float64 [n, 2], csr float32).
+    """
+    xy, linea = shapely.get_coordinates(lineas, return_index=True)
+    clave = np.round(xy, PRECISION_NODO)
+    nodos_xy, nodo = np.unique(clave, axis=0, return_inverse=True)
+    nodo = nodo.ravel()
+
+    consecutivo = linea[1:] == linea[:-1]
+    u, v = nodo[:-1][consecutivo], nodo[1:][consecutivo]
+    largo = np.hypot(*(xy[1:][consecutivo] - xy[:-1][consecutivo]).T)
+    tiempo = largo / (velocidades[linea[1:][consecutivo]] / 3.6)
+
+    # Ambos sentidos; aristas repetidas se quedan con el menor tiempo
+    u, v = np.concatenate([u, v]), np.concatenate([v, u])
+    tiempo = np.concatenate([tiempo, tiempo])
+    valido = u != v
+    u, v, tiempo = u[valido], v[valido], tiempo[valido]
+    orden = np.lexsort((tiempo, v, u))
+    u, v, tiempo = u[orden], v[orden], tiempo[orden]
+    primero = np.ones(len(u), dtype=bool)
+    primero[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    u, v, tiempo = u[primero], v[primero], tiempo[primero]
+
+    n = len(nodos_xy)
+    grafo = csr_matrix((tiempo.astype(np.float32), (u.astype(np.int32), v.astype(np.int32))), shape=(n, n))
+    return nodos_xy, grafo
+
+
+def _recortar_matrices(dir_cache, maximo):
+    """Deja en disco las 'maximo' matrices usadas más recientemente (mtime)."""
+    try:
+        archivos = [os.path.join(dir_cache, f) for f in os.listdir(dir_cache)
+                    if f.startswith("matriz-") and f.endswith(".npy") and ".tmp" not in f]
+        if len(archivos) > maximo:
+            for viejo in sorted(archivos, key=os.path.getmtime)[:len(archivos) - maximo]:
+                os.remove(viejo)
+    except OSError as e:
+        print(f"Aviso caché de matrices: {e}")
+
+
+class RedVial:
+    """
+    Backend de costos para el balanceo: matriz(coords_utm) -> segundos.
+    'huella' identifica la red (entra en las llaves de caché).
+    """
+
+    def __init__(self, nodos_xy, grafo, huella):
+        self.nodos_xy = nodos_xy
+        self.grafo = grafo
+        self.huella = huella
+        # Solo se conecta a la componente principal (evita tramos aislados)
+        _, etiqueta = connected_components(grafo, directed=False)
+        principal = np.bincount(etiqueta).argmax()
+        self._nodos_principales = np.flatnonzero(etiqueta == principal)
+        self._arbol = cKDTree(nodos_xy[self._nodos_principales])
+
+    @classmethod
+    def desde_archivo(cls, ruta, dir_cache=DIR_MATRICES):
+        """Grafo CSR desde el archivo de red, o desde su copia compacta en disco."""
+        huella = huella_archivos([ruta], extra="red_vial-1")
+        ruta_npz = os.path.join(dir_cache, f"grafo-{huella}.npz")
+        if os.path.exists(ruta_npz):
+            d = np.load(ruta_npz)
+            n = len(d['nodos_xy'])
+            grafo = csr_matrix((d['datos'], d['indices'], d['indptr']), shape=(n, n))
+            return cls(d['nodos_xy'], grafo, huella)
+
+        nodos_xy, grafo = construir_grafo(*_leer_lineas(ruta))
+        os.makedirs(dir_cache, exist_ok=True)
+        tmp = f"{ruta_npz}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, nodos_xy=nodos_xy, datos=grafo.data, indices=grafo.indices, indptr=grafo.indptr)
+        os.replace(tmp, ruta_npz)
+        return cls(nodos_xy, grafo, huella)
+
+    def __len__(self):
+        return self.grafo.shape[0]
+
+    def anclar(self, coords):
+        """Nodo de red más cercano a cada punto y segundos de acceso a pie."""
+        dist, pos = self._arbol.query(np.asarray(coords, dtype='float64'))
+        return self._nodos_principales[pos], dist / (VEL_ACCESO / 3.6)
+
+    def tiempos_desde(self, origenes, destinos=None, por_lote=ORIGENES_POR_LOTE):
+        """
+        Dijkstra multi-origen en segundos: [len(origenes), len(destinos)]
+        (o [len(origenes), n_nodos] sin destinos). Corre por lotes de orígenes
+        y de cada árbol guarda solo las columnas de destino, así la memoria
+        es O(lote x n_nodos + orígenes x destinos) y no O(orígenes x n_nodos).
+        """
+        origenes = np.asarray(origenes)
+        if destinos is None:
+            return dijkstra(self.grafo, directed=False, indices=origenes)
+        destinos = np.asarray(destinos)
+        salida = np.empty((len(origenes), len(destinos)), dtype=np.float32)
+        for inicio in range(0, len(origenes), por_lote):
+            arboles = dijkstra(self.grafo, directed=False, indices=origenes[inicio:inicio + por_lote])
+            salida[inicio:inicio + por_lote] = arboles[:, destinos]
+        return salida
+
+    def matriz(self, coords, dir_cache=DIR_MATRICES, maximo_disco=MAX_MATRICES):
+        """
+        Tiempo de traslado (s) entre todos los puntos (N x N). Se guarda en
+        disco por (red, nodos de anclaje): otro plan con los mismos puntos no
+        recalcula ningún árbol de Dijkstra. Se conservan 'maximo_disco'
+        matrices; al pasarse se borran las de uso más antiguo.
+        """
+        nodos, acceso = self.anclar(coords)
+        llave = hashlib.sha1(nodos.astype(np.int64).tobytes()).hexdigest()[:16]
+        ruta = os.path.join(dir_cache, f"matriz-{self.huella}-{llave}.npy")
+        try:
+            entre_nodos = np.load(ruta)
+            os.utime(ruta)
+        except OSError:
+            # No está (o la borró el recorte de otro hilo): se calcula
+            entre_nodos = None
+        if entre_nodos is None:
+            unicos, inversa = np.unique(nodos, return_inverse=True)
+            entre_nodos = self.tiempos_desde(unicos, destinos=unicos)[inversa][:, inversa]
+            os.makedirs(dir_cache, exist_ok=True)
+            tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(tmp, entre_nodos)
+            os.replace(tmp, ruta)
+            _recortar_matrices(dir_cache, maximo_disco)
+        costo = entre_nodos.astype('float64') + acceso[:, None] + acceso[None, :]
+        np.fill_diagonal(costo, 0.0)
+        return costo
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial.distance import cdist
+
+# ==============================================================================
+# SECUENCIA DE VISITA POR BRIGADA (TSP heurístico)
+# ==============================================================================
+# El clustering decide QUÉ visita cada brigada; aquí se decide EN QUÉ ORDEN.
+# Ruta abierta (sin regreso) sobre coordenadas UTM: vecino más cercano como
+# arranque y luego 2-opt / Or-opt hasta que ya no haya mejora. Rutas cortas:
+# todos los pares a la vez con matrices de NumPy. Rutas largas: cada parada
+# solo se prueba contra sus VECINOS más cercanos, con una cola de paradas
+# "activas" (don't-look bits): tras un cambio solo se revisan las paradas
+# que tocó, así cada movimiento cuesta O(vecinos) y no O(N²).
+
+MAX_MOVIMIENTOS_POR_PARADA = 50
+LIMITE_DENSO = 200
+VECINOS = 16
+TOLERANCIA = 1e-9
+
+
+def matriz_euclidiana(coords):
+    """Distancias en línea recta (metros si las coordenadas son UTM)."""
+    return cdist(coords, coords)
+
+
+def _con_ficticio(D):
+    """
+    Agrega un nodo ficticio a distancia 0 de todos: una ruta abierta óptima
+    equivale a un ciclo óptimo que pasa por él (así no se fija el inicio).
+    """
+    n = len(D)
+    Dp = np.zeros((n + 1, n + 1))
+    Dp[:n, :n] = D
+    return Dp
+
+
+def vecino_mas_cercano(D, inicio=0):
+    n = len(D)
+    orden = np.empty(n, dtype=np.int64)
+    visitado = np.zeros(n, dtype=bool)
+    actual = inicio
+    for k in range(n):
+        orden[k] = actual
+        visitado[actual] = True
+        if k < n - 1:
+            fila = np.where(visitado, np.inf, D[actual])
+            actual = int(np.argmin(fila))
+    return orden
+
+
+def _dos_opt(ciclo, D):
+    """Mejor movimiento 2-opt del ciclo (invierte ciclo[i:j+1]); None si no mejora."""
+    n = len(ciclo)
+    a = ciclo
+    b = np.roll(ciclo, -1)                       # sucesor de cada posición
+    # ganancia[i, j] de romper (a_i, b_i) y (a_j, b_j) y unir (a_i, a_j), (b_i, b_j)
+    ganancia = D[a, b][:, None] + D[a, b][None, :] - D[a[:, None], a[None, :]] - D[b[:, None], b[None, :]]
+    ganancia = np.triu(ganancia, k=2)
+    ganancia[0, n - 1] = 0                       # aristas adyacentes por la vuelta
+    i, j = np.unravel_index(np.argmax(ganancia), ganancia.shape)
+    if ganancia[i, j] <= TOLERANCIA:
+        return None
+    nuevo = ciclo.copy()
+    nuevo[i + 1:j + 1] = ciclo[i + 1:j + 1][::-1]
+    return nuevo
+
+
+def _or_opt(ciclo, D, largo):
+    """Mejor reubicación de un tramo de 'largo' paradas (directo o invertido); None si no mejora."""
+    n = len(ciclo)
+    if n < largo + 3:
+        return None
+    pos = np.arange(n)
+    ini = ciclo[pos]                              # primer nodo del tramo
+    fin = ciclo[(pos + largo - 1) % n]            # último nodo del tramo
+    prev = ciclo[(pos - 1) % n]
+    sig = ciclo[(pos + largo) % n]
+    ahorro = D[prev, ini] + D[fin, sig] - D[prev, sig]
+
+    u = ciclo                                     # arista destino (u, v)
+    v = np.roll(ciclo, -1)
+    costo_directo = D[u[None, :], ini[:, None]] + D[fin[:, None], v[None, :]] - D[u, v][None, :]
+    costo_invertido = D[u[None, :], fin[:, None]] + D[ini[:, None], v[None, :]] - D[u, v][None, :]
+    costo = np.minimum(costo_directo, costo_invertido)
+
+    # La arista destino no puede tocar el tramo: u en [pos-1, pos+largo-1]
+    desfase = (pos[None, :] - pos[:, None]) % n
+    costo[desfase >= n - 1] = np.inf
+    costo[desfase < largo] = np.inf
+
+    ganancia = ahorro[:, None] - costo
+    s, e = np.unravel_index(np.argmax(ganancia), ganancia.shape)
+    if ganancia[s, e] <= TOLERANCIA:
+        return None
+
+    tramo_pos = (s + np.arange(largo)) % n
+    tramo = ciclo[tramo_pos]
+    if costo_invertido[s, e] < costo_directo[s, e]:
+        tramo = tramo[::-1]
+    destino = ciclo[e]
+    resto = np.delete(ciclo, tramo_pos)
+    k = int(np.flatnonzero(resto == destino)[0]) + 1
+    return np.concatenate([resto[:k], tramo, resto[k:]])
+
+
+def _vecinos(D, k):
+    """Las k paradas más cercanas a cada una (de la más cercana a la más lejana)."""
+    n = len(D)
+    k = min(k, n - 1)
+    lejos = D + np.diag(np.full(n, np.inf))
+    cerca = np.argpartition(lejos, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(cerca, np.argsort(np.take_along_axis(lejos, cerca, axis=1), axis=1), axis=1)
+
+
+def _mejorar_por_vecinos(ciclo, Dp, vecinos, max_mov):
+    """
+    2-opt y Or-opt (tramos de 1 a 3) limitados a listas de vecinos, con cola
+    de paradas activas. El ficticio (último nodo) está a 0 de todos: va al
+    frente de cada lista. Devuelve (ciclo, completa); completa=False si se
+    llegó a 'max_mov' movimientos antes del óptimo local.
+    """
+    m = len(ciclo)
+    tour = ciclo.copy()
+    pos = np.empty(m, dtype=np.int64)
+    pos[tour] = np.arange(m)
+    cola = deque(tour.tolist())
+    en_cola = np.ones(m, dtype=bool)
+
+    def vecino(x, sentido):
+        return tour[(pos[x] + sentido) % m]
+
+    def invertir(i, j):
+        """Invierte el tramo cíclico de la posición i a la j (o su complemento, que es el mismo ciclo)."""
+        largo = (j - i) % m + 1
+        if 2 * largo > m:
+            i, largo = (j + 1) % m, m - largo
+        idx = (i + np.arange(largo)) % m
+        tour[idx] = tour[idx[::-1]]
+        pos[tour[idx]] = idx
+
+    def dos_opt(a):
+        for sentido in (1, -1):
+            b = vecino(a, sentido)
+            d_ab = Dp[a, b]
+            for c in vecinos[a]:
+                g1 = d_ab - Dp[a, c]
+                if g1 <= TOLERANCIA:
+                    break
+                d = vecino(c, sentido)
+                if c == b or d == a:
+                    continue
+                if g1 + Dp[c, d] - Dp[b, d] > TOLERANCIA:
+                    # Se quitan (a, b) y (c, d) y se ponen (a, c) y (b, d)
+                    if sentido == 1:
+                        invertir(pos[b], pos[c])
+                    else:
+                        invertir(pos[a], pos[d])
+                    return (a, b, c, d)
+        return None
+
+    def or_opt(a):
+        for sentido in (1, -1):
+            for largo in (1, 2, 3):
+                if m < largo + 3:
+                    return None
+                tramo = [vecino(a, sentido * t) for t in range(largo)]
+                ultimo = tramo[-1]
+                p, sig = vecino(a, -sentido), vecino(ultimo, sentido)
+                ahorro = Dp[p, a] + Dp[ultimo, sig] - Dp[p, sig]
+                if ahorro <= TOLERANCIA:
+                    continue
+                for extremo, otro in ((a, ultimo), (ultimo, a)):
+                    for c in vecinos[extremo]:
+                        if Dp[extremo, c] >= ahorro:
+                            break
+                        if c in tramo:
+                            continue
+                        for e in (vecino(c, 1), vecino(c, -1)):
+                            if e in tramo or ahorro - (Dp[c, extremo] + Dp[otro, e] - Dp[c, e]) <= TOLERANCIA:
+                                continue
+                            # Sale el tramo y entra entre c y e: c-extremo ... otro-e
+                            orientado = tramo if extremo == a else tramo[::-1]
+                            resto = np.delete(tour, pos[tramo])
+                            k_c, k_e = (int(np.flatnonzero(resto == x)[0]) for x in (c, e))
+                            if (k_c + 1) % len(resto) == k_e:
+                                nuevo = np.concatenate([resto[:k_c + 1], orientado, resto[k_c + 1:]])
+                            else:
+                                nuevo = np.concatenate([resto[:k_e + 1], orientado[::-1], resto[k_e + 1:]])
+                            tour[:] = nuevo
+                            pos[tour] = np.arange(m)
+                            return (p, sig, c, e, *tramo)
+        return None
+
+    movimientos = 0
+    while cola:
+        if movimientos >= max_mov:
+            return tour, False
+        a = cola.popleft()
+        en_cola[a] = False
+        tocadas = dos_opt(a) or or_opt(a)
+        if tocadas is None:
+            continue
+        movimientos += 1
+        for x in tocadas:
+            if not en_cola[x]:
+                en_cola[x] = True
+                cola.append(x)
+    return tour, True
+
+
+def _mejorar_denso(ciclo, Dp, max_mov):
+    """Rutas cortas: el mejor 2-opt (o si no, Or-opt) entre todos los pares, uno por vuelta."""
+    for _ in range(max_mov):
+        nuevo = _dos_opt(ciclo, Dp)
+        if nuevo is None:
+            for largo in (1, 2, 3):
+                nuevo = _or_opt(ciclo, Dp, largo)
+                if nuevo is not None:
+                    break
+        if nuevo is None:
+            return ciclo, True
+        ciclo = nuevo
+    return ciclo, False
+
+
+def mejorar_ruta(orden, D, max_mov=None):
+    """
+    2-opt y Or-opt (tramos de 1 a 3) sobre la ruta abierta hasta un óptimo
+    local. Devuelve (orden, completa): completa=False si se agotó el tope de
+    movimientos (MAX_MOVIMIENTOS_POR_PARADA por parada) antes de llegar.
+    """
+    n = len(orden)
+    if n < 4:
+        return orden, True
+    max_mov = max_mov or MAX_MOVIMIENTOS_POR_PARADA * n
+    Dp = _con_ficticio(D)
+    ciclo = np.concatenate([[n], orden])
+    if n <= LIMITE_DENSO:
+        ciclo, completa = _mejorar_denso(ciclo, Dp, max_mov)
+    else:
+        vecinos = np.column_stack([np.full(n, n), _vecinos(D, VECINOS)])
+        vecinos = [fila.tolist() for fila in vecinos] + [[]]
+        ciclo, completa = _mejorar_por_vecinos(ciclo, Dp, vecinos, max_mov)
+    k = int(np.flatnonzero(ciclo == n)[0])
+    return np.concatenate([ciclo[k + 1:], ciclo[:k]]), completa
+
+
+def secuenciar(coords, matriz=matriz_euclidiana):
+    """
+    Orden de visita y distancia de cada tramo para un conjunto de paradas.
+    Devuelve (orden, tramos, completa) con tramos[k] = distancia de la parada
+    k-1 a la k; completa=False si la mejora se cortó en el tope.
+    """
+    coords = np.asarray(coords, dtype='float64')
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), True
+    D = matriz(coords)
+    # Arranque: la parada más alejada del centro (un extremo natural de la ruta)
+    inicio = int(np.argmax(((coords - coords.mean(axis=0)) ** 2).sum(axis=1)))
+    orden, completa = mejorar_ruta(vecino_mas_cercano(D, inicio), D)
+    tramos = np.concatenate([[0.0], D[orden[:-1], orden[1:]]])
+    return orden, tramos, completa
+
+
+def secuenciar_brigadas(df, col_grupo='Grupo_ID', col_x='x', col_y='y',
+                        matriz=matriz_euclidiana, max_workers=None):
+    """
+    Ordena las paradas de cada brigada (en paralelo, una tarea por grupo).
+    Agrega 'Orden' (1..n dentro del grupo), 'Dist_Tramo_km' y 'Dist_Acum_km'.
+    Las brigadas cuya ruta se cortó en el tope de movimientos quedan en
+    df.attrs['rutas_truncadas'].
+    """
+    df = df.reset_index(drop=True)
+    grupos = [(g, idx.to_numpy()) for g, idx in df.groupby(col_grupo).groups.items()]
+    coords = df[[col_x, col_y]].to_numpy(dtype='float64')
+
+    def _resolver(item):
+        g, filas = item
+        orden, tramos, completa = secuenciar(coords[filas], matriz)
+        return g, filas[orden], tramos, completa
+
+    orden_col = np.zeros(len(df), dtype=np.int64)
+    tramo_col = np.zeros(len(df))
+    acum_col = np.zeros(len(df))
+    truncadas = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for g, filas, tramos, completa in pool.map(_resolver, grupos):
+            if not completa:
+                truncadas.append(g)
+            orden_col[filas] = np.arange(1, len(filas) + 1)
+            tramo_col[filas] = tramos / 1000
+            acum_col[filas] = np.cumsum(tramos) / 1000
+
+    df['Orden'] = orden_col
+    df['Dist_Tramo_km'] = tramo_col.round(2)
+    df['Dist_Acum_km'] = acum_col.round(2)
+    df = df.sort_values([col_grupo, 'Orden']).reset_index(drop=True)
+    df.attrs['rutas_truncadas'] = sorted(truncadas)
+    return df
+
+
+def resumen_rutas(df_rutas, col_grupo='Grupo_ID'):
+    """Paradas y km estimados por brigada."""
+    return df_rutas.groupby(col_grupo).agg(
+        Paradas=('Orden', 'size'), Km_Estimados=('Dist_Tramo_km', 'sum')
+    ).round(2).reset_index()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import math
+import shutil
+import numpy as np
+import shapely
+import geopandas as gpd
+from jinja2 import Template
+from folium.map import Layer
+from src.piramide import tolerancia_para_zoom, simplificar_cobertura
+from src.indices import asignar_seccion_manzanas, manzanas_unicas
+
+# ==============================================================================
+# TESELAS GeoJSON POR ZOOM (Traza urbana)
+# ==============================================================================
+# En lugar de incrustar todas las manzanas en el HTML del mapa, se pre-generan
+# archivos GeoJSON por tesela (z/x/y, esquema XYZ de Leaflet) dentro de
+# static/ y el navegador descarga solo las teselas visibles.
+
+DIR_TESELAS = "static/teselas"
+ZOOMS_DEFAULT = (12, 14, 16)
+
+
+def _lon_a_x(lon, z):
+    return np.floor((np.asarray(lon) + 180.0) / 360.0 * (2 ** z)).astype(int)
+
+
+def _lat_a_y(lat, z):
+    lat_rad = np.radians(np.asarray(lat))
+    return np.floor((1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * (2 ** z)).astype(int)
+
+
+def generar_teselas(gdf, capa, zooms=ZOOMS_DEFAULT, propiedades=None, dir_salida=DIR_TESELAS, decimales=6):
+    """
+    Escribe {dir_salida}/{capa}/{z}/{x}/{y}.geojson y un indice.json con las
+    teselas no vacías. Cada feature completo va a todas las teselas que toca
+    (sin recortar: no aparecen costuras) y lleva un '_id' para que el cliente
+    no lo dibuje dos veces.
+    """
+    gdf = gdf.to_crs("EPSG:4326").reset_index(drop=True)
+    propiedades = [p for p in (propiedades or []) if p in gdf.columns]
+
+    # Se escribe en una carpeta temporal y se cambia al final (otro worker
+    # podría estar sirviendo las teselas anteriores).
+    destino = os.path.join(dir_salida, capa)
+    carpeta = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(carpeta, ignore_errors=True)
+
+    bounds = gdf.geometry.bounds
+    indice = {'zooms': list(zooms), 'propiedades': propiedades, 'teselas': {}}
+
+    for z in zooms:
+        geoms = simplificar_cobertura(gdf.geometry.values, tolerancia_para_zoom(z))
+        geoms = shapely.set_precision(geoms, 10 ** -decimales)
+        capa_z = gpd.GeoDataFrame(gdf[propiedades].copy(), geometry=geoms, crs="EPSG:4326")
+        capa_z['_id'] = np.arange(len(capa_z))
+
+        # Rango de teselas que toca cada feature (y crece hacia el sur)
+        x0, x1 = _lon_a_x(bounds['minx'], z), _lon_a_x(bounds['maxx'], z)
+        y0, y1 = _lat_a_y(bounds['maxy'], z), _lat_a_y(bounds['miny'], z)
+
+        por_tesela = {}
+        for fila in np.arange(len(capa_z)):
+            for x in range(x0[fila], x1[fila] + 1):
+                for y in range(y0[fila], y1[fila] + 1):
+                    por_tesela.setdefault((x, y), []).append(fila)
+
+        claves = []
+        for (x, y), filas in por_tesela.items():
+            ruta = os.path.join(carpeta, str(z), str(x), f"{y}.geojson")
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.write(capa_z.iloc[filas].to_json(drop_id=True))
+            claves.append(f"{x}/{y}")
+        indice['teselas'][str(z)] = sorted(claves)
+
+    with open(os.path.join(carpeta, "indice.json"), 'w', encoding='utf-8') as f:
+        json.dump(indice, f)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(carpeta, destino)
+    return indice
+
+
+def generar_teselas_manzanas(manz_path, secc_path, dir_salida=DIR_TESELAS, zooms=ZOOMS_DEFAULT):
+    """
+    Teselas de la traza urbana. Si las manzanas no traen SECCION, se asigna
+    por punto interior para poder filtrar por brigada en el navegador (y si
+    la traen repetida por sección, se deja una por manzana).
+    """
+    gdf_manz = gpd.read_file(manz_path)
+    gdf_secc = gpd.read_file(secc_path)
+    col_sec = next((c for c in gdf_secc.columns if 'seccion' in c.lower()), None)
+    if 'SECCION' not in gdf_manz.columns:
+        gdf_manz['SECCION'] = asignar_seccion_manzanas(gdf_manz, gdf_secc, col_sec)
+    else:
+        gdf_manz = manzanas_unicas(gdf_manz, gdf_secc, col_sec)
+
+    return generar_teselas(gdf_manz, "manzanas", zooms=zooms, propiedades=['SECCION', 'MANZANA_ID'], dir_salida=dir_salida)
+
+
+def teselas_vigentes(capa, fuente, dir_teselas=DIR_TESELAS):
+    """True si el índice de teselas existe y es más nuevo que el archivo fuente."""
+    ruta = os.path.join(dir_teselas, capa, "indice.json")
+    return os.path.exists(ruta) and os.path.getmtime(ruta) >= os.path.getmtime(fuente)
+
+
+def cargar_indice_teselas(capa, dir_teselas=DIR_TESELAS):
+    """Índice de teselas de la capa o None si no se han generado."""
+    ruta = os.path.join(dir_teselas, capa, "indice.json")
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CapaTeselasGeoJSON(Layer):
+    """
+    Capa Leaflet que descarga teselas GeoJSON bajo demanda (moveend) desde
+    url_base/{z}/{x}/{y}.geojson. Usa el zoom pre-generado más cercano por
+    debajo del zoom actual. 'secciones' filtra en el cliente por la propiedad
+    SECCION (si las teselas la traen). Para el HTML descargado se llama a
+    incrustar(): las manzanas van dentro del archivo y no se pide nada.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {
+            style: function() { return {{ this.estilo|tojson }}; },
+            onEachFeature: function(f, l) { l.bindTooltip({{ this.tooltip|tojson }}); }
+        });
+        (function() {
+            var mapa = {{ this._parent.get_name() }};
+            var capa = {{ this.get_name() }};
+            var indice = {{ this.indice|tojson }};
+            var urlBase = {{ this.url_base|tojson }};
+            var filtro = {{ this.secciones|tojson }};
+            var filtroSet = filtro ? new Set(filtro) : null;
+            var zActual = null, pedidas = {}, vistos = {};
+
+            function zoomDatos(z) {
+                var zs = indice.zooms.slice().sort(function(a, b) { return a - b; });
+                var elegido = zs[0];
+                zs.forEach(function(zz) { if (zz <= z) { elegido = zz; } });
+                return elegido;
+            }
+            function lon2x(lon, z) { return Math.floor((lon + 180) / 360 * Math.pow(2, z)); }
+            function lat2y(lat, z) {
+                var r = lat * Math.PI / 180;
+                return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * Math.pow(2, z));
+            }
+            function actualizar() {
+                if (!mapa.hasLayer(capa)) { return; }
+                var zt = zoomDatos(mapa.getZoom());
+                if (zt !== zActual) { capa.clearLayers(); pedidas = {}; vistos = {}; zActual = zt; }
+                var disponibles = new Set(indice.teselas[String(zt)] || []);
+                var b = mapa.getBounds();
+                var x0 = lon2x(b.getWest(), zt), x1 = lon2x(b.getEast(), zt);
+                var y0 = lat2y(b.getNorth(), zt), y1 = lat2y(b.getSouth(), zt);
+                for (var x = x0; x <= x1; x++) {
+                    for (var y = y0; y <= y1; y++) {
+                        var clave = x + "/" + y;
+                        if (pedidas[clave] || !disponibles.has(clave)) { continue; }
+                        pedidas[clave] = true;
+                        (function(zPedido, clave) {
+                            fetch(urlBase + "/" + zPedido + "/" + clave + ".geojson")
+                                .then(function(r) { return r.json(); })
+                                .then(function(datos) {
+                                    if (zPedido !== zActual) { return; }
+                                    datos.features = datos.features.filter(function(f) {
+                                        var p = f.properties;
+                                        if (vistos[p._id]) { return false; }
+                                        if (filtroSet && p.SECCION !== undefined && !filtroSet.has(p.SECCION)) { return false; }
+                                        vistos[p._id] = true;
+                                        return true;
+                                    });
+                                    capa.addData(datos);
+                                })
+                                .catch(function() { delete pedidas[clave]; });
+                        })(zt, clave);
+                    }
+                }
+            }
+            var incrustado = {{ this.incrustado|tojson }};
+            if (incrustado) {
+                // HTML exportado (file://): no hay servidor de teselas
+                capa.addData(incrustado);
+                return;
+            }
+            mapa.on('moveend', actualizar);
+            capa.on('add', actualizar);
+        })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, url_base, indice, name=None, secciones=None, estilo=None,
+                 tooltip="Manzana", overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "CapaTeselasGeoJSON"
+        self.url_base = url_base.rstrip('/')
+        self.indice = indice
+        self.secciones = None if secciones is None else [int(s) for s in secciones]
+        self.estilo = estilo or {}
+        self.tooltip = tooltip
+        self.incrustado = None
+
+    def incrustar(self, gdf):
+        """Mete las manzanas (ya filtradas y simplificadas) en el HTML en lugar de pedir teselas."""
+        self.incrustado = None if gdf is None or gdf.empty else json.loads(gdf.to_crs("EPSG:4326").to_json(drop_id=True))
+        return self